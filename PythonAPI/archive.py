@@ -0,0 +1,161 @@
+import argparse
+import os
+import numpy as np
+from logger import logger, setup_logger
+from protocol import FIGHT_RESULTS
+from trajectory import FRAME_DTYPE, iter_chunks
+
+# Archive records: the trajectory columns as fixed-width little-endian rows
+ARCHIVE_DTYPE = FRAME_DTYPE.newbyteorder('<')
+
+# One entry per contiguous round of a match, in file order
+ROUND_DTYPE = np.dtype([('match', '<u4'), ('round', '<u4'), ('start', '<u8'), ('count', '<u8')])
+
+def index_path(path):
+    return path + '.idx.npz'
+
+class ArchiveWriter:
+    """Appends recorded matches to a fixed-width frame archive and keeps its sidecar index"""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            index = load_index(path)
+            self.rounds = [list(entry) for entry in index['rounds'].tolist()]
+            self.result_names = list(index['result_names'])
+            self.match_names = list(index['match_names'])
+        else:
+            self.rounds = []
+            self.result_names = list(FIGHT_RESULTS)
+            self.match_names = []
+        self.archive_file = open(path, 'ab')
+        self.rows = self.archive_file.tell() // ARCHIVE_DTYPE.itemsize
+
+    def add_match(self, source, name=None):
+        """Append every frame of a recording (.traj, .parquet or legacy .csv) as one match"""
+        match = len(self.match_names)
+        self.match_names.append(name or os.path.basename(os.path.normpath(source)))
+        frames = 0
+        for columns in iter_chunks(source):
+            records = np.empty(len(columns['frame']), dtype=ARCHIVE_DTYPE)
+            for column in ARCHIVE_DTYPE.names:
+                records[column] = columns[column] if column != 'fight_result' else self._result_codes(columns[column])
+            self._index_rounds(match, records['round'])
+            self.archive_file.write(records.tobytes())
+            self.rows += len(records)
+            frames += len(records)
+        return frames
+
+    def close(self):
+        self.archive_file.close()
+        rounds = np.array([tuple(entry) for entry in self.rounds], dtype=ROUND_DTYPE)
+        temp_path = index_path(self.path) + '.tmp'
+        with open(temp_path, 'wb') as index_file:
+            np.savez(index_file, rounds=rounds, result_names=np.array(self.result_names),
+                     match_names=np.array(self.match_names))
+        os.replace(temp_path, index_path(self.path))
+
+    def _result_codes(self, results):
+        names, inverse = np.unique(results, return_inverse=True)
+        codes = []
+        for name in names.tolist():
+            if name not in self.result_names:
+                self.result_names.append(name)
+            codes.append(self.result_names.index(name))
+        return np.array(codes, dtype=np.uint8)[inverse]
+
+    def _index_rounds(self, match, round_numbers):
+        # Split the chunk into runs of the same round number
+        boundaries = np.flatnonzero(np.diff(round_numbers)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(round_numbers)]):
+            round_number = int(round_numbers[start])
+            last = self.rounds[-1] if self.rounds else None
+            if last is not None and last[0] == match and last[1] == round_number and last[2] + last[3] == self.rows + start:
+                last[3] += int(end - start)
+            else:
+                self.rounds.append([match, round_number, self.rows + int(start), int(end - start)])
+
+def load_index(path):
+    with np.load(index_path(path)) as index:
+        return {name: index[name] for name in index.files}
+
+class ArchiveReader:
+    """Zero-copy access to an archive through numpy.memmap views"""
+
+    def __init__(self, path):
+        self.path = path
+        index = load_index(path)
+        self.rounds = index['rounds']
+        self.result_names = index['result_names']
+        self.match_names = index['match_names']
+        rows = os.path.getsize(path) // ARCHIVE_DTYPE.itemsize
+        self.frames = np.memmap(path, dtype=ARCHIVE_DTYPE, mode='r', shape=(rows,)) if rows else np.empty(0, ARCHIVE_DTYPE)
+        # A round number can come back within a match (a recording appended to after a
+        # restart counts rounds from 1 again), so each (match, round) keeps all its runs
+        self.lookup = {}
+        for match, round_number, start, count in self.rounds.tolist():
+            self.lookup.setdefault((match, round_number), []).append(slice(start, start + count))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def matches(self):
+        return len(self.match_names)
+
+    def round_numbers(self, match):
+        """Round numbers of a match in play order, a number repeated for each time it recurs"""
+        return [int(entry['round']) for entry in self.rounds if entry['match'] == match]
+
+    def round(self, match, round_number, occurrence=0):
+        """All frames of one round as a structured memmap view
+
+        `occurrence` picks among rounds of a match sharing a number, in play order.
+        """
+        runs = self.lookup.get((match, round_number))
+        if runs is None:
+            raise KeyError(f"Archive {self.path} has no round {round_number} in match {match}")
+        if not -len(runs) <= occurrence < len(runs):
+            raise KeyError(f"Round {round_number} of match {match} occurs {len(runs)} times, not {occurrence + 1}")
+        return self.frames[runs[occurrence]]
+
+    def match(self, match):
+        """All frames of one match, which are contiguous in the archive"""
+        entries = self.rounds[self.rounds['match'] == match]
+        if not len(entries):
+            raise KeyError(f"Archive {self.path} has no match {match}")
+        return self.frames[int(entries['start'].min()):int((entries['start'] + entries['count']).max())]
+
+    def frame(self, match, round_number, offset, occurrence=0):
+        """Frame `offset` (0-based) of a round"""
+        frames = self.round(match, round_number, occurrence)
+        if not 0 <= offset < len(frames):
+            raise IndexError(f"Round {round_number} of match {match} has {len(frames)} frames, not {offset + 1}")
+        return frames[offset]
+
+    def column(self, name, match=None, round_number=None, occurrence=0):
+        """One column as a strided view over the whole archive, a match or a round"""
+        if round_number is not None:
+            return self.round(match, round_number, occurrence)[name]
+        if match is not None:
+            return self.match(match)[name]
+        return self.frames[name]
+
+    def fight_results(self, codes):
+        return self.result_names[codes]
+
+def main():
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Append recorded matches to a memory-mapped frame archive")
+    parser.add_argument('archive', help="archive file, its index is written next to it")
+    parser.add_argument('recordings', nargs='+', help=".traj directories, .parquet or legacy .csv files")
+    args = parser.parse_args()
+    writer = ArchiveWriter(args.archive)
+    try:
+        for recording in args.recordings:
+            frames = writer.add_match(recording)
+            logger.info(f"Archived {frames} frames from {recording}")
+    finally:
+        writer.close()
+
+if __name__ == '__main__':
+    main()
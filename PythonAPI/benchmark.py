@@ -0,0 +1,231 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from config import BENCHMARK_CONFIG
+from logger import logger, setup_logger
+
+# Benchmark name -> function(scale) returning {metric: value}; metrics ending in
+# '_per_second' are better higher, every other metric (times) better lower
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+def higher_is_better(metric):
+    return metric.endswith('_per_second')
+
+def per_call(function, calls, repeat=BENCHMARK_CONFIG['REPEAT']):
+    """Median seconds per call of `function` over `repeat` runs of `calls` calls"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        runs.append((time.perf_counter() - start) / calls)
+    return statistics.median(runs)
+
+@contextlib.contextmanager
+def scratch_directory():
+    """Run inside an empty working directory, so models and recordings of the benchmarks are thrown away"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(cwd)
+
+def game_states(count, bot_player=2, seed=0):
+    from emulator_stub import SyntheticFrames
+    frames = SyntheticFrames(bot_player, seed)
+    return [frames.next_state() for _ in range(count)]
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+@benchmark('controller_loop')
+def controller_loop(scale):
+    """Frames per second of controller.run_frame against an emulator stub streaming as fast as it can"""
+    from controller import Player, run_frame
+    from data_recorder import DataRecorder
+    from emulator_stub import EmulatorStub, SyntheticFrames
+    frames = int(2000 * scale)
+    player1, player2 = Player(1), Player(2)
+    player2.port = free_port()
+    stub = EmulatorStub(SyntheticFrames(bot_player=2, seed=0), port=player2.port, fps=0)
+    emulator = threading.Thread(target=stub.run, args=(frames,), daemon=True)
+    emulator.start()
+    player2.connect()
+    recorder = DataRecorder()
+    start = time.perf_counter()
+    played = 0
+    while played < frames and player2.connected:
+        if run_frame(player1, player2, recorder) is not None:
+            played += 1
+    elapsed = time.perf_counter() - start
+    player2.disconnect()
+    emulator.join()
+    recorder.close()
+    return {'frames_per_second': played / elapsed, 'round_trip_median_us': statistics.median(stub.round_trips) * 1e6}
+
+@benchmark('bot_fight')
+def bot_fight(scale):
+    """Bot.fight latency of an acting-only bot and of a bot training on every frame"""
+    from bot import Bot
+    states = game_states(int(1000 * scale))
+    results = {}
+    for name, bot in (('acting', Bot(2, trainable=False)), ('training', Bot(2))):
+        # Greedy, so every frame runs the network; fill the replay buffer first, so the training bot trains on every frame
+        bot.agent.epsilon = 0.0
+        for state in states[:bot.agent.batch_size + 1]:
+            bot.fight(state, "2")
+        frames = iter(states * BENCHMARK_CONFIG['REPEAT'])
+        results[f'{name}_us'] = per_call(lambda: bot.fight(next(frames), "2"), len(states) // 2) * 1e6
+        bot.close()
+    return results
+
+@benchmark('replay_buffer')
+def replay_buffer(scale):
+    """ReplayBuffer.push and sample(64) throughput"""
+    import numpy as np
+    from dqn import ReplayBuffer
+    from features import STATE_SIZE
+    buffer = ReplayBuffer(10000, STATE_SIZE)
+    state = np.random.default_rng(0).normal(size=STATE_SIZE).astype(np.float32)
+    calls = int(20000 * scale)
+    push = per_call(lambda: buffer.push(state, 3, 1.0, state, False), calls)
+    sample = per_call(lambda: buffer.sample(64), calls // 10)
+    return {'push_per_second': 1 / push, 'sample_per_second': 1 / sample}
+
+@benchmark('dqn_train')
+def dqn_train(scale):
+    """DQNAgent.train step time on a full replay buffer"""
+    import numpy as np
+    from dqn import DQNAgent
+    from features import ACTION_SIZE, STATE_SIZE
+    agent = DQNAgent(STATE_SIZE, ACTION_SIZE, 1)
+    rng = np.random.default_rng(0)
+    states = rng.normal(size=(1001, STATE_SIZE)).astype(np.float32)
+    agent.memory.extend(states[:-1], rng.integers(0, ACTION_SIZE, 1000), rng.normal(size=1000), states[1:],
+                        np.zeros(1000, np.float32))
+    return {'train_step_us': per_call(agent.train, int(200 * scale)) * 1e6}
+
+@benchmark('game_state_decode')
+def game_state_decode(scale):
+    """Cost of turning a received payload into a GameState, per codec"""
+    from protocol import CODEC_BINARY, CODEC_JSON, CODECS
+    state = game_states(1)[0]
+    calls = int(20000 * scale)
+    results = {}
+    for name, codec_id in (('binary', CODEC_BINARY), ('json', CODEC_JSON)):
+        codec = CODECS[codec_id]
+        payload = codec.encode_game_state(state)
+        results[f'{name}_us'] = per_call(lambda: codec.decode_game_state(payload), calls) * 1e6
+    return results
+
+@benchmark('record_frame')
+def record_frame(scale):
+    """DataRecorder.record_frame throughput in the default RECORDING_CONFIG format, chunk writes included"""
+    from data_recorder import DataRecorder
+    states = game_states(int(5000 * scale))
+    recorder = DataRecorder()
+    pressed = [(state.player1.player_buttons, state.player2.player_buttons) for state in states]
+    start = time.perf_counter()
+    for state, (p1_buttons, p2_buttons) in zip(states, pressed):
+        recorder.record_frame(state, p1_buttons, p2_buttons)
+    recorder.close()
+    return {'frames_per_second': len(states) / (time.perf_counter() - start)}
+
+def run(names=None, scale=1.0):
+    """Run the named benchmarks (every one by default) and return {benchmark: {metric: value}}"""
+    results = {}
+    with scratch_directory():
+        for name in names or BENCHMARKS:
+            if name not in BENCHMARKS:
+                raise ValueError(f"Unknown benchmark {name!r}, expected one of {sorted(BENCHMARKS)}")
+            results[name] = BENCHMARKS[name](scale)
+    return results
+
+def save_baseline(path, results):
+    """Write results as a JSON baseline, with the machine they were measured on"""
+    baseline = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'results': results
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+
+def load_baseline(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)['results']
+
+def compare(baseline, results, threshold=BENCHMARK_CONFIG['THRESHOLD']):
+    """List (benchmark, metric, baseline, current, change, regressed) for metrics present in both
+
+    `change` is the relative slowdown (positive is worse) and a metric regresses
+    when it is more than `threshold` worse than its baseline.
+    """
+    rows = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                continue
+            change = (base - value) / base if higher_is_better(metric) else (value - base) / base
+            rows.append((name, metric, base, value, change, change > threshold))
+    return rows
+
+def format_results(results):
+    return "\n".join(f"{name:<20} {metric:<22} {value:>14.2f}"
+                     for name, metrics in results.items() for metric, value in metrics.items())
+
+def format_comparison(rows):
+    return "\n".join(f"{name:<20} {metric:<22} {base:>14.2f} {value:>14.2f} {change:>+8.1%}"
+                     f"{'  REGRESSION' if regressed else ''}"
+                     for name, metric, base, value, change, regressed in rows)
+
+def main():
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Benchmark the controller, bot, training and recorder hot paths")
+    parser.add_argument('benchmarks', nargs='*', help=f"benchmarks to run (default all: {', '.join(BENCHMARKS)})")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply the iterations of every benchmark")
+    parser.add_argument('--save', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', help="JSON baseline to compare against, exits 1 on a regression")
+    parser.add_argument('--threshold', type=float, default=BENCHMARK_CONFIG['THRESHOLD'],
+                        help="relative slowdown counted as a regression")
+    args = parser.parse_args()
+
+    results = run(args.benchmarks, args.scale)
+    print(format_results(results))
+    if args.save:
+        save_baseline(args.save, results)
+        logger.info(f"Saved benchmark baseline to {args.save}")
+    if args.compare:
+        rows = compare(load_baseline(args.compare), results, args.threshold)
+        print(f"\nCompared with {args.compare} (threshold {args.threshold:.0%}):")
+        print(format_comparison(rows))
+        regressions = [row for row in rows if row[5]]
+        if regressions:
+            logger.warning(f"{len(regressions)} benchmark metrics regressed beyond {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
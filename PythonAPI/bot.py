@@ -1,72 +1,117 @@
-from dqn import DQNAgent
-import torch
-import numpy as np
-from logger import logger
-from command import Command
+from logger import logger, frame_log
 from buttons import Buttons
+from timing import NULL_TIMER
+from features import ACTION_BUTTONS, ACTION_SIZE, action_to_buttons, observation_size, split_players
+from config import BOT_CONFIG, DECISION_CONFIG, INFERENCE_CONFIG, OBSERVATION_CONFIG, PRIORITIZED_REPLAY_CONFIG
+from macros import MACROS, MacroExecutor, compile_macro
+from model_registry import player_model_path, registry
+from checkpoint import CheckpointManager
+from scheduler import TrainingScheduler
+
+def pressed_buttons(buttons):
+    """Names of the pressed buttons, for logging"""
+    return [name for name in ('up', 'down', 'left', 'right', 'Y', 'B', 'A', 'X', 'L', 'R') if getattr(buttons, name)]
 
 class Bot:
-    def __init__(self, player_number=1):
+    def __init__(self, player_number=1, learner=None, prioritized=PRIORITIZED_REPLAY_CONFIG['ENABLED'], trainable=None,
+                 backend=None, decision_interval=DECISION_CONFIG['INTERVAL'],
+                 adaptive_interval=DECISION_CONFIG['ADAPTIVE'], special_moves=BOT_CONFIG['SPECIAL_MOVES'],
+                 frames=OBSERVATION_CONFIG['FRAMES']):
         # Set player number
         self.player_number = player_number
         
+        # Per-frame log categories, sampled apart from the other player's
+        self.action_log_category = f"action.p{self.player_number}"
+        self.train_log_category = f"train.p{self.player_number}"
+        
         # Define action space (12 possible button combinations)
-        self.action_size = 12
+        self.action_size = ACTION_SIZE
         # Define state size (17 features: player x, y, health, jumping, crouching, in_move, move_id,
         # opponent x, y, health, jumping, crouching, in_move, move_id, timer, round_started, round_over)
-        self.state_size = 17
-        
-        # Initialize DQN agent
-        self.agent = DQNAgent(self.state_size, self.action_size, self.player_number)
-        
-        # Load model if it exists
-        model_path = f'models/dqn_model_p{self.player_number}.pth'
-        try:
-            self.agent.load_model(model_path)
-            logger.info(f"Loaded existing DQN model for player {self.player_number}")
-        except:
-            # Try loading the default model if player-specific model doesn't exist
-            try:
-                self.agent.load_model('models/dqn_model.pth')
-                logger.info(f"Loaded default DQN model for player {self.player_number}")
-            except:
+        # for each of the last `frames` frames
+        self.state_size = observation_size(frames)
+        
+        # Bots that hand their experience to a learner only act
+        if trainable is None:
+            trainable = learner is None
+        
+        # INFERENCE_CONFIG's backend is for acting-only bots, trainable ones need torch to train
+        if backend is None:
+            backend = 'torch' if trainable else INFERENCE_CONFIG['BACKEND']
+        if backend not in ('torch', 'numpy'):
+            raise ValueError(f"Unknown inference backend {backend!r}, expected 'torch' or 'numpy'")
+        if backend == 'numpy' and trainable:
+            raise ValueError("The numpy backend only acts, give the bot a learner or trainable=False")
+        
+        if backend == 'numpy':
+            # Acting-only bots share one NumPy copy of the policy network
+            from numpy_policy import NumpyAgent
+            policy_net, epsilon = registry.numpy_policy(self.player_number, self.state_size, self.action_size)
+            self.agent = NumpyAgent(self.state_size, self.action_size, self.player_number, policy_net, prioritized)
+            self.agent.epsilon = epsilon
+        elif trainable:
+            # torch loads with the first torch-backend bot, not when this module is imported
+            from dqn import DQNAgent
+            # Initialize DQN agent from the player's model, else the default model (each file is loaded once)
+            self.agent = DQNAgent(self.state_size, self.action_size, self.player_number, prioritized=prioritized)
+            model_path, checkpoint = registry.find_checkpoint(self.player_number)
+            if checkpoint is None:
                 logger.info(f"No existing model found for player {self.player_number}, starting fresh")
+            else:
+                self.agent.load_checkpoint(checkpoint)
+                logger.info(f"Loaded DQN model {model_path} for player {self.player_number}")
+        else:
+            # Acting-only bots share one read-only policy network, with no target network or optimizer
+            from dqn import DQNAgent
+            policy_net, epsilon = registry.shared_policy(self.player_number, self.state_size, self.action_size)
+            self.agent = DQNAgent(self.state_size, self.action_size, self.player_number, prioritized=prioritized,
+                                  policy_net=policy_net)
+            self.agent.epsilon = epsilon
             
         self.last_state = None
         self.last_game_state = None
         self.last_action = None
+        # Whether last_state is a copy, rather than an encoder view that held frames may overwrite
+        self.last_state_kept = False
+        
+        # Decision interval: an action is held for several frames, its transition spanning all of them
+        self.decision_interval = max(1, decision_interval)
+        self.adaptive_interval = adaptive_interval
+        self.frames_to_hold = 0
+        self.held_buttons = None
+        self.held_reward = 0.0
+        self.decisions = 0
         
-        self.fire_code = ["<", "!<", "v+<", "!v+!<", "v", "!v", "v+>", "!v+!>", ">+Y", "!>+!Y"]
-        self.exe_code = 0
-        self.start_fire = True
-        self.remaining_code = []
-        self.my_command = Command()
-        self.buttn = Buttons()
+        # Special moves play from precompiled button tables, one mask per frame
+        self.macros = MacroExecutor()
+        self.compiled_commands = {}
+        self.special_moves = special_moves
+        self.facing_right = True
         self.action_history = []
         self.combo_counter = 0
         self.defensive_mode = False
         self.aggressive_mode = False
         self.special_move_cooldown = 0
         
+        # Per-stage frame timing, replaced by the controller when enabled
+        self.timer = NULL_TIMER
+        
+        # Optional background learner; when set this bot only acts
+        self.learner = learner
+        # A bot that trains itself schedules its own training and checkpoints in the background
+        # (a learner does both for its bots)
+        if learner is None and self.agent.trainable:
+            self.scheduler = TrainingScheduler(self.agent)
+            self.checkpoints = CheckpointManager(player_model_path(self.player_number))
+        else:
+            self.scheduler = None
+            self.checkpoints = None
+        self.weights_version = 0
+        self.observed_at = 0.0
+        
     def action_to_buttons(self, action):
         """Convert action index to button combination"""
-        # Define button combinations
-        button_combinations = [
-            {'up': True},  # Jump
-            {'down': True},  # Crouch
-            {'left': True},  # Move left
-            {'right': True},  # Move right
-            {'Y': True},  # Heavy punch
-            {'B': True},  # Medium punch
-            {'A': True},  # Light punch
-            {'X': True},  # Heavy kick
-            {'L': True},  # Medium kick
-            {'R': True},  # Light kick
-            {'up': True, 'Y': True},  # Jump heavy punch
-            {'down': True, 'B': True}  # Crouch medium punch
-        ]
-        
-        return button_combinations[action]
+        return ACTION_BUTTONS[action]
         
     def update_state(self, current_game_state, player):
         """Update internal state based on game state"""
@@ -77,8 +122,10 @@ class Bot:
             self_player = current_game_state.player2
             opponent = current_game_state.player1
             
+        self.facing_right = self_player.x_coord <= opponent.x_coord
+            
         # Update defensive/aggressive modes based on health
-        health_ratio = self_player.health / opponent.health
+        health_ratio = self_player.health / max(opponent.health, 1)
         if health_ratio < 0.5:
             self.defensive_mode = True
             self.aggressive_mode = False
@@ -96,18 +143,12 @@ class Bot:
         return self_player, opponent
 
     def execute_special_move(self, player, move_type="fireball"):
-        """Execute special moves based on type"""
-        if self.special_move_cooldown > 0:
+        """Start a special move (a config.SPECIAL_MOVES name), facing the opponent; False while cooling down"""
+        if self.special_move_cooldown > 0 or move_type not in MACROS:
             return False
             
-        if move_type == "fireball":
-            self.run_command(["<", "!<", "v+<", "!v+!<", "v", "!v", "v+>", "!v+!>", ">+Y", "!>+!Y"], player)
-        elif move_type == "dragon_punch":
-            self.run_command([">", "!>", "v+>", "!v+!>", "^+Y", "!^+!Y"], player)
-        elif move_type == "spinning_kick":
-            self.run_command(["v", "!v", "^+B", "!^+!B"], player)
-            
-        self.special_move_cooldown = 30
+        self.macros.start(move_type, self.facing_right)
+        self.special_move_cooldown = BOT_CONFIG['SPECIAL_MOVE_COOLDOWN']
         return True
 
     def choose_action(self, self_player, opponent):
@@ -142,94 +183,183 @@ class Bot:
 
     def fight(self, game_state, player_number):
         """Main fighting logic using DQN"""
+        buttons = self.hold(game_state, player_number)
+        if buttons is not None:
+            return buttons
+        
+        current_state = self.observe(game_state, player_number)
+        
+        # Select action
+        action = self.agent.select_action(current_state)
+        
+        return self.act(game_state, current_state, action)
+    
+    def hold(self, game_state, player_number=None):
+        """Buttons of a frame the DQN does not decide: a playing macro or a held action; None otherwise"""
+        if game_state.is_round_over:
+            # The round's last frame is always a decision, so its transition is stored as done
+            if self.macros.active:
+                self.macros.cancel()
+            return None
+        if self.macros.active:
+            self.push_held_state(game_state)
+            self.last_game_state = game_state
+            return Buttons.from_mask(self.macros.next_mask())
+        if self.frames_to_hold:
+            self.frames_to_hold -= 1
+            self.push_held_state(game_state)
+            self.held_reward += self.agent.get_reward(self.last_game_state, game_state)
+            self.last_game_state = game_state
+            return self.held_buttons
+        if self.special_moves:
+            return self.start_special_move(game_state, player_number or str(self.player_number))
+        return None
+        
+    def start_special_move(self, game_state, player_number):
+        """Start the special move choose_action picks, if any, and return its first frame's buttons"""
+        self_player, opponent = self.update_state(game_state, player_number)
+        if not self.execute_special_move(self_player, self.choose_action(self_player, opponent)):
+            return None
+        # The agent did not choose these inputs, so no transition spans them
+        self.last_state = None
+        self.last_action = None
+        self.push_held_state(game_state)
+        self.last_game_state = game_state
+        return Buttons.from_mask(self.macros.next_mask())
+        
+    def push_held_state(self, game_state):
+        """Add a frame the DQN does not decide to the observation history, skipping the forward pass
+        
+        Observations then stack consecutive frames, as they do offline. The pending
+        transition's state is copied first, as these frames reuse its encoder slot.
+        """
+        if self.last_state is not None and not self.last_state_kept:
+            self.last_state = self.agent.keep_state(self.last_state)
+            self.last_state_kept = True
+        self.agent.push_state(game_state)
+        
+    def next_interval(self, game_state):
+        """Frames until the next decision, shorter in close combat when the interval is adaptive"""
+        if self.adaptive_interval:
+            player, opponent = split_players(game_state, self.player_number)
+            if opponent.is_player_in_move or abs(player.x_coord - opponent.x_coord) < DECISION_CONFIG['CLOSE_DISTANCE']:
+                return min(self.decision_interval, DECISION_CONFIG['CLOSE_INTERVAL'])
+        return self.decision_interval
+        
+    def observe(self, game_state, player_number):
+        """First half of a frame: refresh weights and encode the game state"""
         # Update player number if needed
         self.player_number = int(player_number)
         
+        start = self.timer.start()
+        
+        if self.learner is not None:
+            self.sync_weights()
+        
         # Get current state
         current_state = self.agent.get_state(game_state)
-        
-        # Select action
-        action = self.agent.select_action(current_state)
+        self.observed_at = self.timer.lap('get_state', start)
+        return current_state
+    
+    def act(self, game_state, current_state, action):
+        """Second half of a frame: turn the chosen action into buttons and learn from it"""
+        timer = self.timer
+        start = timer.lap('select_action', self.observed_at)
         
         # Convert action to button combination
-        button_dict = self.action_to_buttons(action)
-        
-        # Create Buttons object
-        buttons = Buttons()
-        for button, value in button_dict.items():
-            # IMPORTANT: Preserve case for Y, B, A, X, L, R buttons
-            if button in ['Y', 'B', 'A', 'X', 'L', 'R']:
-                setattr(buttons, button, value)
-            else:
-                setattr(buttons, button.lower(), value)
+        buttons = action_to_buttons(action)
                 
-        # Debug: Print button states
-        pressed_buttons = []
-        for btn in ['up', 'down', 'left', 'right', 'Y', 'B', 'A', 'X', 'L', 'R']:
-            if getattr(buttons, btn, False):
-                pressed_buttons.append(btn)
-        logger.info(f"Player {self.player_number} action {action}: {pressed_buttons}")
+        # Debug: Log button states for a sample of frames (see LOGGING_CONFIG)
+        if frame_log.should_log(self.action_log_category):
+            logger.info("Player %s action %s: %s", self.player_number, action, pressed_buttons(buttons))
+        start = timer.lap('buttons', start)
         
         # If we have a previous state and action, store the experience
         if self.last_state is not None and self.last_action is not None:
-            # Calculate reward using the game state objects
-            reward = self.agent.get_reward(self.last_game_state, game_state)
+            # Calculate reward using the game state objects, plus that of the frames the action was held
+            reward = self.held_reward + self.agent.get_reward(self.last_game_state, game_state)
             
-            # Store experience in replay buffer
-            self.agent.memory.push(
-                self.last_state,
-                self.last_action,
-                reward,
-                current_state,
-                game_state.is_round_over
-            )
-            
-            # Train the network
-            loss = self.agent.train()
-            if loss is not None:
-                logger.info(f"Training loss for player {self.player_number}: {loss:.4f}")
+            if self.learner is not None:
+                # Hand the experience to the background learner
+                self.learner.submit(
+                    self.last_state,
+                    self.last_action,
+                    reward,
+                    current_state,
+                    game_state.is_round_over
+                )
+                start = timer.lap('replay_push', start)
+            elif self.scheduler is not None:
+                # Store experience in replay buffer
+                self.agent.memory.push(
+                    self.last_state,
+                    self.last_action,
+                    reward,
+                    current_state,
+                    game_state.is_round_over
+                )
+                start = timer.lap('replay_push', start)
                 
-            # Update target network every 1000 steps
-            if len(self.agent.memory) % 1000 == 0:
-                self.agent.update_target_network()
-                logger.info(f"Updated target network for player {self.player_number}")
+                # Train the network as often as the scheduler says, target updates included
+                self.scheduler.observe()
+                loss = self.scheduler.train()
+                start = timer.lap('train', start)
+                if loss is not None:
+                    frame_log.info(self.train_log_category, "Training loss for player %s: %.4f", self.player_number, loss)
                 
         # Save current state and action for next step
         self.last_state = current_state  # Store the tensor state
+        self.last_state_kept = False
         self.last_game_state = game_state  # Store the game state object
         self.last_action = action
         
-        # Save model periodically
-        if len(self.agent.memory) % 10000 == 0:
-            model_path = f'models/dqn_model_p{self.player_number}.pth'
-            self.agent.save_model(model_path)
-            logger.info(f"Saved DQN model for player {self.player_number}")
+        # Hold the action until the next decision
+        self.decisions += 1
+        self.frames_to_hold = self.next_interval(game_state) - 1
+        self.held_buttons = buttons
+        self.held_reward = 0.0
+        
+        # Checkpoint periodically; only the snapshot is taken on the frame path
+        if self.checkpoints is not None:
+            self.checkpoints.maybe_save(self.agent, self.scheduler.updates)
             
         return buttons
+    
+    def attach_learner(self, learner):
+        """Hand training to a learner; this bot keeps only what it needs to act"""
+        self.learner = learner
+        self.agent.drop_training_state()
+        self.scheduler = None
+        if self.checkpoints is not None:
+            self.checkpoints.close()
+            self.checkpoints = None
+        
+    def frame_done(self, seconds):
+        """Tell the training scheduler how long the last frame took to handle"""
+        if self.scheduler is not None:
+            self.scheduler.frame_done(seconds)
+        
+    def close(self):
+        """Checkpoint what a self-training bot learned since its last save and wait for the write"""
+        if self.checkpoints is not None:
+            if self.scheduler.updates > self.checkpoints.last_step:
+                self.checkpoints.save(self.agent, self.scheduler.updates)
+            self.checkpoints.close()
+            self.checkpoints = None
+        
+    def sync_weights(self):
+        """Load the learner's latest published weights into the acting network"""
+        version, weights, epsilon = self.learner.latest()
+        if version != self.weights_version:
+            registry.load_published(self.agent.policy_net, self.learner, version, weights)
+            self.agent.epsilon = epsilon
+            self.weights_version = version
 
     def run_command(self, com, player):
-        if not com:
-            return
-            
-        if self.exe_code >= len(com):
-            self.exe_code = 0
-            return
-            
-        current_command = com[self.exe_code]
-        self.buttn.init_buttons()
-        
-        # Parse the command string
-        if "+" in current_command:
-            buttons = current_command.split("+")
-            for button in buttons:
-                if button.startswith("!"):
-                    setattr(self.buttn, button[1:].lower(), False)
-                else:
-                    setattr(self.buttn, button.lower(), True)
-        else:
-            if current_command.startswith("!"):
-                setattr(self.buttn, current_command[1:].lower(), False)
-            else:
-                setattr(self.buttn, current_command.lower(), True)
-                
-        self.exe_code += 1
+        """Play a sequence of notation steps (see macros.compile_macro), compiled once per sequence"""
+        key = tuple(com)
+        macro = self.compiled_commands.get(key)
+        if macro is None:
+            macro = self.compiled_commands[key] = compile_macro(key)
+        if macro.masks:
+            self.macros.start(macro, self.facing_right)
@@ -1,5 +1,26 @@
+# Wire order of the buttons, also used as the bit order of a button mask
+BUTTON_NAMES = ('Up', 'Down', 'Right', 'Left', 'Select', 'Start', 'Y', 'B', 'X', 'A', 'L', 'R')
+BUTTON_ATTRIBUTES = ('up', 'down', 'right', 'left', 'select', 'start', 'Y', 'B', 'X', 'A', 'L', 'R')
+BUTTON_BITS = tuple(1 << bit for bit in range(len(BUTTON_NAMES)))
+
+def _button_property(bit):
+    flag = 1 << bit
+
+    def get(self):
+        return bool(self.mask & flag)
+
+    def set(self, value):
+        if value:
+            self.mask |= flag
+        else:
+            self.mask &= ~flag
+
+    return property(get, set)
 
 class Buttons:
+    """The 12 SNES buttons of one player, stored as a bit mask (bit i is BUTTON_NAMES[i])"""
+
+    __slots__ = ('mask',)
 
     def __init__(self, buttons_dict=None):
 
@@ -9,49 +30,38 @@ class Buttons:
             self.init_buttons()
 
     def init_buttons(self):
-        self.up = False
-        self.down = False
-        self.right = False
-        self.left = False
-        self.select = False
-        self.start = False
-        self.Y = False
-        self.B = False
-        self.X = False
-        self.A = False
-        self.L = False
-        self.R = False
+        self.mask = 0
 
     def dict_to_object(self, buttons_dict):
 
-        self.up = buttons_dict['Up']
-        self.down = buttons_dict['Down']
-        self.right = buttons_dict['Right']
-        self.left = buttons_dict['Left']
-        self.select = buttons_dict['Select']
-        self.start = buttons_dict['Start']
-        self.Y = buttons_dict['Y']
-        self.B = buttons_dict['B']
-        self.X = buttons_dict['X']
-        self.A = buttons_dict['A']
-        self.L = buttons_dict['L']
-        self.R = buttons_dict['R']
+        mask = 0
+        for name, flag in zip(BUTTON_NAMES, BUTTON_BITS):
+            if buttons_dict[name]:
+                mask |= flag
+        self.mask = mask
 
     def object_to_dict(self):
 
-        buttons_dict = {}
-
-        buttons_dict['Up'] = self.up
-        buttons_dict['Down'] = self.down
-        buttons_dict['Right'] = self.right
-        buttons_dict['Left'] = self.left
-        buttons_dict['Select'] = self.select
-        buttons_dict['Start'] = self.start
-        buttons_dict['Y'] = self.Y
-        buttons_dict['B'] = self.B
-        buttons_dict['X'] = self.X
-        buttons_dict['A'] = self.A
-        buttons_dict['L'] = self.L
-        buttons_dict['R'] = self.R
-
-        return buttons_dict
\ No newline at end of file
+        mask = self.mask
+        return {name: bool(mask & flag) for name, flag in zip(BUTTON_NAMES, BUTTON_BITS)}
+
+    def to_mask(self):
+        """Pack the button states into a 12-bit integer (bit i is BUTTON_NAMES[i])"""
+        return self.mask
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Build a Buttons object from a 12-bit integer mask"""
+        buttons = cls.__new__(cls)
+        buttons.mask = mask
+        return buttons
+
+# Other names the same mask bits answer to: special-move notation symbols (see config.BUTTON_MAPPINGS)
+# and lowercase face buttons, so setattr(buttons, '<', True) or buttons.y keep working
+BUTTON_ALIASES = {'^': 'up', 'v': 'down', '>': 'right', '<': 'left',
+                  'y': 'Y', 'b': 'B', 'x': 'X', 'a': 'A', 'l': 'L', 'r': 'R'}
+
+for _bit, _attribute in enumerate(BUTTON_ATTRIBUTES):
+    setattr(Buttons, _attribute, _button_property(_bit))
+for _alias, _attribute in BUTTON_ALIASES.items():
+    setattr(Buttons, _alias, _button_property(BUTTON_ATTRIBUTES.index(_attribute)))
@@ -0,0 +1,155 @@
+import io
+import json
+import os
+import threading
+import time
+from config import CHECKPOINT_CONFIG
+from logger import logger
+
+def history_dir(path):
+    """Directory holding the numbered versions of a model file"""
+    return os.path.splitext(path)[0] + '.history'
+
+# One lock per model file, so managers of the same model (one per server session) take turns
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+def _path_lock(path):
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+def _write_atomic(path, data):
+    # Write under a temporary name in the same directory, so a reader sees the old file or the new one
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_path, path)
+
+class CheckpointManager:
+    """Saves an agent's checkpoints on a background thread, keeping the last `keep` versions
+
+    `path` always holds the newest checkpoint. Every version is also kept as
+    <model>.history/v<version>.pth, listed with its step, epsilon and time in
+    <model>.history/manifest.json. Paths in the manifest are relative to the history
+    directory, so it stays valid wherever the models directory is moved or read from.
+    """
+
+    def __init__(self, path, every_steps=CHECKPOINT_CONFIG['EVERY_STEPS'],
+                 every_seconds=CHECKPOINT_CONFIG['EVERY_SECONDS'], keep=CHECKPOINT_CONFIG['KEEP']):
+        self.path = path
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.keep = keep
+        self.last_step = 0
+        self.last_time = time.monotonic()
+        self.saves = 0
+        self.pending = None
+        self.condition = threading.Condition()
+        self.closing = False
+        self.writing = False
+        self.thread = threading.Thread(target=self._run, name=f"checkpoint-{os.path.basename(path)}", daemon=True)
+        self.thread.start()
+
+    def due(self, step):
+        """Whether a checkpoint is due at this step, by step count or by wall time
+
+        Nothing is due until training has moved past the last saved step.
+        """
+        if step <= self.last_step:
+            return False
+        if self.every_steps and step - self.last_step >= self.every_steps:
+            return True
+        return bool(self.every_seconds) and time.monotonic() - self.last_time >= self.every_seconds
+
+    def maybe_save(self, agent, step):
+        if self.due(step):
+            self.save(agent, step)
+
+    def save(self, agent, step):
+        """Snapshot the agent now and leave the writing to the background thread
+
+        If the thread is still writing, a snapshot waiting for it is replaced by this one.
+        """
+        snapshot = agent.snapshot()
+        snapshot['step'] = step
+        snapshot['timestamp'] = time.time()
+        self.last_step = step
+        self.last_time = time.monotonic()
+        with self.condition:
+            self.pending = snapshot
+            self.condition.notify()
+
+    def flush(self):
+        """Block until every snapshot taken so far is on disk"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending is None and not self.writing)
+
+    def close(self):
+        """Write what is still pending and stop the thread"""
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        self.thread.join()
+
+    def versions(self):
+        """Manifest entries of the kept versions, oldest first"""
+        with _path_lock(self.path):
+            return self._load_manifest()
+
+    def version_path(self, version):
+        return os.path.join(history_dir(self.path), f"v{version:06d}.pth")
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(history_dir(self.path), 'manifest.json')) as manifest_file:
+                return json.load(manifest_file)['versions']
+        except FileNotFoundError:
+            return []
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None or self.closing)
+                snapshot, self.pending = self.pending, None
+                if snapshot is None:
+                    return
+                self.writing = True
+            try:
+                self._write(snapshot)
+            except Exception as e:
+                logger.error(f"Failed to save checkpoint {self.path}: {e}")
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def _write(self, snapshot):
+        import torch
+        with _path_lock(self.path):
+            history = self._load_manifest()
+            version = history[-1]['version'] + 1 if history else 1
+            snapshot['version'] = version
+            # Serialize once, then write the same bytes as the newest model and as a kept version
+            buffer = io.BytesIO()
+            torch.save(snapshot, buffer)
+            data = buffer.getvalue()
+            os.makedirs(history_dir(self.path), exist_ok=True)
+            version_path = self.version_path(version)
+            _write_atomic(version_path, data)
+            _write_atomic(self.path, data)
+            history.append({'version': version, 'step': snapshot['step'], 'epsilon': snapshot['epsilon'],
+                            'timestamp': snapshot['timestamp'], 'path': os.path.basename(version_path)})
+            if self.keep:
+                for old in history[:-self.keep]:
+                    try:
+                        os.remove(self.version_path(old['version']))
+                    except FileNotFoundError:
+                        pass
+                history = history[-self.keep:]
+            model = os.path.relpath(self.path, history_dir(self.path))
+            manifest = json.dumps({'model': model, 'versions': history}, indent=1).encode()
+            _write_atomic(os.path.join(history_dir(self.path), 'manifest.json'), manifest)
+        self.saves += 1
+        logger.info(f"Saved checkpoint {self.path} version {version} at step {snapshot['step']}")
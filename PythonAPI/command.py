@@ -10,6 +10,13 @@ class Command:
         self.__player_count = 2
         self.save_game_path = ""
 
+    def dict_to_object(self, command_dict):
+
+        self.player_buttons = Buttons(command_dict['p1'])
+        self.player2_buttons = Buttons(command_dict['p2'])
+        self.type = command_dict['type']
+        self.save_game_path = command_dict['savegamepath']
+
     def object_to_dict(self):
         
         command_dict = {}
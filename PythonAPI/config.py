@@ -55,6 +55,7 @@ BOT_CONFIG = {
     'DEFENSIVE_HEALTH_RATIO': 0.5,
     'AGGRESSIVE_HEALTH_RATIO': 1.5,
     'SPECIAL_MOVE_COOLDOWN': 30,
+    'SPECIAL_MOVES': False,  # let choose_action start special moves on decision frames
     'COMBO_LENGTH': 3,
     'REACTION_TIME': 0.1  # seconds
 }
@@ -63,5 +64,116 @@ BOT_CONFIG = {
 LOGGING_CONFIG = {
     'LOG_FILE': 'bot.log',
     'LOG_LEVEL': 'INFO',
-    'LOG_FORMAT': '%(asctime)s - %(levelname)s - %(message)s'
-} 
\ No newline at end of file
+    'LOG_FORMAT': '%(asctime)s - %(levelname)s - %(message)s',
+    'ASYNC': True,                    # write logs from a background thread
+    'FRAME_LOGGING': True,            # False removes every per-frame log line
+    'FRAME_LOG_SAMPLING': {           # log 1 in N per-frame events of each category
+        'buttons': 60,
+        'action': 60,
+        'train': 600,
+        'recorder': 60
+    },
+    'FRAME_LOG_MAX_PER_SECOND': 10    # cap per category, 0 for no cap
+}
+
+# Frame timing configuration
+TIMING_CONFIG = {
+    'ENABLED': False,
+    'WINDOW': 1024,          # samples kept per stage
+    'REPORT_EVERY': 600,     # frames between reports (about 10 seconds)
+    'FRAME_BUDGET_MS': 16.7
+}
+
+# On-demand profiling of a running controller (see profiling.py)
+PROFILING_CONFIG = {
+    'OUTPUT_DIR': 'logs',
+    'SECONDS': 10.0,            # length of a profile when the request gives none
+    'SIGNALS': {                # POSIX signal -> profile it starts, e.g. kill -USR1 <pid>
+        'SIGUSR1': 'cprofile',
+        'SIGUSR2': 'memory'
+    },
+    'CONTROL_PORT': None,       # localhost port taking profile commands, None for none
+    'POLL_INTERVAL_MS': 50.0,   # how often server.py's event loop starts and stops requested profiles
+    'SAMPLE_INTERVAL_MS': 5.0,  # stack sampling period of 'sample' profiles
+    'TRACEMALLOC_FRAMES': 10,   # traceback depth kept by 'memory' profiles
+    'TOP': 40                   # entries in the text summaries
+}
+
+# Background learner configuration
+LEARNER_CONFIG = {
+    'QUEUE_SIZE': 10000,         # transitions buffered between actors and the learner
+    'PUBLISH_EVERY': 50,         # gradient steps between weight snapshots for actors
+    'SAVE_EVERY': 10000          # gradient steps between checkpoints
+}
+
+# How often a bot picks a new action; the action is held on the frames in between
+DECISION_CONFIG = {
+    'INTERVAL': 1,          # frames per decision (1 decides every frame)
+    'ADAPTIVE': False,      # decide every CLOSE_INTERVAL frames up close or while the opponent is in a move
+    'CLOSE_INTERVAL': 1,
+    'CLOSE_DISTANCE': 80    # x distance under which the players count as close
+}
+
+# What the DQN sees: a stack of the last FRAMES feature vectors (see features.ObservationEncoder)
+# Models only load with the settings they were trained with
+OBSERVATION_CONFIG = {
+    'FRAMES': 1,         # frames stacked per observation, more show the network velocities and move timing
+    'NORMALIZE': False   # scale features to about [0, 1] by features.FEATURE_RANGES
+}
+
+# Reward shaping: weight of each change between two frames (see features.game_state_reward)
+REWARD_CONFIG = {
+    'HEALTH_WEIGHT': 10.0,   # per point of health the opponent lost more than the player
+    'DISTANCE_WEIGHT': 0.1   # per pixel closed on the opponent
+}
+
+# Training schedule of bots and learners (see scheduler.py)
+TRAINING_CONFIG = {
+    'TRAIN_EVERY': 1,               # transitions between training rounds
+    'GRADIENT_STEPS': 1,            # gradient steps per training round
+    'REPLAY_RATIO': None,           # gradient steps per transition, overrides the two above
+    'TARGET_UPDATE': 'hard',        # 'hard' copies the policy network, 'soft' blends it in by TAU
+    'TARGET_UPDATE_EVERY': 1000,    # gradient steps between hard target updates
+    'TAU': 0.005,                   # Polyak rate of soft target updates, applied every gradient step
+    'EPSILON_SCHEDULE': 'exponential',  # 'exponential' decays per gradient step, 'linear' over EPSILON_STEPS
+    'EPSILON_STEPS': 100000,        # transitions over which a linear schedule reaches the minimum
+    'ADAPTIVE': False,              # train less while frames miss TIMING_CONFIG['FRAME_BUDGET_MS']
+    'MAX_MISS_RATE': 0.05,          # share of late frames tolerated before training backs off
+    'MIN_INTENSITY': 0.1            # lowest share of the scheduled gradient steps kept under load
+}
+
+# Checkpoint configuration
+CHECKPOINT_CONFIG = {
+    'EVERY_STEPS': 10000,    # training steps between checkpoints of a bot (learners use SAVE_EVERY)
+    'EVERY_SECONDS': 600.0,  # also checkpoint after this much wall time, 0 to disable
+    'KEEP': 5                # versions kept in models/<model>.history/
+}
+
+# Prioritized experience replay configuration
+PRIORITIZED_REPLAY_CONFIG = {
+    'ENABLED': False,      # default replay mode for new bots
+    'ALPHA': 0.6,          # how strongly TD error shapes sampling (0 = uniform)
+    'BETA': 0.4,           # initial importance-sampling correction
+    'BETA_STEPS': 100000,  # samples over which beta anneals to 1
+    'EPSILON': 1e-6        # keeps zero-error transitions sampleable
+}
+
+# Batched inference configuration
+INFERENCE_CONFIG = {
+    'MAX_BATCH_SIZE': 64,  # states answered by one forward pass
+    'MAX_WAIT_MS': 1.0,    # how long the first state of a batch may wait for company
+    'BACKEND': 'torch'     # 'numpy' runs acting-only bots without torch (see numpy_policy.py)
+}
+
+# Frame recording configuration
+RECORDING_CONFIG = {
+    'FORMAT': 'npz',         # 'npz' chunk directory, 'parquet' (needs pyarrow) or the legacy per-frame 'csv'
+    'CHUNK_FRAMES': 4096,    # frames buffered in memory before a chunk is written (or the CSV flushed)
+    'FSYNC_SECONDS': 30.0    # fsync a chunk (or the CSV) at most this long after the previous fsync
+}
+
+# Benchmark suite configuration (see benchmark.py)
+BENCHMARK_CONFIG = {
+    'REPEAT': 5,        # runs per measurement, the median is kept
+    'THRESHOLD': 0.15   # relative slowdown from the baseline reported as a regression
+}
@@ -1,16 +1,18 @@
 import socket
-import json
-from game_state import GameState
+from protocol import Connection, CODEC_NAMES, PROTOCOL_VERSION
 from bot import Bot
+from learner import Learner
 from data_recorder import DataRecorder
-from logger import logger
+from logger import logger, frame_log, setup_logger
 from command import Command
 from buttons import Buttons
+from config import NETWORK_CONFIG, PROFILING_CONFIG, TIMING_CONFIG
+from timing import NULL_TIMER, make_timer
+from profiling import ControlServer, RuntimeProfiler, install_signal_handlers
 import sys
 import os
 import threading
 import time
-from datetime import datetime
 
 def log_action_buttons(player_num, buttons):
     """Log detailed information about action button presses"""
@@ -27,7 +29,8 @@ def log_action_buttons(player_num, buttons):
     }
     
     # Log all button states for debugging
-    logger.info(f"P{player_num} button states: Y={logging_dict['Y']}, B={logging_dict['B']}, A={logging_dict['A']}, X={logging_dict['X']}, L={logging_dict['L']}, R={logging_dict['R']}")
+    logger.debug("P%s button states: Y=%s, B=%s, A=%s, X=%s, L=%s, R=%s", player_num, logging_dict['Y'],
+                 logging_dict['B'], logging_dict['A'], logging_dict['X'], logging_dict['L'], logging_dict['R'])
     
     # Check which action buttons are pressed
     if buttons.Y: action_buttons_pressed.append("Y (Heavy Punch)")
@@ -40,7 +43,7 @@ def log_action_buttons(player_num, buttons):
     # If any action buttons are pressed, log them
     if action_buttons_pressed:
         player_type = "Human" if player_num == 1 else "AI"
-        logger.info(f"Player {player_num} ({player_type}) ACTION buttons: {', '.join(action_buttons_pressed)}")
+        logger.info("Player %s (%s) ACTION buttons: %s", player_num, player_type, ', '.join(action_buttons_pressed))
 
 def button_state_to_string(buttons):
     """Convert Buttons object to readable string of pressed buttons"""
@@ -49,7 +52,7 @@ def button_state_to_string(buttons):
     b_value = getattr(buttons, 'B', 'NotFound')
     a_value = getattr(buttons, 'A', 'NotFound')
     x_value = getattr(buttons, 'X', 'NotFound')
-    logger.debug(f"Raw button values - Y:{y_value}, B:{b_value}, A:{a_value}, X:{x_value}")
+    logger.debug("Raw button values - Y:%s, B:%s, A:%s, X:%s", y_value, b_value, a_value, x_value)
     
     pressed = []
     direction_buttons = []
@@ -79,38 +82,41 @@ def button_state_to_string(buttons):
         return "None"
     return " | ".join(pressed)
 
-def connect(port):
+def connect(port, allowed_codecs=None):
     #For making a connection with the game
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.bind(("127.0.0.1", port))
     server_socket.listen(5)
     (client_socket, _) = server_socket.accept()
-    print (f"Connected to game on port {port}!")
-    return client_socket
+    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    connection = Connection(client_socket)
+    codec_id = connection.accept_handshake(allowed_codecs)
+    if codec_id is None:
+        print (f"Connected to game on port {port}! (legacy JSON stream)")
+    else:
+        print (f"Connected to game on port {port}! ({CODEC_NAMES[codec_id]} protocol v{PROTOCOL_VERSION})")
+    return connection
 
-def send(client_socket, command):
+def send(connection, command, timer=NULL_TIMER):
     #This function will send your updated command to Bizhawk so that game reacts according to your command.
-    command_dict = command.object_to_dict()
-    pay_load = json.dumps(command_dict).encode()
-    client_socket.sendall(pay_load)
+    connection.send_command(command, timer)
 
-def receive(client_socket):
+def receive(connection, timer=NULL_TIMER):
     #receive the game state and return game state
-    pay_load = client_socket.recv(4096)
-    input_dict = json.loads(pay_load.decode())
-    game_state = GameState(input_dict)
-    return game_state
+    return connection.receive_game_state(timer)
 
 class Player:
     def __init__(self, player_number):
         self.player_number = player_number
-        self.port = 9999 if player_number == 1 else 9999
+        self.port = NETWORK_CONFIG['PORT_P1'] if player_number == 1 else NETWORK_CONFIG['PORT_P2']
         self.client_socket = None
         self.bot = Bot(player_number)
         self.current_game_state = None
         self.buttons = Buttons()
         self.command = Command()
         self.connected = False
+        self.timer = NULL_TIMER
+        self.frame_started = 0.0
         
     def connect(self):
         try:
@@ -118,7 +124,7 @@ class Player:
             self.connected = True
             return True
         except Exception as e:
-            logger.error(f"Player {self.player_number} connection error: {e}")
+            logger.error("Player %s connection error: %s", self.player_number, e)
             return False
             
     def process_frame(self):
@@ -126,7 +132,8 @@ class Player:
             return None, None
             
         try:
-            self.current_game_state = receive(self.client_socket)
+            self.current_game_state = receive(self.client_socket, self.timer)
+            self.frame_started = time.perf_counter()
             self.buttons = self.bot.fight(self.current_game_state, str(self.player_number))
             
             # Create command object from buttons
@@ -136,11 +143,11 @@ class Player:
             else:
                 self.command.player2_buttons = self.buttons
                 
-            send(self.client_socket, self.command)
+            send(self.client_socket, self.command, self.timer)
             
             return self.current_game_state, self.buttons
         except Exception as e:
-            logger.error(f"Player {self.player_number} frame processing error: {e}")
+            logger.error("Player %s frame processing error: %s", self.player_number, e)
             self.connected = False
             return None, None
             
@@ -149,28 +156,77 @@ class Player:
             self.client_socket.close()
             self.connected = False
 
+def run_frame(player1, player2, recorder, timer=NULL_TIMER):
+    """Play and record one frame of the connected player; returns its game state, None if there was none"""
+    game_state = None
+    # Process player 1 if connected (human player 1)
+    if player1.connected:
+        game_state, p1_buttons = player1.process_frame()
+        
+        # If we have a valid game state, generate AI moves as player 2
+        if game_state is not None:
+            # Generate AI moves for player 2
+            p2_buttons = player2.bot.fight(game_state, "2")
+            if frame_log.should_log('buttons.ai'):
+                logger.info("AI (P2) pressed: %s", button_state_to_string(p2_buttons))
+    # Process player 2 if connected (human player 2)
+    elif player2.connected:
+        game_state, human_p2_buttons = player2.process_frame()
+        
+        # If we have a valid game state, generate AI moves as player 1
+        # but record them as player 2 for consistency
+        if game_state is not None:
+            # Generate AI moves (technically as player 1)
+            ai_buttons = player1.bot.fight(game_state, "1")
+            if frame_log.should_log('buttons.ai'):
+                logger.info("AI (recorded as P2) pressed: %s", button_state_to_string(ai_buttons))
+            
+            # Record human as player 1 and AI as player 2
+            p1_buttons = human_p2_buttons  # Human actions recorded as P1
+            p2_buttons = ai_buttons        # AI actions recorded as P2
+            
+    # Record the frame if we have a valid game state
+    if game_state is None:
+        return None
+    
+    # Record both players' actions
+    start = timer.start()
+    recorder.record_frame(
+        game_state,
+        p1_buttons,
+        p2_buttons
+    )
+    timer.lap('record_frame', start)
+    
+    # Debug output for both players' actions (sampled, see LOGGING_CONFIG)
+    if frame_log.should_log('buttons'):
+        logger.info("P1 buttons: %s", button_state_to_string(p1_buttons))
+        logger.info("P2 buttons (AI): %s", button_state_to_string(p2_buttons))
+        
+        # Log specific action button presses with more detail
+        log_action_buttons(1, p1_buttons)
+        log_action_buttons(2, p2_buttons)
+    
+    connected_player = player1 if player1.connected else player2
+    timer.frame_done(connected_player.client_socket.received_at)
+    frame_seconds = time.perf_counter() - connected_player.frame_started
+    player1.bot.frame_done(frame_seconds)
+    player2.bot.frame_done(frame_seconds)
+    return game_state
+
 def main():
+    setup_logger()
     # Check if we're running in single player or two player mode
     single_player_mode = len(sys.argv) > 1 and sys.argv[1] in ['1', '2']
+    timer = make_timer("controller", '--timing' in sys.argv or TIMING_CONFIG['ENABLED'])
+    if '--no-frame-log' in sys.argv:
+        frame_log.enabled = False
     
     # Create player instances
     player1 = Player(1)
     player2 = Player(2)
     recorder = DataRecorder()
     
-    # For testing: create a test buttons object with all action buttons pressed
-    test_buttons = Buttons()
-    test_buttons.Y = True
-    test_buttons.B = True
-    test_buttons.A = True
-    test_buttons.X = True
-    test_buttons.L = True
-    test_buttons.R = True
-    
-    # Print a debug message with test button states
-    logger.info("TEST BUTTONS - Created test buttons object with action buttons")
-    log_action_buttons(999, test_buttons)  # Test player number 999
-    
     # Connect players
     if single_player_mode:
         player_num = int(sys.argv[1])
@@ -179,16 +235,14 @@ def main():
                 logger.error("Failed to connect player 1")
                 return
                 
-            # Make sure player 2's bot is properly initialized as an opponent
-            player2.bot = Bot(2)  # Reinitialize with player number 2
+            # Player 2's bot plays as the opponent
             player2.connected = False  # Not physically connected
         else:
             if not player2.connect():
                 logger.error("Failed to connect player 2")
                 return
                 
-            # Make sure player 1's bot is properly initialized as an opponent
-            player1.bot = Bot(1)  # Reinitialize with player number 1
+            # Player 1's bot plays as the opponent
             player1.connected = False  # Not physically connected
     else:
         # Connect both players for two-player mode
@@ -199,79 +253,66 @@ def main():
             logger.error("Failed to connect one or both players")
             return
     
+    # Share the frame timer between both players; each bot's stages are reported under its player
+    for player in (player1, player2):
+        player.timer = timer
+        player.bot.timer = timer.prefixed(f"p{player.player_number}")
+    
+    # Optionally train less while frames miss their deadline
+    if '--adaptive-train' in sys.argv:
+        for player in (player1, player2):
+            if player.bot.scheduler is not None:
+                player.bot.scheduler.adaptive = True
+    
+    # Optionally move training off the frame path into background learners
+    learners = []
+    if '--async-train' in sys.argv:
+        for player in (player1, player2):
+            learner = Learner.for_agent(player.bot.agent, f'models/dqn_model_p{player.player_number}.pth')
+            learner.start()
+            player.bot.attach_learner(learner)
+            learners.append(learner)
+    
+    # Profiles can be started while the controller runs: by signal (see PROFILING_CONFIG['SIGNALS'])
+    # or by command on --profile-port
+    profiler = RuntimeProfiler()
+    signals = install_signal_handlers(profiler)
+    if signals:
+        logger.info("Send %s to process %s to profile it", ' or '.join(signals), os.getpid())
+    control = None
+    control_port = PROFILING_CONFIG['CONTROL_PORT']
+    if '--profile-port' in sys.argv:
+        control_port = int(sys.argv[sys.argv.index('--profile-port') + 1])
+    if control_port is not None:
+        control = ControlServer(profiler, control_port).start()
+    
     try:
         # Main game loop
         while True:
-            # Process player 1 if connected (human player 1)
-            if player1.connected:
-                game_state1, p1_buttons = player1.process_frame()
-                
-                # If we have a valid game state, generate AI moves as player 2
-                if game_state1 is not None:
-                    # Generate AI moves for player 2
-                    p2_buttons = player2.bot.fight(game_state1, "2")
-                    logger.info(f"AI (P2) pressed: {button_state_to_string(p2_buttons)}")
-                else:
-                    p2_buttons = Buttons()
-            # Process player 2 if connected (human player 2)
-            elif player2.connected:
-                game_state2, human_p2_buttons = player2.process_frame()
-                
-                # If we have a valid game state, generate AI moves as player 1
-                # but record them as player 2 for consistency
-                if game_state2 is not None:
-                    # Generate AI moves (technically as player 1)
-                    ai_buttons = player1.bot.fight(game_state2, "1")
-                    logger.info(f"AI (recorded as P2) pressed: {button_state_to_string(ai_buttons)}")
-                    
-                    # Record human as player 1 and AI as player 2
-                    p1_buttons = human_p2_buttons  # Human actions recorded as P1
-                    p2_buttons = ai_buttons        # AI actions recorded as P2
-                else:
-                    p1_buttons = Buttons()
-                    p2_buttons = Buttons()
-            else:
-                # No players connected
-                game_state1 = None
-                game_state2 = None
-                p1_buttons = Buttons()
-                p2_buttons = Buttons()
-                
-            # Use whichever game state is available
-            game_state = game_state1 if game_state1 is not None else game_state2
-                
-            # Record the frame if we have a valid game state
-            if game_state is not None:                
-                # Record both players' actions
-                recorder.record_frame(
-                    game_state,
-                    p1_buttons,
-                    p2_buttons
-                )
-                
-                # Debug output for both players' actions
-                print(f"[{datetime.now().strftime('%H:%M:%S.%f')}] P1 buttons: {button_state_to_string(p1_buttons)}")
-                print(f"[{datetime.now().strftime('%H:%M:%S.%f')}] P2 buttons (AI): {button_state_to_string(p2_buttons)}")
-                
-                # Log specific action button presses with more detail
-                log_action_buttons(1, p1_buttons)
-                log_action_buttons(2, p2_buttons)
+            profiler.poll()
+            game_state = run_frame(player1, player2, recorder, timer)
             
             # Check if round is over
             if (game_state is not None and game_state.is_round_over) or \
                (not player1.connected and not player2.connected):
                 break
-                
-            # Small delay to prevent CPU hogging
-            time.sleep(0.01)
             
         logger.info("Round finished")
         
     except KeyboardInterrupt:
         logger.info("Recording interrupted by user")
     except Exception as e:
-        logger.error(f"Error during recording: {str(e)}")
+        logger.error("Error during recording: %s", e)
     finally:
+        if control is not None:
+            control.close()
+        profiler.close()
+        for learner in learners:
+            learner.stop()
+        for player in (player1, player2):
+            player.bot.close()
+        if timer.enabled:
+            logger.info(timer.report())
         player1.disconnect()
         player2.disconnect()
         recorder.close()
@@ -1,25 +1,42 @@
 import csv
 import os
+import time
 from datetime import datetime
-from logger import logger
+from config import RECORDING_CONFIG
+from logger import logger, frame_log
+from trajectory import CSV_COLUMNS, TrajectoryWriter, trajectory_path
+
+# Buttons logged for each player, as (label, Buttons attribute)
+BUTTON_LABELS = (
+    ("Up", 'up'), ("Down", 'down'), ("Left", 'left'), ("Right", 'right'),
+    ("Y (Heavy Punch)", 'Y'), ("B (Medium Punch)", 'B'), ("A (Light Punch)", 'A'),
+    ("X (Heavy Kick)", 'X'), ("L (Medium Kick)", 'L'), ("R (Light Kick)", 'R')
+)
 
 class DataRecorder:
-    def __init__(self):
-        self.records = []
+    def __init__(self, filename="game_data.csv", format=RECORDING_CONFIG['FORMAT']):
         self.start_time = datetime.now()
-        self.filename = "game_data.csv"  # Use a fixed filename
+        self.filename = filename
+        self.format = format
         self.csv_file = None
         self.csv_writer = None
+        self.trajectory = None
         self.frame_count = 0
         self.current_round = 1
+        self.last_fsync = time.monotonic()
         
         # Create data directory if it doesn't exist
         if not os.path.exists('data'):
             os.makedirs('data')
             
-        # Initialize CSV file
-        self.initialize_csv()
-        print(f"[{datetime.now().strftime('%H:%M:%S.%f')}] Data Recorder initialized")
+        # Initialize the legacy CSV file or the buffered trajectory writer
+        if format == 'csv':
+            self.initialize_csv()
+        else:
+            path = os.path.join('data', trajectory_path(filename, format))
+            self.trajectory = TrajectoryWriter(path, format)
+            logger.info(f"Recording {format} trajectory to {self.trajectory.path}")
+        logger.info("Data Recorder initialized")
         
     def initialize_csv(self):
         """Initialize CSV file with headers"""
@@ -34,24 +51,7 @@ class DataRecorder:
         
         # Write headers only if file is new
         if not file_exists:
-            headers = [
-                'timestamp', 'round', 'frame',
-                # Player 1 state
-                'p1_character', 'p1_health', 'p1_x', 'p1_y', 
-                'p1_jumping', 'p1_crouching', 'p1_in_move', 'p1_move_id',
-                # Player 2 state
-                'p2_character', 'p2_health', 'p2_x', 'p2_y',
-                'p2_jumping', 'p2_crouching', 'p2_in_move', 'p2_move_id',
-                # Game state
-                'timer', 'has_round_started', 'is_round_over', 'fight_result',
-                # Player 1 buttons
-                'p1_up', 'p1_down', 'p1_left', 'p1_right',
-                'p1_Y', 'p1_B', 'p1_A', 'p1_X', 'p1_L', 'p1_R',
-                # Player 2 buttons
-                'p2_up', 'p2_down', 'p2_left', 'p2_right',
-                'p2_Y', 'p2_B', 'p2_A', 'p2_X', 'p2_L', 'p2_R'
-            ]
-            self.csv_writer.writerow(headers)
+            self.csv_writer.writerow(CSV_COLUMNS)
             logger.info(f"Created new CSV file: {filepath}")
         else:
             logger.info(f"Appending to existing CSV file: {filepath}")
@@ -60,31 +60,40 @@ class DataRecorder:
         """Convert button value to readable name"""
         return "Pressed" if button_value else "Released"
         
-    def print_button_state(self, player_num, button_name, state):
-        """Print button state in a readable format"""
-        if state:  # Only print when button is pressed
-            print(f"[{datetime.now().strftime('%H:%M:%S.%f')}] Player {player_num} {button_name}: {self.get_button_name(state)}")
-        
-    def print_game_state(self, game_state):
-        """Print current game state"""
-        print(f"\n[{datetime.now().strftime('%H:%M:%S.%f')}] Game State Update:")
-        print(f"Round: {self.current_round}, Timer: {game_state.timer}")
-        print(f"Round Started: {game_state.has_round_started}, Round Over: {game_state.is_round_over}")
-        
-        # Player 1 info
-        print(f"Player 1 - Character: {game_state.player1.player_id}, Health: {game_state.player1.health}")
-        print(f"Position: ({game_state.player1.x_coord}, {game_state.player1.y_coord})")
-        print(f"Jumping: {game_state.player1.is_jumping}, Crouching: {game_state.player1.is_crouching}")
-        print(f"In Move: {game_state.player1.is_player_in_move}, Move ID: {game_state.player1.move_id}")
-        
-        # Player 2 info
-        print(f"Player 2 - Character: {game_state.player2.player_id}, Health: {game_state.player2.health}")
-        print(f"Position: ({game_state.player2.x_coord}, {game_state.player2.y_coord})")
-        print(f"Jumping: {game_state.player2.is_jumping}, Crouching: {game_state.player2.is_crouching}")
-        print(f"In Move: {game_state.player2.is_player_in_move}, Move ID: {game_state.player2.move_id}")
+    def log_button_state(self, player_num, button_name, state):
+        """Log button state in a readable format"""
+        if state:  # Only log when button is pressed
+            logger.info("Player %s %s: %s", player_num, button_name, self.get_button_name(state))
+        
+    def log_game_state(self, game_state):
+        """Log current game state"""
+        p1 = game_state.player1
+        p2 = game_state.player2
+        logger.info(
+            "Game State Update:\n"
+            "Round: %s, Timer: %s\n"
+            "Round Started: %s, Round Over: %s\n"
+            "Player 1 - Character: %s, Health: %s\n"
+            "Position: (%s, %s)\n"
+            "Jumping: %s, Crouching: %s\n"
+            "In Move: %s, Move ID: %s\n"
+            "Player 2 - Character: %s, Health: %s\n"
+            "Position: (%s, %s)\n"
+            "Jumping: %s, Crouching: %s\n"
+            "In Move: %s, Move ID: %s",
+            self.current_round, game_state.timer, game_state.has_round_started, game_state.is_round_over,
+            p1.player_id, p1.health, p1.x_coord, p1.y_coord, p1.is_jumping, p1.is_crouching,
+            p1.is_player_in_move, p1.move_id,
+            p2.player_id, p2.health, p2.x_coord, p2.y_coord, p2.is_jumping, p2.is_crouching,
+            p2.is_player_in_move, p2.move_id
+        )
+        
+    # Old names, from when these printed instead of logging
+    print_button_state = log_button_state
+    print_game_state = log_game_state
         
     def record_frame(self, game_state, player1_buttons, player2_buttons):
-        """Record a frame of game data and save to CSV"""
+        """Record a frame of game data"""
         self.frame_count += 1
         current_time = (datetime.now() - self.start_time).total_seconds()
         
@@ -92,37 +101,18 @@ class DataRecorder:
         if game_state.is_round_over:
             self.current_round += 1
         
-        # Print frame count every 60 frames (approximately 1 second)
-        if self.frame_count % 60 == 0:
-            print(f"\n[{datetime.now().strftime('%H:%M:%S.%f')}] Frame {self.frame_count} - Data still being received")
-        
-        # Print game state every 180 frames (approximately 3 seconds)
-        if self.frame_count % 180 == 0:
-            self.print_game_state(game_state)
-        
-        # Print button states for player 1
-        self.print_button_state(1, "Up", player1_buttons.up)
-        self.print_button_state(1, "Down", player1_buttons.down)
-        self.print_button_state(1, "Left", player1_buttons.left)
-        self.print_button_state(1, "Right", player1_buttons.right)
-        self.print_button_state(1, "Y (Heavy Punch)", player1_buttons.Y)
-        self.print_button_state(1, "B (Medium Punch)", player1_buttons.B)
-        self.print_button_state(1, "A (Light Punch)", player1_buttons.A)
-        self.print_button_state(1, "X (Heavy Kick)", player1_buttons.X)
-        self.print_button_state(1, "L (Medium Kick)", player1_buttons.L)
-        self.print_button_state(1, "R (Light Kick)", player1_buttons.R)
-        
-        # Print button states for player 2
-        self.print_button_state(2, "Up", player2_buttons.up)
-        self.print_button_state(2, "Down", player2_buttons.down)
-        self.print_button_state(2, "Left", player2_buttons.left)
-        self.print_button_state(2, "Right", player2_buttons.right)
-        self.print_button_state(2, "Y (Heavy Punch)", player2_buttons.Y)
-        self.print_button_state(2, "B (Medium Punch)", player2_buttons.B)
-        self.print_button_state(2, "A (Light Punch)", player2_buttons.A)
-        self.print_button_state(2, "X (Heavy Kick)", player2_buttons.X)
-        self.print_button_state(2, "L (Medium Kick)", player2_buttons.L)
-        self.print_button_state(2, "R (Light Kick)", player2_buttons.R)
+        # Log progress, game state and pressed buttons for a sample of frames (see LOGGING_CONFIG)
+        if frame_log.should_log('recorder'):
+            logger.info("Frame %s - Data still being received", self.frame_count)
+            self.log_game_state(game_state)
+            for player_num, buttons in ((1, player1_buttons), (2, player2_buttons)):
+                for button_name, attribute in BUTTON_LABELS:
+                    self.log_button_state(player_num, button_name, getattr(buttons, attribute))
+        
+        if self.trajectory is not None:
+            self.trajectory.append(current_time, self.current_round, self.frame_count,
+                                   game_state, player1_buttons, player2_buttons)
+            return
         
         # Get fight result (if available)
         fight_result = getattr(game_state, 'fight_result', 'None')
@@ -179,18 +169,30 @@ class DataRecorder:
             player2_buttons.R
         ]
         
-        # Write to CSV
+        # Write to CSV; rows reach the disk on the trajectory writers' chunk and fsync schedule
         self.csv_writer.writerow(row)
-        self.csv_file.flush()  # Ensure data is written to disk
+        if self.frame_count % RECORDING_CONFIG['CHUNK_FRAMES'] == 0:
+            self.flush_csv(time.monotonic() - self.last_fsync >= RECORDING_CONFIG['FSYNC_SECONDS'])
         
-        # Also store in memory for potential analysis
-        self.records.append(row)
+    def flush_csv(self, fsync=False):
+        """Hand the buffered CSV rows to the OS, and to the disk with `fsync`"""
+        self.csv_file.flush()
+        if fsync:
+            os.fsync(self.csv_file.fileno())
+            self.last_fsync = time.monotonic()
         
     def close(self):
-        """Close the CSV file"""
+        """Close the CSV file or write out the last trajectory chunk"""
+        if self.trajectory is not None:
+            self.trajectory.close()
+            self.trajectory = None
+            logger.info("Data Recorder closed. Total frames recorded: %s", self.frame_count)
+            logger.info(f"Closed trajectory: {self.filename}")
         if self.csv_file:
+            self.flush_csv(fsync=True)
             self.csv_file.close()
-            print(f"[{datetime.now().strftime('%H:%M:%S.%f')}] Data Recorder closed. Total frames recorded: {self.frame_count}")
+            self.csv_file = None
+            logger.info("Data Recorder closed. Total frames recorded: %s", self.frame_count)
             logger.info(f"Closed CSV file: {self.filename}")
             
     def __del__(self):
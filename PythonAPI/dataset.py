@@ -0,0 +1,162 @@
+import argparse
+import os
+import numpy as np
+from archive import ArchiveReader, index_path
+from config import OBSERVATION_CONFIG, RECORDING_CONFIG
+from features import buttons_to_action, column_features, column_players, column_rewards, observation_size
+from logger import logger, setup_logger
+from trajectory import iter_chunks
+
+# Columns a transition is built from
+TRANSITION_COLUMNS = (
+    'p1_health', 'p1_x', 'p1_y', 'p1_jumping', 'p1_crouching', 'p1_in_move', 'p1_move_id', 'p1_buttons',
+    'p2_health', 'p2_x', 'p2_y', 'p2_jumping', 'p2_crouching', 'p2_in_move', 'p2_move_id', 'p2_buttons',
+    'timer', 'has_round_started', 'is_round_over'
+)
+
+def iter_frame_chunks(source, chunk_frames=RECORDING_CONFIG['CHUNK_FRAMES']):
+    """Yield (match, {column: array}) chunks of a recording or of every match in an archive"""
+    if os.path.isfile(index_path(source)):
+        reader = ArchiveReader(source)
+        for match in range(reader.matches()):
+            frames = reader.match(match)
+            for start in range(0, len(frames), chunk_frames):
+                chunk = frames[start:start + chunk_frames]
+                yield match, {name: chunk[name] for name in TRANSITION_COLUMNS}
+    else:
+        for columns in iter_chunks(source):
+            yield 0, columns
+
+def iter_transitions(source, player_number=1, health_weight=None, distance_weight=None,
+                     frames=OBSERVATION_CONFIG['FRAMES'], normalize=OBSERVATION_CONFIG['NORMALIZE']):
+    """Yield (states, actions, rewards, next_states, dones) arrays, one set per chunk of `source`
+
+    Transitions follow DQNAgent.get_state/get_reward from `player_number`'s side, with
+    observations stacking `frames` frames like ObservationEncoder's, and the buttons
+    that player pressed mapped onto the bot's action space.
+    Rewards are computed as the chunks load, with REWARD_CONFIG's weights unless given.
+    Frames whose buttons match no action, and the frames after a round ended,
+    start no transition.
+    """
+    player, _ = column_players(player_number)
+    previous, previous_match = None, None
+    for match, columns in iter_frame_chunks(source):
+        columns = {name: columns[name] for name in TRANSITION_COLUMNS}
+        carried = 0
+        if previous is not None and match == previous_match:
+            # Carry the last `frames` frames over, so the chunk boundary still yields a
+            # transition and its observations still see their history
+            carried = len(previous['timer'])
+            columns = {name: np.concatenate([previous[name], columns[name]]) for name in TRANSITION_COLUMNS}
+        previous = {name: values[-frames:] for name, values in columns.items()}
+        previous_match = match
+        if len(columns['timer']) < 2:
+            continue
+        features = column_features(columns, player_number, frames, normalize)
+        actions = buttons_to_action(columns[f'{player}_buttons'][:-1])
+        valid = (actions >= 0) & ~columns['is_round_over'][:-1].astype(bool)
+        # Transitions from all but the last carried frame were yielded with the previous chunk
+        valid[:max(carried - 1, 0)] = False
+        yield (features[:-1][valid], actions[valid], column_rewards(columns, player_number, health_weight, distance_weight)[valid],
+               features[1:][valid], columns['is_round_over'][1:][valid].astype(np.float32))
+
+class ShuffleWindow:
+    """Bounded shuffle buffer: batches are drawn at random from the last `size` transitions"""
+
+    def __init__(self, size, batch_size, state_size=None, seed=None):
+        state_size = observation_size() if state_size is None else state_size
+        self.capacity = size
+        self.batch_size = batch_size
+        self.random = np.random.default_rng(seed)
+        self.states = np.zeros((size, state_size), dtype=np.float32)
+        self.actions = np.zeros(size, dtype=np.int64)
+        self.rewards = np.zeros(size, dtype=np.float32)
+        self.next_states = np.zeros((size, state_size), dtype=np.float32)
+        self.dones = np.zeros(size, dtype=np.float32)
+        self.columns = (self.states, self.actions, self.rewards, self.next_states, self.dones)
+        self.size = 0
+
+    def add(self, transitions):
+        """Take in a chunk of transitions and yield every batch that frees room for it"""
+        count = len(transitions[1])
+        taken = 0
+        while taken < count:
+            if self.size < self.capacity:
+                rows = min(self.capacity - self.size, count - taken)
+                slots = np.arange(self.size, self.size + rows)
+                self.size += rows
+            else:
+                rows = min(self.batch_size, count - taken)
+                slots = self.random.choice(self.capacity, rows, replace=False)
+                yield self._gather(slots)
+            for column, values in zip(self.columns, transitions):
+                column[slots] = values[taken:taken + rows]
+            taken += rows
+
+    def drain(self):
+        """Yield what is left in the window in random order"""
+        order = self.random.permutation(self.size)
+        for start in range(0, len(order), self.batch_size):
+            yield self._gather(order[start:start + self.batch_size])
+        self.size = 0
+
+    def _gather(self, slots):
+        return tuple(column[slots] for column in self.columns)
+
+def iter_batches(sources, batch_size=64, player_number=1, shuffle_window=50000, seed=None,
+                 frames=OBSERVATION_CONFIG['FRAMES'], normalize=OBSERVATION_CONFIG['NORMALIZE']):
+    """Shuffled transition batches from any number of recordings, in constant memory"""
+    window = ShuffleWindow(shuffle_window, batch_size, observation_size(frames), seed)
+    for source in sources:
+        for transitions in iter_transitions(source, player_number, frames=frames, normalize=normalize):
+            yield from window.add(transitions)
+    yield from window.drain()
+
+def pretrain(agent, batches, epochs=1, target_update_every=1000):
+    """Run DQNAgent.train_batch over offline batches; `batches` is a callable returning an iterator"""
+    steps = 0
+    losses = []
+    for _ in range(epochs):
+        for batch in batches():
+            if len(batch[1]) < agent.batch_size:
+                continue
+            loss, _ = agent.train_batch(*batch)
+            losses.append(loss)
+            steps += 1
+            if steps % target_update_every == 0:
+                agent.update_target_network()
+    agent.update_target_network()
+    return {'steps': steps, 'mean_loss': float(np.mean(losses)) if losses else None}
+
+def main():
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Pretrain a DQN model on recorded matches")
+    parser.add_argument('recordings', nargs='+', help=".traj directories, .parquet/.csv files or archives")
+    parser.add_argument('--player', type=int, choices=[1, 2], default=1,
+                        help="learn from this player's side and buttons")
+    parser.add_argument('--model', help="checkpoint to start from and save to (default models/dqn_model_p<player>.pth)")
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--shuffle-window', type=int, default=50000)
+    parser.add_argument('--target-update-every', type=int, default=1000)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    from dqn import DQNAgent
+    from features import ACTION_SIZE
+
+    model_path = args.model or f'models/dqn_model_p{args.player}.pth'
+    agent = DQNAgent(observation_size(), ACTION_SIZE, args.player)
+    agent.batch_size = args.batch_size
+    if os.path.exists(model_path):
+        agent.load_model(model_path)
+
+    def batches():
+        return iter_batches(args.recordings, args.batch_size, args.player, args.shuffle_window, args.seed)
+
+    stats = pretrain(agent, batches, args.epochs, args.target_update_every)
+    agent.save_model(model_path)
+    logger.info(f"Pretrained {model_path} for {stats['steps']} steps, mean loss {stats['mean_loss']}")
+
+if __name__ == '__main__':
+    main()
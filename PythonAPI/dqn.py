@@ -2,9 +2,11 @@ import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from collections import deque
 import random
+import copy
 from logger import logger
+from config import OBSERVATION_CONFIG, PRIORITIZED_REPLAY_CONFIG
+from features import STATE_SIZE, TRANSITION_ARRAYS, ObservationEncoder, column_features, column_rewards, game_state_reward, state_rewards
 
 class DQN(nn.Module):
     def __init__(self, input_size, output_size):
@@ -19,24 +21,226 @@ class DQN(nn.Module):
         return self.fc3(x)
 
 class ReplayBuffer:
-    def __init__(self, capacity):
-        self.buffer = deque(maxlen=capacity)
+    """Ring buffer of transitions stored in preallocated contiguous arrays"""
+    def __init__(self, capacity, state_size=None):
+        self.capacity = capacity
+        self.state_size = state_size
+        self.position = 0
+        self.size = 0
+        self.states = None
+        self.batch = None
+        if state_size is not None:
+            self._allocate(state_size)
+            
+    def _allocate(self, state_size):
+        self.state_size = state_size
+        self.states = np.zeros((self.capacity, state_size), dtype=np.float32)
+        self.next_states = np.zeros((self.capacity, state_size), dtype=np.float32)
+        self.actions = np.zeros(self.capacity, dtype=np.int64)
+        self.rewards = np.zeros(self.capacity, dtype=np.float32)
+        self.dones = np.zeros(self.capacity, dtype=np.float32)
+        
+    def _batch_arrays(self, batch_size):
+        # Output arrays are reused by every sample() of the same size
+        if self.batch is None or len(self.batch[1]) != batch_size:
+            self.batch = (
+                np.empty((batch_size, self.state_size), dtype=np.float32),
+                np.empty(batch_size, dtype=np.int64),
+                np.empty(batch_size, dtype=np.float32),
+                np.empty((batch_size, self.state_size), dtype=np.float32),
+                np.empty(batch_size, dtype=np.float32)
+            )
+        return self.batch
         
     def push(self, state, action, reward, next_state, done):
-        self.buffer.append((state, action, reward, next_state, done))
+        state = np.asarray(state, dtype=np.float32).reshape(-1)
+        if self.states is None:
+            self._allocate(state.shape[0])
+        i = self.position
+        self.states[i] = state
+        self.next_states[i] = np.asarray(next_state, dtype=np.float32).reshape(-1)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        
+    def sample_indices(self, batch_size):
+        return np.random.randint(0, self.size, size=batch_size)
+        
+    def relabel(self, normalize=OBSERVATION_CONFIG['NORMALIZE'], health_weight=None, distance_weight=None):
+        """Recompute every stored reward from the stored observations (see features.state_rewards)"""
+        if self.size:
+            self.rewards[:self.size] = state_rewards(self.states[:self.size], self.next_states[:self.size],
+                                                     normalize, health_weight, distance_weight)
+        
+    def save(self, path, normalized=None):
+        """Write the stored transitions, oldest first, to an .npz file
+
+        `normalized` records whether the observations are normalized, for relabel.py.
+        """
+        order = (np.arange(self.size) + self.position - self.size) % self.capacity
+        flags = {} if normalized is None else {'normalized': np.array(bool(normalized))}
+        np.savez(path, states=self.states[order], actions=self.actions[order], rewards=self.rewards[order],
+                 next_states=self.next_states[order], dones=self.dones[order], **flags)
+        
+    def load(self, path):
+        """Push the transitions of an .npz file written by save() or relabel.py"""
+        with np.load(path) as transitions:
+            return self.extend(*(transitions[name] for name in TRANSITION_ARRAYS))
+            
+    def extend(self, states, actions, rewards, next_states, dones):
+        """push() a whole batch of transitions at once; returns the slots they went to"""
+        states = np.asarray(states, dtype=np.float32).reshape(len(actions), -1)
+        if self.states is None:
+            self._allocate(states.shape[1])
+        # Only the newest `capacity` transitions would survive
+        keep = slice(max(0, len(actions) - self.capacity), None)
+        count = len(actions[keep])
+        indices = (self.position + np.arange(count)) % self.capacity
+        self.states[indices] = states[keep]
+        self.next_states[indices] = np.asarray(next_states, dtype=np.float32).reshape(len(actions), -1)[keep]
+        self.actions[indices] = actions[keep]
+        self.rewards[indices] = rewards[keep]
+        self.dones[indices] = dones[keep]
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        return indices
+        
+    def gather(self, indices):
+        """Copy the rows at `indices` into the reusable batch arrays"""
+        states, actions, rewards, next_states, dones = self._batch_arrays(len(indices))
+        np.take(self.states, indices, axis=0, out=states)
+        np.take(self.actions, indices, out=actions)
+        np.take(self.rewards, indices, out=rewards)
+        np.take(self.next_states, indices, axis=0, out=next_states)
+        np.take(self.dones, indices, out=dones)
+        return states, actions, rewards, next_states, dones
         
     def sample(self, batch_size):
-        return random.sample(self.buffer, batch_size)
+        """Return (states, actions, rewards, next_states, dones) batch arrays
+        
+        The arrays are reused: the next sample (or gather) of the same batch size
+        overwrites them in place. Copy anything needed past that call.
+        """
+        return self.gather(self.sample_indices(batch_size))
         
     def __len__(self):
-        return len(self.buffer)
+        return self.size
+
+class SumTree:
+    """Array-backed binary tree where every node holds the sum of its children"""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.leaves = 1
+        while self.leaves < capacity:
+            self.leaves *= 2
+        self.depth = self.leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaves, dtype=np.float64)
+        
+    def total(self):
+        return self.tree[1]
+        
+    def get(self, indices):
+        return self.tree[np.asarray(indices) + self.leaves]
+        
+    def update(self, index, priority):
+        """Set one leaf and refresh its ancestors in O(log n)"""
+        node = index + self.leaves
+        self.tree[node] = priority
+        node //= 2
+        while node >= 1:
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+            node //= 2
+            
+    def update_batch(self, indices, priorities):
+        """Set many leaves and refresh the shared ancestors once per level"""
+        nodes = np.asarray(indices) + self.leaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            
+    def find(self, values):
+        """Return the leaf index whose prefix-sum interval contains each value"""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            go_right = values > left_sums
+            values -= left_sums * go_right
+            nodes = left + go_right
+        return np.minimum(nodes - self.leaves, self.capacity - 1)
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Replay buffer sampling transitions in proportion to their TD error"""
+    def __init__(self, capacity, state_size=None, alpha=PRIORITIZED_REPLAY_CONFIG['ALPHA'],
+                 beta=PRIORITIZED_REPLAY_CONFIG['BETA'], beta_steps=PRIORITIZED_REPLAY_CONFIG['BETA_STEPS'],
+                 epsilon=PRIORITIZED_REPLAY_CONFIG['EPSILON']):
+        super(PrioritizedReplayBuffer, self).__init__(capacity, state_size)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        # Anneal beta to 1 over beta_steps samples
+        self.beta_increment = (1.0 - beta) / beta_steps if beta_steps else 0.0
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        
+    def push(self, state, action, reward, next_state, done):
+        index = self.position
+        super(PrioritizedReplayBuffer, self).push(state, action, reward, next_state, done)
+        # New transitions get the highest priority so they are replayed at least once
+        self.tree.update(index, self.max_priority ** self.alpha)
+        
+    def extend(self, states, actions, rewards, next_states, dones):
+        indices = super(PrioritizedReplayBuffer, self).extend(states, actions, rewards, next_states, dones)
+        self.tree.update_batch(indices, np.full(len(indices), self.max_priority ** self.alpha))
+        return indices
+        
+    def relabel(self, normalize=OBSERVATION_CONFIG['NORMALIZE'], health_weight=None, distance_weight=None):
+        super(PrioritizedReplayBuffer, self).relabel(normalize, health_weight, distance_weight)
+        # TD errors of the old rewards say nothing about the new ones, replay everything again
+        self.tree.update_batch(np.arange(self.size), np.full(self.size, self.max_priority ** self.alpha))
+        
+    def sample_indices(self, batch_size):
+        # Stratified sampling: one draw from each equal slice of the total priority
+        segment = self.tree.total() / batch_size
+        values = (np.arange(batch_size) + np.random.random_sample(batch_size)) * segment
+        return np.minimum(self.tree.find(values), self.size - 1)
+        
+    def sample(self, batch_size):
+        """Return the five batch arrays plus importance-sampling weights and indices
+        
+        The five batch arrays are reused as ReplayBuffer.sample's are; weights and indices are fresh.
+        """
+        indices = self.sample_indices(batch_size)
+        probabilities = self.tree.get(indices) / self.tree.total()
+        weights = (self.size * probabilities) ** -self.beta
+        weights = (weights / weights.max()).astype(np.float32)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return self.gather(indices) + (weights, indices)
+        
+    def update_priorities(self, indices, td_errors):
+        """Set the priorities of sampled transitions from their new TD errors"""
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64)) + self.epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update_batch(indices, priorities ** self.alpha)
 
 class DQNAgent:
-    def __init__(self, state_size, action_size, player_number):
+    def __init__(self, state_size, action_size, player_number, memory_capacity=10000, prioritized=False,
+                 policy_net=None, normalize=OBSERVATION_CONFIG['NORMALIZE']):
+        if state_size % STATE_SIZE:
+            raise ValueError(f"State size {state_size} is not a stack of {STATE_SIZE}-feature frames")
         self.state_size = state_size
         self.action_size = action_size
         self.player_number = player_number
         
+        # Observations stack state_size / STATE_SIZE frames, encoded in place; each ring
+        # buffer view gets one tensor sharing its memory, so get_state allocates nothing
+        self.encoder = ObservationEncoder(state_size // STATE_SIZE, normalize)
+        self.state_tensors = tuple(torch.from_numpy(view).unsqueeze(0) for view in self.encoder.views)
+        
         # Hyperparameters
         self.gamma = 0.99
         self.epsilon = 1.0
@@ -44,99 +248,115 @@ class DQNAgent:
         self.epsilon_decay = 0.995
         self.learning_rate = 0.001
         self.batch_size = 64
-        self.memory = ReplayBuffer(10000)
+        self.prioritized = prioritized
+        if prioritized:
+            self.memory = PrioritizedReplayBuffer(memory_capacity, state_size)
+        else:
+            self.memory = ReplayBuffer(memory_capacity, state_size)
         
-        # Initialize networks
+        # Initialize networks; an agent given a (shared) policy network only acts
+        if policy_net is not None:
+            self.policy_net = policy_net
+            self.target_net = None
+            self.optimizer = None
+            return
         self.policy_net = DQN(state_size, action_size)
         self.target_net = DQN(state_size, action_size)
         self.target_net.load_state_dict(self.policy_net.state_dict())
         
         self.optimizer = optim.Adam(self.policy_net.parameters(), lr=self.learning_rate)
         
+    @property
+    def trainable(self):
+        return self.optimizer is not None
+        
+    def drop_training_state(self):
+        """Free the target network and optimizer of an agent that will only act from now on"""
+        self.target_net = None
+        self.optimizer = None
+        
     def get_state(self, game_state):
-        """Convert game state to tensor"""
-        # Extract relevant features from game state
-        if self.player_number == 1:
-            player = game_state.player1
-            opponent = game_state.player2
-        else:
-            player = game_state.player2
-            opponent = game_state.player1
-            
-        # Create state array with all relevant features
-        state = np.array([
-            player.x_coord,
-            player.y_coord,
-            player.health,
-            player.is_jumping,
-            player.is_crouching,
-            player.is_player_in_move,
-            player.move_id,
-            opponent.x_coord,
-            opponent.y_coord,
-            opponent.health,
-            opponent.is_jumping,
-            opponent.is_crouching,
-            opponent.is_player_in_move,
-            opponent.move_id,
-            game_state.timer,
-            game_state.has_round_started,
-            game_state.is_round_over
-        ], dtype=np.float32)
-        
-        # Convert to tensor and add batch dimension
-        return torch.FloatTensor(state).unsqueeze(0)
+        """Encode a game state as a 1 x state_size tensor, valid until the next-but-one call"""
+        self.encoder.encode(game_state, self.player_number)
+        return self.state_tensors[self.encoder.slot]
+        
+    def push_state(self, game_state):
+        """Add a game state to the observation history without returning an observation"""
+        self.encoder.encode(game_state, self.player_number)
+        
+    def keep_state(self, state):
+        """Copy of a get_state observation that outlives further get_state and push_state calls"""
+        return state.clone()
+        
+    def get_states(self, game_states):
+        """Encode a list of consecutive game states as a (n, state_size) float32 array"""
+        return self.encoder.encode_batch(game_states, self.player_number)
         
     def get_reward(self, game_state, next_game_state):
         """Calculate reward based on game state changes"""
-        if self.player_number == 1:
-            player = game_state.player1
-            opponent = game_state.player2
-            next_player = next_game_state.player1
-            next_opponent = next_game_state.player2
-        else:
-            player = game_state.player2
-            opponent = game_state.player1
-            next_player = next_game_state.player2
-            next_opponent = next_game_state.player1
-            
-        # Calculate health difference
-        health_diff = (next_opponent.health - opponent.health) - (next_player.health - player.health)
+        return game_state_reward(game_state, next_game_state, self.player_number)
         
-        # Calculate distance to opponent
-        current_dist = abs(player.x_coord - opponent.x_coord)
-        next_dist = abs(next_player.x_coord - next_opponent.x_coord)
-        dist_diff = current_dist - next_dist
+    def get_column_states(self, columns):
+        """get_state over recorded column arrays, one (n, state_size) float32 row per frame"""
+        return column_features(columns, self.player_number, self.encoder.frames, self.encoder.normalize)
         
-        # Combine rewards
-        reward = health_diff * 10 + dist_diff * 0.1
+    def get_column_rewards(self, columns, health_weight=None, distance_weight=None):
+        """get_reward between each pair of consecutive recorded frames, n - 1 values"""
+        return column_rewards(columns, self.player_number, health_weight, distance_weight)
         
-        return reward
+    def explore_action(self):
+        """Return a random action with probability epsilon, otherwise None"""
+        if random.random() < self.epsilon:
+            return random.randrange(self.action_size)
+        return None
         
     def select_action(self, state):
         """Select action using epsilon-greedy policy"""
-        if random.random() < self.epsilon:
-            return random.randrange(self.action_size)
+        action = self.explore_action()
+        if action is not None:
+            return action
             
         with torch.no_grad():
             return self.policy_net(state).argmax().item()
             
-    def train(self):
-        """Train the network on a batch of experiences"""
+    def select_actions(self, states):
+        """Epsilon-greedy actions for a (batch, state_size) array of states"""
+        with torch.no_grad():
+            actions = self.policy_net(torch.from_numpy(np.asarray(states, dtype=np.float32))).argmax(1).numpy()
+        explore = np.random.random_sample(len(actions)) < self.epsilon
+        actions[explore] = np.random.randint(0, self.action_size, size=int(explore.sum()))
+        return actions
+        
+    def train(self, decay_epsilon=True):
+        """Train the network on a batch of experiences; a TrainingScheduler decays epsilon itself"""
         if len(self.memory) < self.batch_size:
             return
             
         batch = self.memory.sample(self.batch_size)
-        states, actions, rewards, next_states, dones = zip(*batch)
+        if self.prioritized:
+            # Importance-sampling weights correct the bias of prioritized sampling
+            weights, indices = batch[5:]
+            loss, td_errors = self.train_batch(*batch[:5], weights=weights)
+            self.memory.update_priorities(indices, td_errors)
+        else:
+            loss, _ = self.train_batch(*batch[:5])
         
-        # Stack states and next_states properly
-        states = torch.cat(states)  # Shape: [batch_size, state_size]
-        next_states = torch.cat(next_states)  # Shape: [batch_size, state_size]
+        # Update epsilon
+        if decay_epsilon:
+            self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
+        
+        return loss
         
-        # Convert other tensors
-        actions = torch.tensor(actions, dtype=torch.long)  # Shape: [batch_size]
-        rewards = torch.tensor(rewards, dtype=torch.float32)  # Shape: [batch_size]
-        dones = torch.tensor(dones, dtype=torch.float32)  # Shape: [batch_size]
+    def train_batch(self, states, actions, rewards, next_states, dones, weights=None):
+        """One gradient step on a batch of transition arrays, returns (loss, TD errors)"""
+        if not self.trainable:
+            raise RuntimeError(f"DQN agent for player {self.player_number} only acts and cannot train")
+        # Wrap the batch arrays as tensors without copying
+        states = torch.from_numpy(np.asarray(states, dtype=np.float32))  # Shape: [batch_size, state_size]
+        next_states = torch.from_numpy(np.asarray(next_states, dtype=np.float32))  # Shape: [batch_size, state_size]
+        actions = torch.from_numpy(np.asarray(actions, dtype=np.int64))  # Shape: [batch_size]
+        rewards = torch.from_numpy(np.asarray(rewards, dtype=np.float32))  # Shape: [batch_size]
+        dones = torch.from_numpy(np.asarray(dones, dtype=np.float32))  # Shape: [batch_size]
         
         # Compute Q(s_t, a)
         current_q_values = self.policy_net(states).gather(1, actions.unsqueeze(1))  # Shape: [batch_size, 1]
@@ -147,21 +367,37 @@ class DQNAgent:
             target_q_values = rewards + (1 - dones) * self.gamma * next_q_values  # Shape: [batch_size]
             
         # Compute loss and update
-        loss = nn.MSELoss()(current_q_values.squeeze(), target_q_values)
+        td_errors = target_q_values - current_q_values.squeeze(1)
+        if weights is not None:
+            loss = (torch.from_numpy(weights) * td_errors.pow(2)).mean()
+        else:
+            loss = nn.MSELoss()(current_q_values.squeeze(), target_q_values)
         
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
         
-        # Update epsilon
-        self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
-        
-        return loss.item()
+        return loss.item(), td_errors.detach().numpy()
         
     def update_target_network(self):
         """Update target network with policy network weights"""
         self.target_net.load_state_dict(self.policy_net.state_dict())
         
+    def soft_update_target_network(self, tau):
+        """Move the target network weights a fraction `tau` towards the policy network"""
+        with torch.no_grad():
+            for target, source in zip(self.target_net.parameters(), self.policy_net.parameters()):
+                target.lerp_(source, tau)
+        
+    def snapshot(self):
+        """Checkpoint contents copied out of the live networks, safe to serialize on another thread"""
+        return {
+            'policy_net_state_dict': {name: tensor.clone() for name, tensor in self.policy_net.state_dict().items()},
+            'target_net_state_dict': {name: tensor.clone() for name, tensor in self.target_net.state_dict().items()},
+            'optimizer_state_dict': copy.deepcopy(self.optimizer.state_dict()),
+            'epsilon': self.epsilon
+        }
+        
     def save_model(self, path):
         """Save the model to a file"""
         torch.save({
@@ -174,9 +410,14 @@ class DQNAgent:
         
     def load_model(self, path):
         """Load the model from a file"""
-        checkpoint = torch.load(path)
+        self.load_checkpoint(torch.load(path))
+        logger.info(f"Loaded DQN model from {path}")
+        
+    def load_checkpoint(self, checkpoint):
+        """Copy the weights (and, when training, the optimizer state) out of a loaded checkpoint"""
         self.policy_net.load_state_dict(checkpoint['policy_net_state_dict'])
-        self.target_net.load_state_dict(checkpoint['target_net_state_dict'])
-        self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
-        self.epsilon = checkpoint['epsilon']
-        logger.info(f"Loaded DQN model from {path}") 
\ No newline at end of file
+        if self.trainable:
+            self.target_net.load_state_dict(checkpoint['target_net_state_dict'])
+            # Adam keeps the loaded state tensors as they are, so give it its own copy
+            self.optimizer.load_state_dict(copy.deepcopy(checkpoint['optimizer_state_dict']))
+        self.epsilon = checkpoint['epsilon'] 
\ No newline at end of file
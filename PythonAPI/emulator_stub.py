@@ -0,0 +1,275 @@
+import argparse
+import csv
+import random
+import socket
+import threading
+import time
+from buttons import Buttons
+from config import NETWORK_CONFIG
+from game_state import GameState
+from protocol import Connection, CODEC_NAMES, mask_to_buttons_dict
+from timing import percentile
+from trajectory import iter_chunks
+
+# Rough Street Fighter II arena geometry used by the synthetic frames
+STAGE_LEFT = 40
+STAGE_RIGHT = 470
+GROUND_Y = 192
+MAX_HEALTH = 176
+ROUND_TIMER = 99
+FRAMES_PER_TICK = 60
+
+class SyntheticFrames:
+    """Generates plausible game states and reacts to the buttons it receives"""
+
+    def __init__(self, bot_player=2, seed=None):
+        self.bot_player = bot_player
+        self.random = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.frame = 0
+        self.players = {
+            1: self._new_player(1, 150),
+            2: self._new_player(2, 350)
+        }
+        self.timer = ROUND_TIMER
+        self.round_over = False
+        self.result = 'NOT_OVER'
+
+    def _new_player(self, character, x):
+        return {
+            'character': character, 'health': MAX_HEALTH, 'x': x, 'y': GROUND_Y,
+            'jumping': False, 'crouching': False, 'in_move': False, 'move': 0,
+            'buttons': Buttons().object_to_dict(), 'air_frames': 0
+        }
+
+    def next_state(self):
+        """Return the GameState for the next frame"""
+        if self.round_over:
+            self.reset()
+        opponent = 1 if self.bot_player == 2 else 2
+        self._apply(self.players[opponent], self._scripted_buttons())
+        self.frame += 1
+        if self.frame % FRAMES_PER_TICK == 0:
+            self.timer = max(0, self.timer - 1)
+        self._resolve_hits()
+        if self.players[1]['health'] <= 0 or self.players[2]['health'] <= 0 or self.timer == 0:
+            self.round_over = True
+            if self.players[1]['health'] == self.players[2]['health']:
+                self.result = 'DRAW'
+            else:
+                self.result = 'P1' if self.players[1]['health'] > self.players[2]['health'] else 'P2'
+        return GameState({
+            'p1': self._player_dict(self.players[1]),
+            'p2': self._player_dict(self.players[2]),
+            'timer': self.timer,
+            'result': self.result,
+            'round_started': True,
+            'round_over': self.round_over
+        })
+
+    def apply_command(self, command):
+        """Apply the buttons the controller sent for the bot's player"""
+        buttons = command.player_buttons if self.bot_player == 1 else command.player2_buttons
+        self._apply(self.players[self.bot_player], buttons.object_to_dict())
+
+    def _player_dict(self, player):
+        return {key: value for key, value in player.items() if key != 'air_frames'}
+
+    def _scripted_buttons(self):
+        buttons = Buttons().object_to_dict()
+        name = self.random.choice(['Left', 'Right', 'Right', 'Up', 'Down', 'Y', 'B', 'A', 'X', 'L', 'R', None])
+        if name is not None:
+            buttons[name] = True
+        return buttons
+
+    def _apply(self, player, buttons):
+        player['buttons'] = buttons
+        if buttons['Left']:
+            player['x'] = max(STAGE_LEFT, player['x'] - 3)
+        if buttons['Right']:
+            player['x'] = min(STAGE_RIGHT, player['x'] + 3)
+        if buttons['Up'] and not player['jumping']:
+            player['jumping'] = True
+            player['air_frames'] = 30
+        if player['jumping']:
+            player['air_frames'] -= 1
+            player['y'] = GROUND_Y - 2 * min(player['air_frames'], 30 - player['air_frames'])
+            if player['air_frames'] <= 0:
+                player['jumping'] = False
+                player['y'] = GROUND_Y
+        player['crouching'] = bool(buttons['Down']) and not player['jumping']
+        attack = next((bit for bit, name in enumerate(['Y', 'B', 'A', 'X', 'L', 'R'], 1) if buttons[name]), 0)
+        player['in_move'] = attack != 0
+        player['move'] = attack
+
+    def _resolve_hits(self):
+        distance = abs(self.players[1]['x'] - self.players[2]['x'])
+        if distance > 60:
+            return
+        for attacker, defender in ((1, 2), (2, 1)):
+            if self.players[attacker]['in_move'] and not self.players[defender]['crouching']:
+                self.players[defender]['health'] -= 2 + self.players[attacker]['move'] % 3
+
+class ReplayFrames:
+    """Replays the game states of a DataRecorder recording: a .traj directory, .parquet or legacy .csv file"""
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self.states = self._states()
+
+    def _states(self):
+        for columns in iter_chunks(self.path):
+            rows = {name: columns[name].tolist() for name in columns}
+            for index in range(len(rows['frame'])):
+                yield GameState({
+                    'p1': self._player_dict(rows, 'p1', index),
+                    'p2': self._player_dict(rows, 'p2', index),
+                    'timer': rows['timer'][index],
+                    'result': str(rows['fight_result'][index]),
+                    'round_started': rows['has_round_started'][index],
+                    'round_over': rows['is_round_over'][index]
+                })
+
+    def next_state(self):
+        try:
+            return next(self.states)
+        except StopIteration:
+            if not self.loop:
+                raise
+            self.states = self._states()
+            return next(self.states)
+
+    def apply_command(self, command):
+        # Recorded frames do not react to the controller
+        pass
+
+    def _player_dict(self, rows, prefix, index):
+        return {
+            'character': rows[f'{prefix}_character'][index],
+            'health': rows[f'{prefix}_health'][index],
+            'x': rows[f'{prefix}_x'][index],
+            'y': rows[f'{prefix}_y'][index],
+            'jumping': rows[f'{prefix}_jumping'][index],
+            'crouching': rows[f'{prefix}_crouching'][index],
+            'in_move': rows[f'{prefix}_in_move'][index],
+            'move': rows[f'{prefix}_move_id'][index],
+            'buttons': mask_to_buttons_dict(rows[f'{prefix}_buttons'][index])
+        }
+
+# Recordings used to be replayed from CSV only
+CsvReplayFrames = ReplayFrames
+
+class EmulatorStub:
+    """Stands in for BizHawk + sf2_bot.lua: streams frames and times the replies"""
+
+    def __init__(self, source, host=NETWORK_CONFIG['HOST'], port=NETWORK_CONFIG['PORT_P1'], codec='binary', fps=60.0):
+        self.source = source
+        self.host = host
+        self.port = port
+        self.codec = codec
+        self.fps = fps
+        self.round_trips = []
+
+    def connect(self, retry_seconds=5.0):
+        deadline = time.perf_counter() + retry_seconds
+        while True:
+            try:
+                sock = socket.create_connection((self.host, self.port))
+                break
+            except ConnectionRefusedError:
+                if time.perf_counter() > deadline:
+                    raise
+                time.sleep(0.1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = Connection(sock)
+        if self.codec == 'legacy':
+            connection.use_legacy()
+        else:
+            codec_id = next(codec_id for codec_id, name in CODEC_NAMES.items() if name == self.codec)
+            connection.request_handshake(codec_id)
+        return connection
+
+    def run(self, frames):
+        """Play up to `frames` frames and return the per-frame round trips in seconds"""
+        connection = self.connect()
+        interval = 1.0 / self.fps if self.fps else 0.0
+        next_frame = time.perf_counter()
+        try:
+            for _ in range(frames):
+                game_state = self.source.next_state()
+                start = time.perf_counter()
+                connection.send_game_state(game_state)
+                command = connection.receive_command()
+                self.round_trips.append(time.perf_counter() - start)
+                self.source.apply_command(command)
+                if interval:
+                    next_frame += interval
+                    delay = next_frame - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_frame = time.perf_counter()
+        except (StopIteration, ConnectionError):
+            pass
+        finally:
+            connection.close()
+        return self.round_trips
+
+def summarize(round_trips, elapsed):
+    """Format throughput and round-trip percentiles"""
+    ordered = sorted(round_trips)
+    fps = len(ordered) / elapsed if elapsed > 0 else 0.0
+    return (f"frames={len(ordered)} fps={fps:.1f} "
+            f"rtt_ms p50={percentile(ordered, 0.50) * 1000:.3f} "
+            f"p95={percentile(ordered, 0.95) * 1000:.3f} "
+            f"p99={percentile(ordered, 0.99) * 1000:.3f} "
+            f"max={(ordered[-1] if ordered else 0.0) * 1000:.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless stand-in for BizHawk and sf2_bot.lua")
+    parser.add_argument('--host', default=NETWORK_CONFIG['HOST'])
+    parser.add_argument('--port', type=int, default=NETWORK_CONFIG['PORT_P1'])
+    parser.add_argument('--codec', choices=sorted(CODEC_NAMES.values()) + ['legacy'], default='binary')
+    parser.add_argument('--fps', type=float, default=60.0, help="frame rate, 0 for as fast as possible")
+    parser.add_argument('--frames', type=int, default=3600)
+    parser.add_argument('--connections', type=int, default=1, help="concurrent emulators to simulate")
+    parser.add_argument('--replay', help="replay a recording (.traj, .parquet or .csv) instead of synthetic frames")
+    parser.add_argument('--bot-player', type=int, choices=[1, 2], default=2)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--rtt-log', help="write every frame's round trip to this CSV")
+    args = parser.parse_args()
+
+    stubs = []
+    for index in range(args.connections):
+        if args.replay:
+            source = ReplayFrames(args.replay)
+        else:
+            seed = None if args.seed is None else args.seed + index
+            source = SyntheticFrames(args.bot_player, seed)
+        stubs.append(EmulatorStub(source, args.host, args.port, args.codec, args.fps))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=stub.run, args=(args.frames,)) for stub in stubs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for index, stub in enumerate(stubs, 1):
+        print(f"connection {index}: {summarize(stub.round_trips, elapsed)}")
+    if len(stubs) > 1:
+        print(f"total: {summarize([rtt for stub in stubs for rtt in stub.round_trips], elapsed)}")
+    if args.rtt_log:
+        with open(args.rtt_log, 'w', newline='') as log_file:
+            writer = csv.writer(log_file)
+            writer.writerow(['connection', 'frame', 'rtt_ms'])
+            for index, stub in enumerate(stubs, 1):
+                for frame, rtt in enumerate(stub.round_trips, 1):
+                    writer.writerow([index, frame, f"{rtt * 1000:.3f}"])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+import numpy as np
+from buttons import BUTTON_ATTRIBUTES, Buttons
+from config import OBSERVATION_CONFIG, REWARD_CONFIG
+
+# Observation: 17 features seen from one player's side
+# (player x, y, health, jumping, crouching, in_move, move_id,
+#  opponent x, y, health, jumping, crouching, in_move, move_id,
+#  timer, round_started, round_over)
+STATE_SIZE = 17
+
+# Normalized observations divide each feature by its rough range (see emulator_stub's arena geometry)
+FEATURE_RANGES = np.array([512, 256, 176, 1, 1, 1, 256] * 2 + [100, 1, 1], dtype=np.float32)
+FEATURE_SCALE = 1 / FEATURE_RANGES
+
+# Arrays of a saved replay buffer (see ReplayBuffer.save), in push() argument order
+TRANSITION_ARRAYS = ('states', 'actions', 'rewards', 'next_states', 'dones')
+
+# Action space: index -> button combination pressed for that frame
+ACTION_BUTTONS = [
+    {'up': True},  # Jump
+    {'down': True},  # Crouch
+    {'left': True},  # Move left
+    {'right': True},  # Move right
+    {'Y': True},  # Heavy punch
+    {'B': True},  # Medium punch
+    {'A': True},  # Light punch
+    {'X': True},  # Heavy kick
+    {'L': True},  # Medium kick
+    {'R': True},  # Light kick
+    {'up': True, 'Y': True},  # Jump heavy punch
+    {'down': True, 'B': True}  # Crouch medium punch
+]
+ACTION_SIZE = len(ACTION_BUTTONS)
+ACTION_MASKS = tuple(sum(1 << BUTTON_ATTRIBUTES.index(name) for name in buttons) for buttons in ACTION_BUTTONS)
+
+def _best_action(mask):
+    # Exact combination first, otherwise the largest action whose buttons are all pressed
+    if mask in ACTION_MASKS:
+        return ACTION_MASKS.index(mask)
+    candidates = [(bin(action_mask).count('1'), -action) for action, action_mask in enumerate(ACTION_MASKS)
+                  if action_mask & mask == action_mask]
+    return -max(candidates)[1] if candidates else -1
+
+# Action index for every button mask, -1 where no action's buttons are pressed
+MASK_ACTIONS = np.array([_best_action(mask) for mask in range(1 << len(BUTTON_ATTRIBUTES))], dtype=np.int64)
+
+# Row `mask` holds the 12 button bits of that mask as 0.0/1.0, indexable by a whole array of masks
+BUTTON_FEATURES = ((np.arange(1 << len(BUTTON_ATTRIBUTES))[:, None] >> np.arange(len(BUTTON_ATTRIBUTES))) & 1).astype(np.float32)
+
+def split_players(game_state, player_number):
+    """Return (player, opponent) as seen by `player_number`"""
+    if int(player_number) == 1:
+        return game_state.player1, game_state.player2
+    return game_state.player2, game_state.player1
+
+def game_state_features(game_state, player_number):
+    """Encode a game state as the 17-feature float32 observation"""
+    return np.array(feature_values(game_state, player_number), dtype=np.float32)
+
+def feature_values(game_state, player_number):
+    """The 17 features of a game state as a tuple, in observation order"""
+    player, opponent = split_players(game_state, player_number)
+    return (
+        player.x_coord,
+        player.y_coord,
+        player.health,
+        player.is_jumping,
+        player.is_crouching,
+        player.is_player_in_move,
+        player.move_id,
+        opponent.x_coord,
+        opponent.y_coord,
+        opponent.health,
+        opponent.is_jumping,
+        opponent.is_crouching,
+        opponent.is_player_in_move,
+        opponent.move_id,
+        game_state.timer,
+        game_state.has_round_started,
+        game_state.is_round_over
+    )
+
+def game_state_reward(game_state, next_game_state, player_number):
+    """Reward for the change between two consecutive game states"""
+    player, opponent = split_players(game_state, player_number)
+    next_player, next_opponent = split_players(next_game_state, player_number)
+
+    # Calculate health difference
+    health_diff = (next_opponent.health - opponent.health) - (next_player.health - player.health)
+
+    # Calculate distance to opponent
+    current_dist = abs(player.x_coord - opponent.x_coord)
+    next_dist = abs(next_player.x_coord - next_opponent.x_coord)
+    dist_diff = current_dist - next_dist
+
+    # Combine rewards
+    return health_diff * REWARD_CONFIG['HEALTH_WEIGHT'] + dist_diff * REWARD_CONFIG['DISTANCE_WEIGHT']
+
+def observation_size(frames=OBSERVATION_CONFIG['FRAMES']):
+    """Length of an observation stacking `frames` feature vectors"""
+    return STATE_SIZE * frames
+
+def stack_features(features, round_over, frames):
+    """Stack each row of (n, STATE_SIZE) features with the `frames` - 1 rows before it, oldest first
+
+    Rows are consecutive frames; a round's history starts after the frame its previous
+    round ended on, with the round's first row repeated until there is enough history.
+    """
+    count = len(features)
+    if frames == 1:
+        return features
+    rows = np.arange(count)
+    # First row of each row's round: round boundaries follow frames whose round is over
+    starts = np.zeros(count, dtype=bool)
+    starts[:1] = True
+    starts[1:] = np.asarray(round_over[:-1], dtype=bool)
+    first = np.maximum.accumulate(np.where(starts, rows, 0))
+    history = np.maximum(rows[:, None] + np.arange(1 - frames, 1), first[:, None])
+    return features[history].reshape(count, frames * STATE_SIZE)
+
+class ObservationEncoder:
+    """Encodes game states into (optionally normalized) stacks of the last `frames` feature vectors
+
+    Feature vectors live in a preallocated ring buffer and each frame writes just its own
+    row, so encoding allocates nothing. Every row is written twice, `slots` rows apart,
+    which keeps the last `frames` rows contiguous: `encode` returns a view of the buffer
+    rather than a copy. The view stays valid through the next `encode`, long enough to
+    pair a state with its next state, so keep a copy of anything needed for longer.
+    """
+
+    def __init__(self, frames=OBSERVATION_CONFIG['FRAMES'], normalize=OBSERVATION_CONFIG['NORMALIZE']):
+        if frames < 1:
+            raise ValueError(f"An observation needs at least one frame, got {frames}")
+        self.frames = frames
+        self.normalize = normalize
+        self.size = observation_size(frames)
+        # One slot more than the stack, so the previous observation survives the next write
+        self.slots = frames + 1
+        self.buffer = np.zeros((2 * self.slots, STATE_SIZE), dtype=np.float32)
+        # views[slot] is the observation whose newest row was written to `slot`
+        self.views = tuple(self.buffer[slot + self.slots + 1 - frames:slot + self.slots + 1].reshape(-1)
+                           for slot in range(self.slots))
+        self.slot = self.slots - 1
+        self.fresh = True
+
+    def reset(self):
+        """Forget the history; the next game state fills the whole stack"""
+        self.fresh = True
+
+    def encode(self, game_state, player_number):
+        """Push a game state and return the stacked observation, a (size,) float32 view"""
+        slot = (self.slot + 1) % self.slots
+        row = self.buffer[slot]
+        row[:] = feature_values(game_state, player_number)
+        if self.normalize:
+            np.multiply(row, FEATURE_SCALE, out=row)
+        self.buffer[slot + self.slots] = row
+        if self.fresh:
+            # A new round has no history yet, repeat its first frame
+            self.buffer[:] = row
+        # The round's last frame ends its history
+        self.fresh = bool(game_state.is_round_over)
+        self.slot = slot
+        return self.views[slot]
+
+    def encode_batch(self, game_states, player_number):
+        """Encode a list of consecutive game states at once, one (n, size) row each
+
+        Stacks only look back within the list; the ring buffer is left untouched.
+        """
+        features = np.array([feature_values(game_state, player_number) for game_state in game_states],
+                            dtype=np.float32).reshape(-1, STATE_SIZE)
+        if self.normalize:
+            features *= FEATURE_SCALE
+        round_over = features[:, STATE_SIZE - 1]
+        return stack_features(features, round_over, self.frames)
+
+def buttons_features(mask):
+    """0.0/1.0 vector of the buttons in a mask (or a (n, 12) array for an array of masks)"""
+    return BUTTON_FEATURES[mask]
+
+def buttons_to_action(mask):
+    """Action index closest to a button mask (or array of masks), -1 if none applies"""
+    return MASK_ACTIONS[mask]
+
+def column_players(player_number):
+    """Column prefixes of (player, opponent) as seen by `player_number`"""
+    return ('p1', 'p2') if int(player_number) == 1 else ('p2', 'p1')
+
+def column_features(columns, player_number, frames=1, normalize=False):
+    """game_state_features over recorded column arrays, one (n, STATE_SIZE * frames) float32 row per frame
+
+    Rows stack like ObservationEncoder's observations when `frames` is more than one.
+    """
+    player, opponent = column_players(player_number)
+    names = [f'{prefix}_{name}' for prefix in (player, opponent)
+             for name in ('x', 'y', 'health', 'jumping', 'crouching', 'in_move', 'move_id')]
+    names += ['timer', 'has_round_started', 'is_round_over']
+    features = np.empty((len(columns['timer']), STATE_SIZE), dtype=np.float32)
+    for index, name in enumerate(names):
+        features[:, index] = columns[name]
+    if normalize:
+        features *= FEATURE_SCALE
+    return stack_features(features, columns['is_round_over'], frames)
+
+def column_rewards(columns, player_number, health_weight=None, distance_weight=None):
+    """game_state_reward between each pair of consecutive recorded frames, n - 1 values
+
+    The weights default to REWARD_CONFIG's.
+    """
+    player, opponent = column_players(player_number)
+    return _rewards(columns[f'{player}_health'], columns[f'{opponent}_health'],
+                    columns[f'{player}_x'], columns[f'{opponent}_x'], health_weight, distance_weight)
+
+def state_rewards(states, next_states, normalize=False, health_weight=None, distance_weight=None):
+    """game_state_reward of every (state, next state) pair of stored observation arrays
+
+    Observations keep the features rewards are made of, so stored transitions can be
+    relabeled without their game states. Only the newest frame of a stack counts, and
+    `normalize` says whether the observations were normalized. A transition spanning
+    several frames (see Bot.decision_interval) gets the sum of their rewards, the same
+    as when it was recorded, since the terms only depend on the first and last frame.
+    """
+    scale = FEATURE_RANGES if normalize else np.ones(STATE_SIZE, dtype=np.float32)
+    states = np.asarray(states, dtype=np.float32)[:, -STATE_SIZE:].astype(np.float64) * scale
+    next_states = np.asarray(next_states, dtype=np.float32)[:, -STATE_SIZE:].astype(np.float64) * scale
+    # Columns 0 and 2 are the player's x and health, 7 and 9 the opponent's
+    health = np.stack([states[:, 2], next_states[:, 2]], axis=1)
+    opponent_health = np.stack([states[:, 9], next_states[:, 9]], axis=1)
+    x = np.stack([states[:, 0], next_states[:, 0]], axis=1)
+    opponent_x = np.stack([states[:, 7], next_states[:, 7]], axis=1)
+    return _rewards(health, opponent_health, x, opponent_x, health_weight, distance_weight, axis=1).reshape(-1)
+
+def _rewards(health, opponent_health, x, opponent_x, health_weight, distance_weight, axis=0):
+    # Rewards between neighbours along `axis` of health and x arrays, like game_state_reward
+    if health_weight is None:
+        health_weight = REWARD_CONFIG['HEALTH_WEIGHT']
+    if distance_weight is None:
+        distance_weight = REWARD_CONFIG['DISTANCE_WEIGHT']
+    health = np.asarray(health, dtype=np.float64)
+    opponent_health = np.asarray(opponent_health, dtype=np.float64)
+    distance = np.abs(np.asarray(x, dtype=np.float64) - opponent_x)
+    health_diff = np.diff(opponent_health, axis=axis) - np.diff(health, axis=axis)
+    dist_diff = -np.diff(distance, axis=axis)
+    return (health_diff * health_weight + dist_diff * distance_weight).astype(np.float32)
+
+def action_to_buttons(action):
+    """Build the Buttons pressed by an action index"""
+    return Buttons.from_mask(ACTION_MASKS[action])
@@ -2,10 +2,24 @@ from player import Player
 
 class GameState:
 
+    __slots__ = ('player1', 'player2', 'timer', 'fight_result', 'has_round_started', 'is_round_over')
+
     def __init__(self, input_dict):
 
         self.dict_to_object(input_dict)
 
+    @classmethod
+    def from_values(cls, player1, player2, timer, fight_result, round_started, round_over):
+        """Build a GameState from already constructed players, without an intermediate dict"""
+        game_state = cls.__new__(cls)
+        game_state.player1 = player1
+        game_state.player2 = player2
+        game_state.timer = timer
+        game_state.fight_result = fight_result
+        game_state.has_round_started = round_started
+        game_state.is_round_over = round_over
+        return game_state
+
     def dict_to_object(self, input_dict):
 
         self.player1 = Player(input_dict['p1'])
@@ -13,4 +27,17 @@ class GameState:
         self.timer = input_dict['timer']
         self.fight_result = input_dict['result']
         self.has_round_started = input_dict['round_started']
-        self.is_round_over = input_dict['round_over']
\ No newline at end of file
+        self.is_round_over = input_dict['round_over']
+
+    def object_to_dict(self):
+
+        game_state_dict = {}
+
+        game_state_dict['p1'] = self.player1.object_to_dict()
+        game_state_dict['p2'] = self.player2.object_to_dict()
+        game_state_dict['timer'] = self.timer
+        game_state_dict['result'] = self.fight_result
+        game_state_dict['round_started'] = self.has_round_started
+        game_state_dict['round_over'] = self.is_round_over
+
+        return game_state_dict
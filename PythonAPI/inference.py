@@ -0,0 +1,78 @@
+import asyncio
+import torch
+from config import INFERENCE_CONFIG
+from dqn import DQN
+from logger import logger
+
+class BatchedInference:
+    """Collects the states of concurrent matches and answers them with one forward pass"""
+
+    def __init__(self, state_size, action_size, max_batch_size=INFERENCE_CONFIG['MAX_BATCH_SIZE'],
+                 max_wait=INFERENCE_CONFIG['MAX_WAIT_MS'] / 1000.0, learner=None):
+        self.network = DQN(state_size, action_size)
+        self.network.eval()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.learner = learner
+        self.weights_version = 0
+        self.inputs = torch.zeros(max_batch_size, state_size)
+        self.pending = []
+        self.flush_handle = None
+        self.batches = 0
+        self.requests = 0
+
+    def load_weights(self, state_dict):
+        self.network.load_state_dict(state_dict)
+
+    def sync_weights(self):
+        """Follow the learner's latest published weights"""
+        version, weights, _ = self.learner.latest()
+        if version != self.weights_version:
+            self.network.load_state_dict(weights)
+            self.weights_version = version
+
+    async def act(self, state):
+        """Queue a 1 x state_size tensor and wait for its greedy action"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((state, future))
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        """Run one forward pass over up to max_batch_size pending states"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch = self.pending[:self.max_batch_size]
+        self.pending = self.pending[self.max_batch_size:]
+        if not batch:
+            return
+        if self.learner is not None:
+            self.sync_weights()
+        count = len(batch)
+        inputs = self.inputs[:count]
+        for row, (state, _) in enumerate(batch):
+            inputs[row] = state[0]
+        try:
+            with torch.no_grad():
+                actions = self.network(inputs).argmax(1).tolist()
+        except Exception as e:
+            logger.error(f"Batched inference failed for {count} states: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), action in zip(batch, actions):
+                if not future.done():
+                    future.set_result(action)
+        self.batches += 1
+        self.requests += count
+        if self.pending:
+            self.flush_handle = asyncio.get_running_loop().call_soon(self.flush)
+
+    def mean_batch_size(self):
+        return self.requests / self.batches if self.batches else 0.0
@@ -0,0 +1,137 @@
+import queue
+import threading
+import numpy as np
+from checkpoint import CheckpointManager
+from config import LEARNER_CONFIG, PRIORITIZED_REPLAY_CONFIG, TRAINING_CONFIG
+from features import ACTION_SIZE, observation_size
+from logger import logger
+from model_registry import registry
+from scheduler import TrainingScheduler
+
+class Learner(threading.Thread):
+    """Background DQN trainer fed by actors, publishing weights back to them"""
+
+    def __init__(self, agent, model_path=None, queue_size=LEARNER_CONFIG['QUEUE_SIZE'],
+                 publish_every=LEARNER_CONFIG['PUBLISH_EVERY'],
+                 target_update_every=TRAINING_CONFIG['TARGET_UPDATE_EVERY'],
+                 save_every=LEARNER_CONFIG['SAVE_EVERY'],
+                 replay_ratio=TRAINING_CONFIG['REPLAY_RATIO']):
+        super().__init__(name=f"learner-p{agent.player_number}", daemon=True)
+        self.agent = agent
+        self.model_path = model_path
+        self.experience = queue.Queue(maxsize=queue_size)
+        self.publish_every = publish_every
+        self.save_every = save_every
+        # Checkpoints are written off this thread, so a save never holds up training
+        self.checkpoints = CheckpointManager(model_path, every_steps=save_every) if model_path else None
+        # Gradient steps allowed per received transition, target updates and epsilon, as TRAINING_CONFIG
+        # schedules them for self-training bots (replay_ratio None: GRADIENT_STEPS / TRAIN_EVERY)
+        self.scheduler = TrainingScheduler(agent, replay_ratio=replay_ratio, target_update_every=target_update_every)
+        self.steps = 0
+        self.dropped = 0
+        self.last_loss = None
+        self.lock = threading.Lock()
+        self.version = 0
+        self.weights = None
+        self.epsilon = agent.epsilon
+        self.stopping = threading.Event()
+        self.publish()
+
+    @classmethod
+    def for_player(cls, player_number, model_path=None, memory_capacity=10000,
+                   prioritized=PRIORITIZED_REPLAY_CONFIG['ENABLED'], **kwargs):
+        """Create a learner starting from the player's saved model, if there is one"""
+        from dqn import DQNAgent
+        agent = DQNAgent(observation_size(), ACTION_SIZE, player_number, memory_capacity, prioritized)
+        _, checkpoint = registry.find_checkpoint(player_number)
+        if checkpoint is not None:
+            agent.load_checkpoint(checkpoint)
+        return cls(agent, model_path, **kwargs)
+
+    @classmethod
+    def for_agent(cls, actor_agent, model_path=None, **kwargs):
+        """Create a learner whose networks start as a copy of an actor's"""
+        if not actor_agent.trainable:
+            # An acting-only agent has no optimizer state to copy, start from its saved model
+            return cls.for_player(actor_agent.player_number, model_path, actor_agent.memory.capacity,
+                                  actor_agent.prioritized, **kwargs)
+        from dqn import DQNAgent
+        agent = DQNAgent(actor_agent.state_size, actor_agent.action_size, actor_agent.player_number,
+                         actor_agent.memory.capacity, actor_agent.prioritized)
+        agent.policy_net.load_state_dict(actor_agent.policy_net.state_dict())
+        agent.target_net.load_state_dict(actor_agent.target_net.state_dict())
+        agent.optimizer.load_state_dict(actor_agent.optimizer.state_dict())
+        agent.epsilon = actor_agent.epsilon
+        return cls(agent, model_path, **kwargs)
+
+    def submit(self, state, action, reward, next_state, done):
+        """Queue one transition from an actor, dropping it if the learner is behind"""
+        try:
+            # Actors encode observations in place, so queue copies the next frames cannot overwrite
+            self.experience.put_nowait((np.asarray(state, dtype=np.float32).copy(), action, reward,
+                                        np.asarray(next_state, dtype=np.float32).copy(), done))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def latest(self):
+        """Return (version, policy weights, epsilon) of the last published snapshot"""
+        with self.lock:
+            return self.version, self.weights, self.epsilon
+
+    def publish(self):
+        weights = {name: tensor.detach().clone() for name, tensor in self.agent.policy_net.state_dict().items()}
+        with self.lock:
+            self.weights = weights
+            self.epsilon = self.agent.epsilon
+            self.version += 1
+
+    def drain(self, timeout=0.1):
+        """Move queued transitions into the replay buffer, waiting briefly for the first one"""
+        moved = 0
+        try:
+            transition = self.experience.get(timeout=timeout)
+            while True:
+                self.agent.memory.push(*transition)
+                moved += 1
+                transition = self.experience.get_nowait()
+        except queue.Empty:
+            pass
+        return moved
+
+    def step(self):
+        """Run one gradient step if the replay buffer is large enough"""
+        loss = self.scheduler.update()
+        if loss is None:
+            return None
+        self.steps += 1
+        self.last_loss = loss
+        if self.steps % self.publish_every == 0:
+            self.publish()
+        if self.checkpoints is not None:
+            self.checkpoints.maybe_save(self.agent, self.steps)
+        return loss
+
+    def run(self):
+        while not self.stopping.is_set():
+            moved = self.drain(timeout=0.0 if self.scheduler.budget >= 1 else 0.1)
+            self.scheduler.observe(moved)
+            if self.scheduler.budget < 1:
+                continue
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"Learner for player {self.agent.player_number} failed a training step: {e}")
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.join(timeout)
+        if self.checkpoints is not None:
+            if self.is_alive():
+                # Still in a training step, snapshotting now could tear the weights
+                logger.warning(f"Learner for player {self.agent.player_number} did not stop within {timeout}s, "
+                               f"skipping its final checkpoint")
+            else:
+                self.checkpoints.save(self.agent, self.steps)
+            self.checkpoints.close()
@@ -1,31 +1,106 @@
+import atexit
+import copy
 import logging
+import logging.handlers
 import os
+import queue
+import time
 from config import LOGGING_CONFIG
 
+class FormatLaterQueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted: the listener thread merges msg with args and formats them
+
+    Logging calls thus only pay for enqueuing a record, so their arguments must not be
+    mutated afterwards; pass values (numbers, strings, fresh lists), not live objects.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record = copy.copy(record)
+            # Tracebacks cannot cross the queue lazily, render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+# Module logger; nothing is written anywhere until an entry point calls setup_logger()
+logger = logging.getLogger(__name__)
+
+_configured = False
+
 def setup_logger():
-    """Setup and configure the logger"""
+    """Setup and configure the logger; entry points call this once, later calls do nothing"""
+    global _configured
+    if _configured:
+        return logger
+    _configured = True
+
     # Create logs directory if it doesn't exist
     if not os.path.exists('logs'):
         os.makedirs('logs')
         
-    # Configure logging
-    logging.basicConfig(
-        filename=os.path.join('logs', LOGGING_CONFIG['LOG_FILE']),
-        level=getattr(logging, LOGGING_CONFIG['LOG_LEVEL']),
-        format=LOGGING_CONFIG['LOG_FORMAT']
-    )
+    formatter = logging.Formatter(LOGGING_CONFIG['LOG_FORMAT'])
+    file_handler = logging.FileHandler(os.path.join('logs', LOGGING_CONFIG['LOG_FILE']))
+    file_handler.setFormatter(formatter)
     
     # Also log to console
     console = logging.StreamHandler()
     console.setLevel(logging.INFO)
-    formatter = logging.Formatter(LOGGING_CONFIG['LOG_FORMAT'])
     console.setFormatter(formatter)
-    logging.getLogger('').addHandler(console)
     
-    return logging.getLogger(__name__)
+    root = logging.getLogger('')
+    root.setLevel(getattr(logging, LOGGING_CONFIG['LOG_LEVEL']))
+    if LOGGING_CONFIG['ASYNC']:
+        # Callers only enqueue records; a background listener formats and writes them
+        log_queue = queue.SimpleQueue()
+        root.addHandler(FormatLaterQueueHandler(log_queue))
+        listener = logging.handlers.QueueListener(log_queue, file_handler, console, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+    else:
+        root.addHandler(file_handler)
+        root.addHandler(console)
+    
+    return logger
+
+class FrameLog:
+    """Gate for per-frame log lines: one switch, 1-in-N sampling and a per-second cap per category"""
+
+    def __init__(self, enabled=LOGGING_CONFIG['FRAME_LOGGING'], sampling=LOGGING_CONFIG['FRAME_LOG_SAMPLING'],
+                 max_per_second=LOGGING_CONFIG['FRAME_LOG_MAX_PER_SECOND']):
+        self.enabled = enabled
+        self.sampling = dict(sampling)
+        self.max_per_second = max_per_second
+        self.counts = {}
+        self.second = {}
+
+    def should_log(self, category):
+        """Count one event of `category` and say whether this one gets logged
+
+        'action.p1' and 'action.p2' are sampled and capped separately, at the rate set for 'action'.
+        """
+        if not self.enabled:
+            return False
+        count = self.counts.get(category, 0)
+        self.counts[category] = count + 1
+        if count % self.sampling.get(category.partition('.')[0], 1):
+            return False
+        if self.max_per_second:
+            now = int(time.monotonic())
+            second, logged = self.second.get(category, (now, 0))
+            if second != now:
+                second, logged = now, 0
+            if logged >= self.max_per_second:
+                return False
+            self.second[category] = (second, logged + 1)
+        return True
+
+    def info(self, category, message, *args):
+        """logger.info for a per-frame event; `args` are only formatted when it is logged"""
+        if self.should_log(category):
+            logger.info(message, *args)
 
-# Create logger instance
-logger = setup_logger()
+# Shared gate for every per-frame log line
+frame_log = FrameLog()
 
 def log_game_state(game_state):
     """Log the current game state"""
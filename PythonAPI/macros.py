@@ -0,0 +1,95 @@
+from collections import deque, namedtuple
+from buttons import BUTTON_NAMES
+from config import BUTTON_MAPPINGS, SPECIAL_MOVES
+
+# Notation symbol -> button bit, e.g. 'v' -> the Down bit
+SYMBOL_BITS = {symbol: 1 << BUTTON_NAMES.index(name.capitalize()) for name, symbol in BUTTON_MAPPINGS.items()}
+
+LEFT_BIT = 1 << BUTTON_NAMES.index('Left')
+RIGHT_BIT = 1 << BUTTON_NAMES.index('Right')
+
+# A compiled macro: the button mask of each frame, as written (facing right) and mirrored
+Macro = namedtuple('Macro', ('name', 'masks', 'mirrored'))
+
+def mirror_mask(mask):
+    """Swap Left and Right in a button mask"""
+    swapped = mask & ~(LEFT_BIT | RIGHT_BIT)
+    if mask & LEFT_BIT:
+        swapped |= RIGHT_BIT
+    if mask & RIGHT_BIT:
+        swapped |= LEFT_BIT
+    return swapped
+
+def compile_macro(steps, name=None):
+    """Turn notation like ['v', 'v+>', '!v+!>', '>+Y'] into one button mask per frame
+
+    Each step is one frame. 'X' presses a button, '!X' releases it, and buttons
+    stay pressed until released. Directions are written for a player facing right.
+    """
+    mask = 0
+    masks = []
+    for step in steps:
+        for token in step.split('+'):
+            if token.startswith('!'):
+                mask &= ~_symbol_bit(token[1:], step)
+            else:
+                mask |= _symbol_bit(token, step)
+        masks.append(mask)
+    masks = tuple(masks)
+    return Macro(name, masks, tuple(mirror_mask(mask) for mask in masks))
+
+def _symbol_bit(symbol, step):
+    try:
+        return SYMBOL_BITS[symbol]
+    except KeyError:
+        raise ValueError(f"Unknown button {symbol!r} in macro step {step!r}") from None
+
+# Special moves, compiled once at import
+MACROS = {name.lower(): compile_macro(steps, name.lower()) for name, steps in SPECIAL_MOVES.items()}
+
+class MacroExecutor:
+    """Plays compiled macros one frame at a time, with further macros queued behind the active one"""
+
+    def __init__(self):
+        self.masks = None
+        self.name = None
+        self.index = 0
+        self.queue = deque()
+
+    @property
+    def active(self):
+        return self.masks is not None
+
+    def start(self, macro, facing_right=True, queue=False):
+        """Play `macro` (a Macro or a MACROS name) now, or after the others when `queue` is set"""
+        if isinstance(macro, str):
+            macro = MACROS[macro]
+        masks = macro.masks if facing_right else macro.mirrored
+        if queue and self.masks is not None:
+            self.queue.append((macro.name, masks))
+        else:
+            self.name, self.masks, self.index = macro.name, masks, 0
+
+    def cancel(self, clear_queue=True):
+        """Stop the active macro; the next queued one, if kept, starts on the next frame"""
+        if clear_queue:
+            self.queue.clear()
+        self._advance()
+
+    def next_mask(self):
+        """Button mask for this frame, or None when no macro is playing"""
+        masks = self.masks
+        if masks is None:
+            return None
+        mask = masks[self.index]
+        self.index += 1
+        if self.index == len(masks):
+            self._advance()
+        return mask
+
+    def _advance(self):
+        if self.queue:
+            self.name, self.masks = self.queue.popleft()
+        else:
+            self.name, self.masks = None, None
+        self.index = 0
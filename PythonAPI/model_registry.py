@@ -0,0 +1,102 @@
+import os
+import threading
+import weakref
+from logger import logger
+
+DEFAULT_MODEL_PATH = 'models/dqn_model.pth'
+
+def player_model_path(player_number):
+    return f'models/dqn_model_p{player_number}.pth'
+
+class ModelRegistry:
+    """Process-wide cache of checkpoints and of the read-only policy networks built from them"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.checkpoints = {}
+        self.policies = {}
+        # Network -> (learner id, version) of the published weights it last loaded
+        self.loaded_versions = weakref.WeakKeyDictionary()
+
+    def checkpoint(self, path):
+        """Load a checkpoint once, again only if the file changed; FileNotFoundError if missing"""
+        import torch
+        key = os.path.abspath(path)
+        modified = os.path.getmtime(path)
+        with self.lock:
+            cached = self.checkpoints.get(key)
+            if cached is None or cached[0] != modified:
+                # Map the tensors from the file instead of reading them into memory
+                cached = (modified, torch.load(path, map_location='cpu', mmap=True))
+                self.checkpoints[key] = cached
+                logger.info(f"Loaded DQN checkpoint {path}")
+            return cached[1]
+
+    def find_checkpoint(self, player_number):
+        """(path, checkpoint) of the player's model, else of the default model, else (None, None)"""
+        for path in (player_model_path(player_number), DEFAULT_MODEL_PATH):
+            if os.path.exists(path):
+                return path, self.checkpoint(path)
+        return None, None
+
+    def shared_policy(self, player_number, state_size, action_size):
+        """(network, epsilon) shared by every acting-only bot of a player; the network is frozen"""
+        from dqn import DQN
+        with self.lock:
+            path, checkpoint = self.find_checkpoint(player_number)
+            key = (os.path.abspath(path) if path else int(player_number), state_size, action_size)
+            if key not in self.policies:
+                network = DQN(state_size, action_size)
+                epsilon = 1.0
+                if checkpoint is not None:
+                    network.load_state_dict(checkpoint['policy_net_state_dict'])
+                    epsilon = checkpoint['epsilon']
+                network.eval()
+                network.requires_grad_(False)
+                self.policies[key] = (network, epsilon)
+            return self.policies[key]
+
+    def numpy_policy(self, player_number, state_size, action_size):
+        """(NumpyPolicy, epsilon) shared by every NumPy-backend bot of a player
+
+        A policy export at least as new as the checkpoint is read without torch.
+        """
+        from numpy_policy import NumpyPolicy, load_policy, policy_export_path
+        with self.lock:
+            for path in (player_model_path(player_number), DEFAULT_MODEL_PATH):
+                export_path = policy_export_path(path)
+                if os.path.exists(export_path) and (not os.path.exists(path) or
+                                                    os.path.getmtime(export_path) >= os.path.getmtime(path)):
+                    key = ('numpy', os.path.abspath(export_path))
+                    if key not in self.policies:
+                        self.policies[key] = load_policy(export_path)
+                        logger.info(f"Loaded policy export {export_path}")
+                    return self.policies[key]
+                if os.path.exists(path):
+                    break
+            # Convert the torch network, saved or fresh, that a torch-backend bot would share
+            network, epsilon = self.shared_policy(player_number, state_size, action_size)
+            key = ('numpy', id(network))
+            if key not in self.policies:
+                self.policies[key] = (NumpyPolicy(network.state_dict()), epsilon)
+            return self.policies[key]
+
+    def load_published(self, network, learner, version, weights):
+        """Load a learner's published weights into a network unless it already holds that version
+
+        Bots sharing a policy network only need the first of them to load each version.
+        """
+        with self.lock:
+            loaded = (id(learner), version)
+            if self.loaded_versions.get(network) != loaded:
+                network.load_state_dict(weights)
+                self.loaded_versions[network] = loaded
+
+    def clear(self):
+        with self.lock:
+            self.checkpoints.clear()
+            self.policies.clear()
+            self.loaded_versions.clear()
+
+# Registry shared by every bot in the process
+registry = ModelRegistry()
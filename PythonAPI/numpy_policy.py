@@ -0,0 +1,165 @@
+import argparse
+import os
+import random
+import numpy as np
+from config import OBSERVATION_CONFIG
+from features import STATE_SIZE, ObservationEncoder, game_state_reward
+from logger import logger, setup_logger
+
+def policy_export_path(path):
+    """Where the NumPy export of a DQN checkpoint is kept"""
+    return os.path.splitext(path)[0] + '.policy.npz'
+
+def _float32(value):
+    # Accepts torch tensors as well as arrays, without importing torch
+    return np.asarray(value, dtype=np.float32)
+
+class NumpyPolicy:
+    """Inference-only copy of a DQN policy network, evaluated with NumPy into preallocated buffers"""
+
+    def __init__(self, state_dict):
+        self.layers = [name[:-len('.weight')] for name in state_dict if name.endswith('.weight')]
+        # Weights are kept transposed, (inputs, outputs), so states multiply them directly
+        self.weights = [np.ascontiguousarray(_float32(state_dict[f'{layer}.weight']).T) for layer in self.layers]
+        self.biases = [_float32(state_dict[f'{layer}.bias']).copy() for layer in self.layers]
+        self.input_size = self.weights[0].shape[0]
+        self.output_size = self.weights[-1].shape[1]
+        # Activations of one state, overwritten by every call
+        self.outputs = [np.empty(weight.shape[1], dtype=np.float32) for weight in self.weights]
+        self.batch_outputs = None
+
+    def load_state_dict(self, state_dict):
+        """Copy new weights (a torch state_dict or arrays) into the existing arrays"""
+        for layer, weight, bias in zip(self.layers, self.weights, self.biases):
+            np.copyto(weight, _float32(state_dict[f'{layer}.weight']).T)
+            np.copyto(bias, _float32(state_dict[f'{layer}.bias']))
+
+    def state_dict(self):
+        """Weights under the torch names and layout, as read-only views"""
+        state = {}
+        for layer, weight, bias in zip(self.layers, self.weights, self.biases):
+            state[f'{layer}.weight'] = weight.T
+            state[f'{layer}.bias'] = bias
+        return state
+
+    def q_values(self, state):
+        """Q-values of one float32 state; the returned array is reused by the next call"""
+        return self._forward(np.reshape(state, self.input_size), self.outputs)
+
+    def batch_q_values(self, states):
+        """(batch, actions) Q-values; the buffers are reused by calls of the same batch size"""
+        states = np.asarray(states, dtype=np.float32)
+        if self.batch_outputs is None or len(self.batch_outputs[0]) != len(states):
+            self.batch_outputs = [np.empty((len(states), weight.shape[1]), dtype=np.float32) for weight in self.weights]
+        return self._forward(states, self.batch_outputs)
+
+    def act(self, state):
+        """Greedy action of one state"""
+        return int(self.q_values(state).argmax())
+
+    def _forward(self, values, outputs):
+        last = len(self.weights) - 1
+        for layer, (weight, bias, output) in enumerate(zip(self.weights, self.biases, outputs)):
+            np.dot(values, weight, out=output)
+            np.add(output, bias, out=output)
+            if layer < last:
+                np.maximum(output, 0.0, out=output)
+            values = output
+        return values
+
+def save_policy(path, policy, epsilon):
+    """Write a policy and its epsilon to an .npz file, atomically"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as policy_file:
+        np.savez(policy_file, epsilon=np.float64(epsilon), **policy.state_dict())
+    os.replace(temp_path, path)
+
+def load_policy(path):
+    """(NumpyPolicy, epsilon) from a file written by save_policy"""
+    with np.load(path) as exported:
+        state_dict = {name: exported[name] for name in exported.files if name != 'epsilon'}
+        return NumpyPolicy(state_dict), float(exported['epsilon'])
+
+def export_checkpoint(path, export_path=None):
+    """Export the policy network of a DQN checkpoint for actors that run without torch"""
+    import torch
+    checkpoint = torch.load(path, map_location='cpu')
+    export_path = export_path or policy_export_path(path)
+    save_policy(export_path, NumpyPolicy(checkpoint['policy_net_state_dict']), checkpoint['epsilon'])
+    return export_path
+
+class NumpyAgent:
+    """Acting-only stand-in for DQNAgent whose policy network is a NumpyPolicy"""
+
+    def __init__(self, state_size, action_size, player_number, policy_net, prioritized=False,
+                 normalize=OBSERVATION_CONFIG['NORMALIZE']):
+        self.state_size = state_size
+        self.action_size = action_size
+        self.player_number = player_number
+        self.encoder = ObservationEncoder(state_size // STATE_SIZE, normalize)
+        self.prioritized = prioritized
+        self.epsilon = 1.0
+        self.policy_net = policy_net
+        self.target_net = None
+        self.optimizer = None
+
+    @property
+    def trainable(self):
+        return False
+
+    def drop_training_state(self):
+        pass
+
+    def get_state(self, game_state):
+        """Stacked observation of a game state, a float32 view valid until the next-but-one call"""
+        return self.encoder.encode(game_state, self.player_number)
+
+    def push_state(self, game_state):
+        """Add a game state to the observation history without returning an observation"""
+        self.encoder.encode(game_state, self.player_number)
+
+    def keep_state(self, state):
+        """Copy of a get_state observation that outlives further get_state and push_state calls"""
+        return state.copy()
+
+    def get_states(self, game_states):
+        """Encode a list of consecutive game states as a (n, state_size) float32 array"""
+        return self.encoder.encode_batch(game_states, self.player_number)
+
+    def get_reward(self, game_state, next_game_state):
+        return game_state_reward(game_state, next_game_state, self.player_number)
+
+    def explore_action(self):
+        """Return a random action with probability epsilon, otherwise None"""
+        if random.random() < self.epsilon:
+            return random.randrange(self.action_size)
+        return None
+
+    def select_action(self, state):
+        """Select action using epsilon-greedy policy"""
+        action = self.explore_action()
+        if action is not None:
+            return action
+        return self.policy_net.act(state)
+
+    def select_actions(self, states):
+        """Epsilon-greedy actions for a (batch, state_size) array of states"""
+        actions = self.policy_net.batch_q_values(states).argmax(1)
+        explore = np.random.random_sample(len(actions)) < self.epsilon
+        actions[explore] = np.random.randint(0, self.action_size, size=int(explore.sum()))
+        return actions
+
+    def load_checkpoint(self, checkpoint):
+        self.policy_net.load_state_dict(checkpoint['policy_net_state_dict'])
+        self.epsilon = checkpoint['epsilon']
+
+def main():
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Export DQN checkpoints for the NumPy inference backend")
+    parser.add_argument('checkpoints', nargs='+', help=".pth files, each exported next to itself")
+    args = parser.parse_args()
+    for path in args.checkpoints:
+        logger.info(f"Exported {path} to {export_checkpoint(path)}")
+
+if __name__ == '__main__':
+    main()
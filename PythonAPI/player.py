@@ -2,9 +2,27 @@ from buttons import Buttons
 
 class Player:
 
+    __slots__ = ('player_id', 'health', 'x_coord', 'y_coord', 'is_jumping', 'is_crouching',
+                 'player_buttons', 'is_player_in_move', 'move_id')
+
     def __init__(self, player_dict):
         
         self.dict_to_object(player_dict)
+
+    @classmethod
+    def from_values(cls, character, health, x, y, jumping, crouching, in_move, move, buttons_mask):
+        """Build a Player straight from wire values, without an intermediate dict"""
+        player = cls.__new__(cls)
+        player.player_id = character
+        player.health = health
+        player.x_coord = x
+        player.y_coord = y
+        player.is_jumping = jumping
+        player.is_crouching = crouching
+        player.player_buttons = Buttons.from_mask(buttons_mask)
+        player.is_player_in_move = in_move
+        player.move_id = move
+        return player
     
     def dict_to_object(self, player_dict):
         
@@ -17,3 +35,19 @@ class Player:
         self.player_buttons = Buttons(player_dict['buttons'])
         self.is_player_in_move = player_dict['in_move']
         self.move_id = player_dict['move']
+
+    def object_to_dict(self):
+
+        player_dict = {}
+
+        player_dict['character'] = self.player_id
+        player_dict['health'] = self.health
+        player_dict['x'] = self.x_coord
+        player_dict['y'] = self.y_coord
+        player_dict['jumping'] = self.is_jumping
+        player_dict['crouching'] = self.is_crouching
+        player_dict['buttons'] = self.player_buttons.object_to_dict()
+        player_dict['in_move'] = self.is_player_in_move
+        player_dict['move'] = self.move_id
+
+        return player_dict
@@ -0,0 +1,241 @@
+import collections
+import cProfile
+import io
+import os
+import pstats
+import signal
+import socketserver
+import sys
+import threading
+import time
+import tracemalloc
+from config import PROFILING_CONFIG
+from logger import logger
+
+# 'cprofile' traces every call of the frame thread into a .pstats file; 'sample' reads its
+# stack every SAMPLE_INTERVAL_MS into collapsed stacks for flame graphs; 'memory' diffs
+# tracemalloc snapshots taken at the start and end
+PROFILE_MODES = ('cprofile', 'sample', 'memory')
+
+class RuntimeProfiler:
+    """Profiles a running process for a few seconds when asked, writing the results to OUTPUT_DIR
+
+    Requests may come from any thread or a signal handler, but cProfile only sees the
+    thread that enables it, so profiles start and stop in `poll()`, which the frame loop
+    calls once per frame; between requests that is one attribute check.
+    """
+
+    def __init__(self, output_dir=PROFILING_CONFIG['OUTPUT_DIR'], seconds=PROFILING_CONFIG['SECONDS'],
+                 sample_interval_ms=PROFILING_CONFIG['SAMPLE_INTERVAL_MS'],
+                 tracemalloc_frames=PROFILING_CONFIG['TRACEMALLOC_FRAMES'], top=PROFILING_CONFIG['TOP']):
+        self.output_dir = output_dir
+        self.seconds = seconds
+        self.sample_interval = sample_interval_ms / 1000.0
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top = top
+        self.pending = None
+        self.stop_requested = False
+        self.mode = None
+        self.deadline = 0.0
+        self.profile = None
+        self.sampler = None
+        self.stacks = None
+        self.snapshot = None
+        self.started_tracemalloc = False
+        self.last_outputs = []
+
+    @property
+    def active(self):
+        return self.mode is not None
+
+    def request(self, mode='cprofile', seconds=None):
+        """Ask for a `mode` profile of `seconds` (default SECONDS), started by the next poll()"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
+        self.pending = (mode, self.seconds if seconds is None else float(seconds))
+
+    def request_stop(self):
+        """End the running profile at the next poll()"""
+        self.stop_requested = True
+
+    def status(self):
+        if self.active:
+            return f"{self.mode} profile running, {max(0.0, self.deadline - time.monotonic()):.1f}s left"
+        if self.pending is not None:
+            return f"{self.pending[0]} profile starting on the next frame"
+        return "idle"
+
+    def poll(self):
+        """Start or finish profiles; call from the thread to profile, once per frame"""
+        if self.pending is None and self.mode is None:
+            return
+        if self.mode is not None and (self.stop_requested or time.monotonic() >= self.deadline):
+            self.finish()
+        if self.pending is not None and self.mode is None:
+            mode, seconds = self.pending
+            self.pending = None
+            self.start(mode, seconds)
+
+    def start(self, mode, seconds):
+        self.mode = mode
+        self.deadline = time.monotonic() + seconds
+        self.stop_requested = False
+        if mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif mode == 'sample':
+            self.stacks = collections.Counter()
+            self.sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),),
+                                            name="profile-sampler", daemon=True)
+            self.sampler.start()
+        else:
+            # tracemalloc slows every allocation down, so it only runs for the profile
+            self.started_tracemalloc = not tracemalloc.is_tracing()
+            if self.started_tracemalloc:
+                tracemalloc.start(self.tracemalloc_frames)
+            self.snapshot = tracemalloc.take_snapshot()
+        logger.info(f"Started {mode} profile for {seconds:.1f}s")
+
+    def finish(self):
+        """Stop the running profile and write its output files; returns their paths"""
+        mode = self.mode
+        base = os.path.join(self.output_dir, f"{mode}-{time.strftime('%Y%m%d-%H%M%S')}-pid{os.getpid()}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        if mode == 'cprofile':
+            self.profile.disable()
+            outputs = self._write_pstats(base)
+            self.profile = None
+        elif mode == 'sample':
+            # The sampler sees mode go None and exits
+            self.mode = None
+            self.sampler.join()
+            self.sampler = None
+            outputs = self._write_collapsed(base)
+            self.stacks = None
+        else:
+            outputs = self._write_memory_diff(base, tracemalloc.take_snapshot())
+            self.snapshot = None
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+        self.mode = None
+        self.stop_requested = False
+        self.last_outputs = outputs
+        logger.info(f"Finished {mode} profile: {', '.join(outputs)}")
+        return outputs
+
+    def close(self):
+        """Finish a running profile, so what it collected is not lost"""
+        self.pending = None
+        if self.mode is not None:
+            self.finish()
+
+    def _sample(self, thread_id):
+        while self.mode == 'sample':
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def _write_pstats(self, base):
+        self.profile.dump_stats(base + '.pstats')
+        summary = io.StringIO()
+        pstats.Stats(self.profile, stream=summary).sort_stats('cumulative').print_stats(self.top)
+        with open(base + '.txt', 'w') as summary_file:
+            summary_file.write(summary.getvalue())
+        return [base + '.pstats', base + '.txt']
+
+    def _write_collapsed(self, base):
+        # One "outer;...;inner count" line per stack, the input of flamegraph.pl and speedscope
+        with open(base + '.collapsed', 'w') as collapsed_file:
+            for stack, count in self.stacks.most_common():
+                collapsed_file.write(f"{stack} {count}\n")
+        return [base + '.collapsed']
+
+    def _write_memory_diff(self, base, snapshot):
+        # Allocations of the profiler itself would only add noise
+        ignored = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        before = self.snapshot.filter_traces(ignored)
+        after = snapshot.filter_traces(ignored)
+        with open(base + '.txt', 'w') as diff_file:
+            diff_file.write(f"Growth by line over the profile, top {self.top}\n")
+            for stat in after.compare_to(before, 'lineno')[:self.top]:
+                diff_file.write(f"{stat}\n")
+            diff_file.write(f"\nLargest allocation sites now, top {self.top}\n")
+            for stat in after.statistics('traceback')[:self.top]:
+                diff_file.write(f"{stat}\n")
+                for line in stat.traceback.format(limit=self.tracemalloc_frames):
+                    diff_file.write(f"    {line}\n")
+        return [base + '.txt']
+
+def install_signal_handlers(profiler, signals=PROFILING_CONFIG['SIGNALS']):
+    """Start profiles on signals (names the platform lacks are skipped); returns the signals installed"""
+    installed = []
+    for name, mode in signals.items():
+        number = getattr(signal, name, None)
+        if number is None:
+            continue
+
+        def handler(signum, frame, mode=mode):
+            profiler.request(mode)
+
+        signal.signal(number, handler)
+        installed.append(name)
+    return installed
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """One command per line: 'profile [seconds] [mode]', 'stop' or 'status'"""
+
+    def handle(self):
+        for line in self.rfile:
+            reply = self.server.execute(line.decode(errors='replace').split())
+            self.wfile.write(reply.encode() + b'\n')
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    """Localhost command socket driving a RuntimeProfiler, e.g. `echo "profile 5 sample" | nc 127.0.0.1 <port>`"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, profiler, port=0, host='127.0.0.1'):
+        super().__init__((host, port), ControlHandler)
+        self.profiler = profiler
+        self.port = self.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="profile-control", daemon=True)
+        self.thread.start()
+        logger.info(f"Profiling commands accepted on 127.0.0.1:{self.port}")
+        return self
+
+    def close(self):
+        if self.thread is not None:
+            self.shutdown()
+            self.thread = None
+        self.server_close()
+
+    def execute(self, words):
+        """Run one command and return its reply"""
+        if not words:
+            return "error: empty command"
+        command, arguments = words[0], words[1:]
+        try:
+            if command == 'profile':
+                seconds = float(arguments[0]) if arguments else None
+                mode = arguments[1] if len(arguments) > 1 else 'cprofile'
+                self.profiler.request(mode, seconds)
+                return f"ok: {self.profiler.status()}"
+            if command == 'stop':
+                self.profiler.request_stop()
+                return "ok: stopping on the next frame"
+            if command == 'status':
+                outputs = ', '.join(self.profiler.last_outputs) or 'none yet'
+                return f"ok: {self.profiler.status()}; last output {outputs}"
+        except ValueError as e:
+            return f"error: {e}"
+        return f"error: unknown command {command!r}, expected profile, stop or status"
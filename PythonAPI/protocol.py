@@ -0,0 +1,421 @@
+import json
+import struct
+from config import NETWORK_CONFIG
+from game_state import GameState
+from player import Player
+from command import Command
+from buttons import Buttons
+from timing import NULL_TIMER
+
+# Handshake: the emulator opens with MAGIC + version + preferred codec and the
+# controller answers with MAGIC + version + the codec it accepted. A peer that
+# starts with anything else (a bare JSON document) is served with the legacy
+# unframed JSON stream, so older Lua scripts keep working.
+MAGIC = b'SF2P'
+PROTOCOL_VERSION = 1
+
+CODEC_JSON = 0
+CODEC_BINARY = 1
+CODEC_NAMES = {
+    CODEC_JSON: 'json',
+    CODEC_BINARY: 'binary'
+}
+
+HELLO = struct.Struct('!4sBB')
+FRAME_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 1 << 20
+
+# Fixed-layout binary records.
+# Player: character, health, x, y, jumping, crouching, in_move, move, buttons mask
+# GameState: p1, p2, timer, result, round_started, round_over
+# Command: p1 mask, p2 mask, type, player count, save game path length
+PLAYER_FORMAT = 'Hhhh???HH'
+GAME_STATE_STRUCT = struct.Struct('!' + PLAYER_FORMAT + PLAYER_FORMAT + 'HB??')
+COMMAND_STRUCT = struct.Struct('!HHBBH')
+
+FIGHT_RESULTS = ('NOT_OVER', 'P1', 'P2', 'DRAW')
+COMMAND_TYPES = ('buttons', 'reset')
+
+class ProtocolError(Exception):
+    """Raised when a peer sends something that does not follow the protocol"""
+
+def buttons_dict_to_mask(buttons_dict):
+    """Pack a wire-format buttons dict into a 12-bit mask"""
+    return Buttons(buttons_dict).mask
+
+def mask_to_buttons_dict(mask):
+    """Unpack a 12-bit mask into a wire-format buttons dict"""
+    return Buttons.from_mask(mask).object_to_dict()
+
+def _code_for(table, value, what):
+    try:
+        return table.index(value)
+    except ValueError:
+        raise ProtocolError(f"Cannot encode {what} {value!r} in binary, use the JSON codec")
+
+def _pack(layout, what, *values):
+    try:
+        return layout.pack(*values)
+    except struct.error as e:
+        raise ProtocolError(f"Cannot encode {what} in binary ({e}), use the JSON codec") from e
+
+def _value_for(table, code, what):
+    if code >= len(table):
+        raise ProtocolError(f"Unknown {what} code {code}")
+    return table[code]
+
+class JsonCodec:
+    """Verbose JSON payloads, identical to the legacy wire format"""
+
+    codec_id = CODEC_JSON
+
+    def encode_game_state(self, game_state):
+        return json.dumps(game_state.object_to_dict()).encode()
+
+    def decode_game_state(self, payload):
+        return self.build_game_state(self.parse_game_state(payload))
+
+    def parse_game_state(self, payload):
+        return json.loads(payload)
+
+    def build_game_state(self, parsed):
+        return GameState(parsed)
+
+    def encode_command(self, command):
+        return json.dumps(command.object_to_dict()).encode()
+
+    def decode_command(self, payload):
+        command = Command()
+        command.dict_to_object(json.loads(payload))
+        return command
+
+class BinaryCodec:
+    """Compact fixed-layout payloads packed with struct"""
+
+    codec_id = CODEC_BINARY
+
+    def encode_game_state(self, game_state):
+        p1 = game_state.player1
+        p2 = game_state.player2
+        return _pack(
+            GAME_STATE_STRUCT, "game state",
+            p1.player_id, p1.health, p1.x_coord, p1.y_coord,
+            p1.is_jumping, p1.is_crouching, p1.is_player_in_move, p1.move_id,
+            p1.player_buttons.to_mask(),
+            p2.player_id, p2.health, p2.x_coord, p2.y_coord,
+            p2.is_jumping, p2.is_crouching, p2.is_player_in_move, p2.move_id,
+            p2.player_buttons.to_mask(),
+            game_state.timer,
+            _code_for(FIGHT_RESULTS, game_state.fight_result, "fight result"),
+            game_state.has_round_started,
+            game_state.is_round_over
+        )
+
+    def decode_game_state(self, payload):
+        return self.build_game_state(self.parse_game_state(payload))
+
+    def parse_game_state(self, payload):
+        if len(payload) != GAME_STATE_STRUCT.size:
+            raise ProtocolError(f"Game state payload is {len(payload)} bytes, expected {GAME_STATE_STRUCT.size}")
+        return GAME_STATE_STRUCT.unpack(payload)
+
+    def build_game_state(self, values):
+        return GameState.from_values(
+            Player.from_values(*values[0:9]),
+            Player.from_values(*values[9:18]),
+            values[18],
+            _value_for(FIGHT_RESULTS, values[19], "fight result"),
+            values[20],
+            values[21]
+        )
+
+    def encode_command(self, command):
+        path = command.save_game_path.encode()
+        header = _pack(
+            COMMAND_STRUCT, "command",
+            command.player_buttons.to_mask(),
+            command.player2_buttons.to_mask(),
+            _code_for(COMMAND_TYPES, command.type, "command type"),
+            2,
+            len(path)
+        )
+        return header + path
+
+    def decode_command(self, payload):
+        if len(payload) < COMMAND_STRUCT.size:
+            raise ProtocolError(f"Command payload is {len(payload)} bytes, expected at least {COMMAND_STRUCT.size}")
+        p1_mask, p2_mask, type_code, _, path_length = COMMAND_STRUCT.unpack_from(payload)
+        path = payload[COMMAND_STRUCT.size:COMMAND_STRUCT.size + path_length]
+        command = Command()
+        command.player_buttons = Buttons.from_mask(p1_mask)
+        command.player2_buttons = Buttons.from_mask(p2_mask)
+        command.type = _value_for(COMMAND_TYPES, type_code, "command type")
+        command.save_game_path = path.decode()
+        return command
+
+CODECS = {
+    CODEC_JSON: JsonCodec(),
+    CODEC_BINARY: BinaryCodec()
+}
+
+def encode_frame(payload):
+    """Prefix a payload with its length"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def encode_hello(codec_id, version=PROTOCOL_VERSION):
+    return HELLO.pack(MAGIC, version, codec_id)
+
+def decode_hello(data):
+    magic, version, codec_id = HELLO.unpack(data)
+    if magic != MAGIC:
+        raise ProtocolError(f"Bad handshake magic {magic!r}")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    return codec_id
+
+def choose_codec(requested_codec, allowed_codecs=None):
+    """Pick the codec to answer a handshake with, falling back to JSON"""
+    allowed = CODECS.keys() if allowed_codecs is None else allowed_codecs
+    if requested_codec in CODECS and requested_codec in allowed:
+        return requested_codec
+    return CODEC_JSON
+
+class LegacyJsonStream:
+    """Splits an unframed stream of concatenated JSON documents"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.decoder = json.JSONDecoder()
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next_object(self):
+        """Return the next complete document, or None if more bytes are needed"""
+        try:
+            text = self.buffer.decode('utf-8')
+        except UnicodeDecodeError as error:
+            # A multi-byte character may be split across two reads
+            text = self.buffer[:error.start].decode('utf-8')
+        stripped = text.lstrip()
+        if not stripped:
+            del self.buffer[:len(text)]
+            return None
+        try:
+            obj, end = self.decoder.raw_decode(stripped)
+        except json.JSONDecodeError:
+            if len(self.buffer) > MAX_FRAME_SIZE:
+                raise ProtocolError("Legacy JSON message exceeds the frame size limit")
+            return None
+        consumed = len(text) - len(stripped) + end
+        del self.buffer[:len(text[:consumed].encode('utf-8'))]
+        return obj
+
+class MessageCoding:
+    """Turns objects into wire bytes and back for the negotiated mode"""
+
+    def _game_state_bytes(self, game_state):
+        if not self.framed:
+            return json.dumps(game_state.object_to_dict()).encode()
+        return encode_frame(self.codec.encode_game_state(game_state))
+
+    def _command_bytes(self, command):
+        if not self.framed:
+            return json.dumps(command.object_to_dict()).encode()
+        return encode_frame(self.codec.encode_command(command))
+
+    def _decode_game_state(self, message, timer, start):
+        # Legacy documents were already parsed while splitting the stream
+        if self.framed:
+            message = self.codec.parse_game_state(message)
+            start = timer.lap('decode', start)
+        game_state = self.codec.build_game_state(message)
+        timer.lap('build', start)
+        return game_state
+
+    def _decode_command(self, message):
+        if not self.framed:
+            command = Command()
+            command.dict_to_object(message)
+            return command
+        return self.codec.decode_command(message)
+
+    def _command_bytes_timed(self, command, timer):
+        start = timer.start()
+        data = self._command_bytes(command)
+        return data, timer.lap('encode', start)
+
+    def _start_legacy(self, data=b''):
+        self.framed = False
+        self.legacy_stream = LegacyJsonStream()
+        self.legacy_stream.feed(data)
+
+class Connection(MessageCoding):
+    """A socket speaking either the framed protocol or the legacy JSON stream"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.codec = CODECS[CODEC_JSON]
+        self.framed = True
+        self.buffer = bytearray()
+        self.legacy_stream = None
+        self.recv_size = NETWORK_CONFIG['BUFFER_SIZE']
+        self.received_at = 0.0
+
+    def accept_handshake(self, allowed_codecs=None):
+        """Controller side: read the peer's hello, or switch to legacy JSON"""
+        self._read_until(len(MAGIC))
+        if bytes(self.buffer[:len(MAGIC)]) != MAGIC:
+            self._start_legacy(bytes(self.buffer))
+            self.buffer.clear()
+            return None
+        requested_codec = decode_hello(self._read_exact(HELLO.size))
+        codec_id = choose_codec(requested_codec, allowed_codecs)
+        self.sock.sendall(encode_hello(codec_id))
+        self.codec = CODECS[codec_id]
+        return codec_id
+
+    def request_handshake(self, codec_id=CODEC_BINARY):
+        """Emulator side: offer a codec and adopt the one the controller picked"""
+        self.sock.sendall(encode_hello(codec_id))
+        accepted = decode_hello(self._read_exact(HELLO.size))
+        if accepted not in CODECS:
+            raise ProtocolError(f"Controller picked unknown codec {accepted}")
+        self.codec = CODECS[accepted]
+        return accepted
+
+    def use_legacy(self):
+        """Emulator side: skip the handshake and send bare JSON like sf2_bot.lua"""
+        self._start_legacy()
+
+    def _fill(self):
+        data = self.sock.recv(self.recv_size)
+        if not data:
+            raise ConnectionError("Connection closed by peer")
+        return data
+
+    def _read_until(self, size):
+        while len(self.buffer) < size:
+            self.buffer += self._fill()
+
+    def _read_exact(self, size):
+        self._read_until(size)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read_message(self):
+        """Return the next frame payload, or the next document of a legacy stream"""
+        if not self.framed:
+            obj = self.legacy_stream.next_object()
+            while obj is None:
+                self.legacy_stream.feed(self._fill())
+                obj = self.legacy_stream.next_object()
+            return obj
+        (size,) = FRAME_HEADER.unpack(self._read_exact(FRAME_HEADER.size))
+        if size > MAX_FRAME_SIZE:
+            raise ProtocolError(f"Frame of {size} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+        return self._read_exact(size)
+
+    def receive_game_state(self, timer=NULL_TIMER):
+        start = timer.start()
+        message = self.read_message()
+        self.received_at = timer.lap('recv', start)
+        return self._decode_game_state(message, timer, self.received_at)
+
+    def receive_command(self):
+        return self._decode_command(self.read_message())
+
+    def send_game_state(self, game_state):
+        self.sock.sendall(self._game_state_bytes(game_state))
+
+    def send_command(self, command, timer=NULL_TIMER):
+        data, start = self._command_bytes_timed(command, timer)
+        self.sock.sendall(data)
+        timer.lap('send', start)
+
+    def close(self):
+        self.sock.close()
+
+class AsyncConnection(MessageCoding):
+    """asyncio stream counterpart of Connection"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.codec = CODECS[CODEC_JSON]
+        self.framed = True
+        self.legacy_stream = None
+        self.recv_size = NETWORK_CONFIG['BUFFER_SIZE']
+        self.received_at = 0.0
+
+    async def accept_handshake(self, allowed_codecs=None):
+        """Controller side: read the peer's hello, or switch to legacy JSON"""
+        head = await self.reader.readexactly(len(MAGIC))
+        if head != MAGIC:
+            self._start_legacy(head)
+            return None
+        rest = await self.reader.readexactly(HELLO.size - len(MAGIC))
+        codec_id = choose_codec(decode_hello(head + rest), allowed_codecs)
+        self.writer.write(encode_hello(codec_id))
+        await self.writer.drain()
+        self.codec = CODECS[codec_id]
+        return codec_id
+
+    async def request_handshake(self, codec_id=CODEC_BINARY):
+        """Emulator side: offer a codec and adopt the one the controller picked"""
+        self.writer.write(encode_hello(codec_id))
+        await self.writer.drain()
+        accepted = decode_hello(await self.reader.readexactly(HELLO.size))
+        if accepted not in CODECS:
+            raise ProtocolError(f"Controller picked unknown codec {accepted}")
+        self.codec = CODECS[accepted]
+        return accepted
+
+    def use_legacy(self):
+        """Emulator side: skip the handshake and send bare JSON like sf2_bot.lua"""
+        self._start_legacy()
+
+    async def read_message(self):
+        """Return the next frame payload, or the next document of a legacy stream"""
+        if not self.framed:
+            obj = self.legacy_stream.next_object()
+            while obj is None:
+                data = await self.reader.read(self.recv_size)
+                if not data:
+                    raise ConnectionError("Connection closed by peer")
+                self.legacy_stream.feed(data)
+                obj = self.legacy_stream.next_object()
+            return obj
+        (size,) = FRAME_HEADER.unpack(await self.reader.readexactly(FRAME_HEADER.size))
+        if size > MAX_FRAME_SIZE:
+            raise ProtocolError(f"Frame of {size} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+        return await self.reader.readexactly(size)
+
+    async def receive_game_state(self, timer=NULL_TIMER):
+        start = timer.start()
+        message = await self.read_message()
+        self.received_at = timer.lap('recv', start)
+        return self._decode_game_state(message, timer, self.received_at)
+
+    async def receive_command(self):
+        return self._decode_command(await self.read_message())
+
+    async def send_game_state(self, game_state):
+        self.writer.write(self._game_state_bytes(game_state))
+        await self.writer.drain()
+
+    async def send_command(self, command, timer=NULL_TIMER):
+        data, start = self._command_bytes_timed(command, timer)
+        self.writer.write(data)
+        await self.writer.drain()
+        timer.lap('send', start)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
@@ -0,0 +1,74 @@
+import argparse
+import os
+import numpy as np
+from dataset import iter_transitions
+from config import OBSERVATION_CONFIG
+from features import TRANSITION_ARRAYS, observation_size, state_rewards
+from logger import logger, setup_logger
+
+def relabel_file(path, normalize=None, health_weight=None, distance_weight=None):
+    """Recompute the rewards of a saved replay buffer (.npz) and rewrite it in place; returns its size
+
+    Unless `normalize` is given, observations are taken as normalized if the file says
+    so (ReplayBuffer.save, export_transitions), else per OBSERVATION_CONFIG['NORMALIZE'].
+    """
+    with np.load(path) as saved:
+        transitions = {name: saved[name] for name in TRANSITION_ARRAYS}
+        if 'normalized' in saved.files:
+            transitions['normalized'] = saved['normalized']
+    if normalize is None:
+        normalize = bool(transitions.get('normalized', OBSERVATION_CONFIG['NORMALIZE']))
+    transitions['rewards'] = state_rewards(transitions['states'], transitions['next_states'], normalize,
+                                           health_weight, distance_weight)
+    # Write next to the file and swap it in, so an interrupted run leaves the old labels intact
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as temp_file:
+        np.savez(temp_file, **transitions)
+    os.replace(temp_path, path)
+    return len(transitions['rewards'])
+
+def export_transitions(sources, path, player_number=1, health_weight=None, distance_weight=None,
+                       frames=OBSERVATION_CONFIG['FRAMES'], normalize=OBSERVATION_CONFIG['NORMALIZE']):
+    """Label every transition of recordings or archives and save them as a replay buffer file
+
+    Observations stack `frames` frames, normalized or not, like the bots' (OBSERVATION_CONFIG).
+    """
+    chunks = [transitions for source in sources
+              for transitions in iter_transitions(source, player_number, health_weight, distance_weight,
+                                                  frames, normalize)]
+    if chunks:
+        columns = [np.concatenate(column) for column in zip(*chunks)]
+    else:
+        size = observation_size(frames)
+        columns = [np.zeros((0, size), np.float32), np.zeros(0, np.int64), np.zeros(0, np.float32),
+                   np.zeros((0, size), np.float32), np.zeros(0, np.float32)]
+    np.savez(path, normalized=np.array(bool(normalize)), **dict(zip(TRANSITION_ARRAYS, columns)))
+    return len(columns[1])
+
+def main():
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Recompute rewards of saved replay buffers, or label recordings")
+    parser.add_argument('paths', nargs='+', help="replay buffer .npz files to relabel in place, "
+                                                 "or recordings/archives with --output")
+    parser.add_argument('--output', help="label the recordings given and save them as a replay buffer file")
+    parser.add_argument('--player', type=int, choices=[1, 2], default=1,
+                        help="side recordings are labeled from")
+    parser.add_argument('--normalized', action=argparse.BooleanOptionalAction,
+                        help="whether the replay buffers hold (or --output writes) normalized observations, "
+                             "default what the file records, else OBSERVATION_CONFIG['NORMALIZE']")
+    parser.add_argument('--health-weight', type=float, help="default REWARD_CONFIG['HEALTH_WEIGHT']")
+    parser.add_argument('--distance-weight', type=float, help="default REWARD_CONFIG['DISTANCE_WEIGHT']")
+    args = parser.parse_args()
+
+    if args.output:
+        normalize = OBSERVATION_CONFIG['NORMALIZE'] if args.normalized is None else args.normalized
+        count = export_transitions(args.paths, args.output, args.player, args.health_weight, args.distance_weight,
+                                   normalize=normalize)
+        logger.info(f"Labeled {count} transitions from {len(args.paths)} recordings into {args.output}")
+        return
+    for path in args.paths:
+        count = relabel_file(path, args.normalized, args.health_weight, args.distance_weight)
+        logger.info(f"Relabeled {count} transitions of {path}")
+
+if __name__ == '__main__':
+    main()
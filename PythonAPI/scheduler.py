@@ -0,0 +1,107 @@
+from config import TIMING_CONFIG, TRAINING_CONFIG
+
+TARGET_UPDATES = ('hard', 'soft')
+EPSILON_SCHEDULES = ('exponential', 'linear')
+
+class TrainingScheduler:
+    """Decides when a DQNAgent trains, how many gradient steps it takes, and when its target network follows
+
+    `env_steps` counts transitions observed and `updates` counts gradient steps; both
+    keep growing across rounds. Transitions add `replay_ratio` (by default
+    gradient_steps / train_every) gradient steps to a budget, which is spent every
+    `train_every` transitions. With `adaptive` on, the budget shrinks while frames miss
+    their deadline and grows back once they make it again.
+    """
+
+    def __init__(self, agent, train_every=TRAINING_CONFIG['TRAIN_EVERY'],
+                 gradient_steps=TRAINING_CONFIG['GRADIENT_STEPS'], replay_ratio=TRAINING_CONFIG['REPLAY_RATIO'],
+                 target_update=TRAINING_CONFIG['TARGET_UPDATE'],
+                 target_update_every=TRAINING_CONFIG['TARGET_UPDATE_EVERY'], tau=TRAINING_CONFIG['TAU'],
+                 epsilon_schedule=TRAINING_CONFIG['EPSILON_SCHEDULE'], epsilon_steps=TRAINING_CONFIG['EPSILON_STEPS'],
+                 adaptive=TRAINING_CONFIG['ADAPTIVE'], frame_budget_ms=TIMING_CONFIG['FRAME_BUDGET_MS'],
+                 max_miss_rate=TRAINING_CONFIG['MAX_MISS_RATE'], min_intensity=TRAINING_CONFIG['MIN_INTENSITY']):
+        if target_update not in TARGET_UPDATES:
+            raise ValueError(f"Unknown target update {target_update!r}, expected one of {TARGET_UPDATES}")
+        if epsilon_schedule not in EPSILON_SCHEDULES:
+            raise ValueError(f"Unknown epsilon schedule {epsilon_schedule!r}, expected one of {EPSILON_SCHEDULES}")
+        self.agent = agent
+        self.train_every = max(1, train_every)
+        self.replay_ratio = replay_ratio if replay_ratio is not None else gradient_steps / self.train_every
+        self.target_update = target_update
+        self.target_update_every = target_update_every
+        self.tau = tau
+        self.epsilon_schedule = epsilon_schedule
+        self.epsilon_steps = epsilon_steps
+        # A linear schedule runs from the agent's epsilon (fresh or loaded) down to its minimum
+        self.epsilon_start = agent.epsilon
+        self.adaptive = adaptive
+        self.frame_budget = frame_budget_ms / 1000.0
+        self.max_miss_rate = max_miss_rate
+        self.min_intensity = min_intensity
+        self.intensity = 1.0
+        self.miss_rate = 0.0
+        self.env_steps = 0
+        self.trained_at = 0
+        self.updates = 0
+        self.budget = 0.0
+        self.last_loss = None
+
+    def observe(self, count=1):
+        """Count `count` new transitions in the replay buffer"""
+        self.env_steps += count
+        self.budget += count * self.replay_ratio * self.intensity
+
+    def due(self):
+        """Gradient steps to take now"""
+        if self.env_steps - self.trained_at < self.train_every:
+            return 0
+        return int(self.budget)
+
+    def train(self):
+        """Take every gradient step that is due; returns the last loss, None if none ran"""
+        steps = self.due()
+        if steps:
+            self.trained_at = self.env_steps
+        loss = None
+        for _ in range(steps):
+            step_loss = self.update()
+            if step_loss is None:
+                break
+            loss = step_loss
+        return loss
+
+    def update(self):
+        """One gradient step with its target network and epsilon bookkeeping"""
+        self.budget = max(0.0, self.budget - 1)
+        loss = self.agent.train(decay_epsilon=False)
+        if loss is None:
+            # Not enough experience yet, nothing to catch up on later
+            self.budget = 0.0
+            return None
+        self.updates += 1
+        self.last_loss = loss
+        if self.target_update == 'soft':
+            self.agent.soft_update_target_network(self.tau)
+        elif self.updates % self.target_update_every == 0:
+            self.agent.update_target_network()
+        self.update_epsilon()
+        return loss
+
+    def update_epsilon(self):
+        agent = self.agent
+        if self.epsilon_schedule == 'linear':
+            fraction = min(1.0, self.env_steps / self.epsilon_steps) if self.epsilon_steps else 1.0
+            agent.epsilon = self.epsilon_start + fraction * (agent.epsilon_min - self.epsilon_start)
+        else:
+            agent.epsilon = max(agent.epsilon_min, agent.epsilon * agent.epsilon_decay)
+
+    def frame_done(self, seconds):
+        """Report how long a frame took; adapts the training intensity to the frame deadline"""
+        if not self.adaptive:
+            return
+        # Exponential moving average of the share of frames over budget
+        self.miss_rate += 0.05 * ((seconds > self.frame_budget) - self.miss_rate)
+        if self.miss_rate > self.max_miss_rate:
+            self.intensity = max(self.min_intensity, self.intensity * 0.95)
+        else:
+            self.intensity = min(1.0, self.intensity * 1.01)
@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+from bot import Bot
+from command import Command
+from config import DECISION_CONFIG, NETWORK_CONFIG, PROFILING_CONFIG, TIMING_CONFIG
+from data_recorder import DataRecorder
+from learner import Learner
+from logger import logger, frame_log, setup_logger
+from model_registry import player_model_path
+from profiling import ControlServer, RuntimeProfiler, install_signal_handlers
+from protocol import AsyncConnection, CODEC_NAMES
+from timing import make_timer
+
+class Session:
+    """One emulator connection: its own Bot and DataRecorder"""
+
+    def __init__(self, session_id, player_number, record=True, timing=TIMING_CONFIG['ENABLED'], learner=None,
+                 backend=None, decision_interval=DECISION_CONFIG['INTERVAL'],
+                 adaptive_interval=DECISION_CONFIG['ADAPTIVE']):
+        self.session_id = session_id
+        self.player_number = player_number
+        self.timer = make_timer(f"session {session_id}", timing)
+        self.bot = Bot(player_number, learner, backend=backend, decision_interval=decision_interval,
+                       adaptive_interval=adaptive_interval)
+        self.bot.timer = self.timer
+        self.recorder = DataRecorder(f"game_data_session{session_id}.csv") if record else None
+        self.frames = 0
+
+    def step(self, game_state):
+        """Let the bot play one frame and return the command to send back"""
+        buttons = self.bot.fight(game_state, str(self.player_number))
+        return self.finish(game_state, buttons)
+
+    async def step_batched(self, game_state, inference):
+        """Like step, but the greedy action comes from the shared batched inference"""
+        buttons = self.bot.hold(game_state, str(self.player_number))
+        if buttons is not None:
+            return self.finish(game_state, buttons)
+        state = self.bot.observe(game_state, str(self.player_number))
+        action = self.bot.agent.explore_action()
+        if action is None:
+            action = await inference.act(state)
+        return self.finish(game_state, self.bot.act(game_state, state, action))
+
+    def finish(self, game_state, buttons):
+        """Record the frame and wrap the bot's buttons in a command"""
+        command = Command()
+        if self.player_number == 1:
+            command.player_buttons = buttons
+            p1_buttons, p2_buttons = buttons, game_state.player2.player_buttons
+        else:
+            command.player2_buttons = buttons
+            p1_buttons, p2_buttons = game_state.player1.player_buttons, buttons
+        if self.recorder is not None:
+            start = self.timer.start()
+            self.recorder.record_frame(game_state, p1_buttons, p2_buttons)
+            self.timer.lap('record_frame', start)
+        self.frames += 1
+        return command
+
+    def close(self):
+        self.bot.close()
+        if self.timer.enabled and self.timer.frames:
+            logger.info(self.timer.report())
+        if self.recorder is not None:
+            self.recorder.close()
+
+class ControllerServer:
+    """Serves any number of emulator connections on one asyncio event loop"""
+
+    def __init__(self, ports, player_number=2, host=NETWORK_CONFIG['HOST'], allowed_codecs=None, record=True,
+                 timing=TIMING_CONFIG['ENABLED'], async_training=False, batch_inference=False,
+                 backend=None, decision_interval=DECISION_CONFIG['INTERVAL'],
+                 adaptive_interval=DECISION_CONFIG['ADAPTIVE'], profiler=None,
+                 profile_poll_ms=PROFILING_CONFIG['POLL_INTERVAL_MS']):
+        self.ports = list(ports)
+        self.player_number = player_number
+        self.host = host
+        self.allowed_codecs = allowed_codecs
+        self.record = record
+        self.timing = timing
+        # Batched inference needs one shared policy, so it implies a shared learner
+        self.async_training = async_training or batch_inference
+        self.batch_inference = batch_inference
+        # The numpy backend only applies to acting-only bots that pick their own actions
+        self.backend = backend if async_training and not batch_inference else 'torch'
+        self.decision_interval = decision_interval
+        self.adaptive_interval = adaptive_interval
+        self.learner = None
+        self.inference = None
+        self.servers = []
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+        # Every session runs on the event loop thread, so profiles start and stop there
+        self.profiler = profiler
+        self.profile_poll_interval = profile_poll_ms / 1000.0
+        self.profile_poller = None
+
+    async def start(self):
+        for port in self.ports:
+            server = await asyncio.start_server(self.handle_connection, self.host, port)
+            self.servers.append(server)
+            logger.info(f"Controller listening on {self.host}:{port}")
+        if self.profiler is not None and self.profile_poller is None:
+            self.profile_poller = asyncio.create_task(self.poll_profiler())
+
+    async def poll_profiler(self):
+        """Start and finish requested profiles on the event loop thread, between frames"""
+        while True:
+            self.profiler.poll()
+            await asyncio.sleep(self.profile_poll_interval)
+
+    async def serve_forever(self):
+        await self.start()
+        await asyncio.gather(*(server.serve_forever() for server in self.servers))
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
+        if self.profile_poller is not None:
+            self.profile_poller.cancel()
+            self.profile_poller = None
+            self.profiler.close()
+        if self.inference is not None:
+            logger.info(f"Batched inference: {self.inference.batches} batches, "
+                        f"mean batch size {self.inference.mean_batch_size():.2f}")
+            self.inference = None
+        if self.learner is not None:
+            self.learner.stop()
+            self.learner = None
+
+    def create_session(self, session_id):
+        if self.async_training and self.learner is None:
+            # All sessions act for one shared learner, and share one read-only policy network
+            self.learner = Learner.for_player(self.player_number, player_model_path(self.player_number))
+            self.learner.start()
+        session = Session(session_id, self.player_number, self.record, self.timing, self.learner, self.backend,
+                          self.decision_interval, self.adaptive_interval)
+        if self.batch_inference and self.inference is None:
+            from inference import BatchedInference
+            agent = session.bot.agent
+            self.inference = BatchedInference(agent.state_size, agent.action_size, learner=self.learner)
+        return session
+
+    async def handle_connection(self, reader, writer):
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = AsyncConnection(reader, writer)
+        session_id = next(self.session_ids)
+        session = None
+        try:
+            codec_id = await connection.accept_handshake(self.allowed_codecs)
+            mode = "legacy JSON stream" if codec_id is None else CODEC_NAMES[codec_id]
+            logger.info(f"Session {session_id} connected from {writer.get_extra_info('peername')} ({mode})")
+            session = self.create_session(session_id)
+            self.sessions[session_id] = session
+            while True:
+                game_state = await connection.receive_game_state(session.timer)
+                if self.inference is not None:
+                    command = await session.step_batched(game_state, self.inference)
+                else:
+                    command = session.step(game_state)
+                await connection.send_command(command, session.timer)
+                session.timer.frame_done(connection.received_at)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logger.info(f"Session {session_id} disconnected")
+        except Exception as e:
+            logger.error(f"Session {session_id} error: {e}")
+        finally:
+            self.sessions.pop(session_id, None)
+            if session is not None:
+                session.close()
+                logger.info(f"Session {session_id} closed after {session.frames} frames")
+            await connection.close()
+
+def main():
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Serve many emulator sessions from one process")
+    parser.add_argument('--host', default=NETWORK_CONFIG['HOST'])
+    parser.add_argument('--ports', type=int, nargs='+', default=[NETWORK_CONFIG['PORT_P1']])
+    parser.add_argument('--player', type=int, choices=[1, 2], default=2, help="player slot the bot controls")
+    parser.add_argument('--codecs', nargs='+', choices=sorted(CODEC_NAMES.values()), help="codecs the handshake may pick")
+    parser.add_argument('--no-record', action='store_true', help="do not record frames")
+    parser.add_argument('--timing', action='store_true', help="report per-stage frame latency percentiles")
+    parser.add_argument('--async-train', action='store_true', help="train in a background learner thread")
+    parser.add_argument('--batch-inference', action='store_true',
+                        help="answer all sessions with batched forward passes (implies --async-train)")
+    parser.add_argument('--no-frame-log', action='store_true', help="drop every per-frame log line")
+    parser.add_argument('--backend', choices=['torch', 'numpy'],
+                        help="how acting-only bots evaluate the policy (--async-train without --batch-inference), "
+                             "default INFERENCE_CONFIG['BACKEND']")
+    parser.add_argument('--decision-interval', type=int, default=DECISION_CONFIG['INTERVAL'],
+                        help="frames each chosen action is held")
+    parser.add_argument('--adaptive-interval', action='store_true', default=DECISION_CONFIG['ADAPTIVE'],
+                        help="decide every frame up close or while the opponent attacks")
+    parser.add_argument('--profile-port', type=int, default=PROFILING_CONFIG['CONTROL_PORT'],
+                        help="localhost port taking profiling commands (see profiling.ControlServer)")
+    args = parser.parse_args()
+    if args.no_frame_log:
+        frame_log.enabled = False
+
+    allowed_codecs = None
+    if args.codecs:
+        allowed_codecs = [codec_id for codec_id, name in CODEC_NAMES.items() if name in args.codecs]
+    # Profiles can be started while the server runs: by signal (see PROFILING_CONFIG['SIGNALS'])
+    # or by command on --profile-port
+    profiler = RuntimeProfiler()
+    signals = install_signal_handlers(profiler)
+    if signals:
+        logger.info("Send %s to process %s to profile it", ' or '.join(signals), os.getpid())
+    control = ControlServer(profiler, args.profile_port).start() if args.profile_port is not None else None
+    server = ControllerServer(args.ports, args.player, args.host, allowed_codecs, not args.no_record,
+                              args.timing or TIMING_CONFIG['ENABLED'], args.async_train,
+                              args.batch_inference, args.backend, args.decision_interval, args.adaptive_interval,
+                              profiler)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logger.info("Controller server interrupted by user")
+    finally:
+        if control is not None:
+            control.close()
+        # The event loop thread is this one, so a profile it left running can be finished here
+        profiler.close()
+        if server.learner is not None:
+            server.learner.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+from bot import Bot
+from model_registry import registry
+
+class WorkingDirectoryTestCase(unittest.TestCase):
+    """Runs each test in an empty working directory with an empty model registry
+
+    Bots load and save models and recordings relative to the working directory.
+    Bots created with make_bot() are closed before the directory goes away, which
+    also stops their checkpoint threads.
+    """
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmpdir.name, 'models'))
+        os.chdir(self.tmpdir.name)
+        registry.clear()
+        self.bots = []
+
+    def tearDown(self):
+        for bot in self.bots:
+            bot.close()
+        registry.clear()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def make_bot(self, *args, **kwargs):
+        bot = Bot(*args, **kwargs)
+        self.bots.append(bot)
+        return bot
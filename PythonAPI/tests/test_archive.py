@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from archive import ArchiveReader, ArchiveWriter
+from buttons import Buttons
+from emulator_stub import SyntheticFrames
+from trajectory import TrajectoryWriter, iter_chunks, to_csv
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def record(self, name, rounds, frames_per_round, seed):
+        source = SyntheticFrames(seed=seed)
+        writer = TrajectoryWriter(self.path(name), 'npz', chunk_frames=50)
+        frame = 0
+        round_numbers = range(1, rounds + 1) if isinstance(rounds, int) else rounds
+        for round_number in round_numbers:
+            for _ in range(frames_per_round):
+                frame += 1
+                game_state = source.next_state()
+                writer.append(frame / 60.0, round_number, frame, game_state,
+                              game_state.player1.player_buttons, Buttons.from_mask(frame % 7))
+        writer.close()
+        return self.path(name)
+
+    def test_random_access_by_match_round_and_frame(self):
+        first = self.record('first.traj', rounds=3, frames_per_round=40, seed=1)
+        second = self.record('second.traj', rounds=2, frames_per_round=70, seed=2)
+        writer = ArchiveWriter(self.path('matches.sf2a'))
+        writer.add_match(first)
+        writer.add_match(second)
+        writer.close()
+
+        reader = ArchiveReader(self.path('matches.sf2a'))
+        self.assertEqual(len(reader), 3 * 40 + 2 * 70)
+        self.assertEqual(reader.matches(), 2)
+        self.assertEqual(reader.round_numbers(0), [1, 2, 3])
+        self.assertEqual(len(reader.round(1, 2)), 70)
+        self.assertEqual(int(reader.frame(1, 2, 5)['frame']), 70 + 6)
+        # Views map the file instead of copying it
+        self.assertTrue(np.shares_memory(reader.column('p1_x', 0, 3), reader.frames))
+
+        columns = next(iter_chunks(second))
+        self.assertEqual(reader.column('p1_health', 1)[:50].tolist(), columns['p1_health'].tolist())
+        self.assertEqual(reader.fight_results(reader.column('fight_result', 1)[:50]).tolist(),
+                         columns['fight_result'].tolist())
+
+    def test_repeated_round_numbers_keep_every_round(self):
+        # A recording appended to after a restart counts its rounds from 1 again
+        source = self.record('restarted.traj', rounds=[1, 2, 1], frames_per_round=30, seed=3)
+        writer = ArchiveWriter(self.path('matches.sf2a'))
+        writer.add_match(source)
+        writer.close()
+
+        reader = ArchiveReader(self.path('matches.sf2a'))
+        self.assertEqual(reader.round_numbers(0), [1, 2, 1])
+        self.assertEqual(len(reader.match(0)), 90)
+        self.assertEqual(reader.round(0, 1)['frame'].tolist(), list(range(1, 31)))
+        self.assertEqual(reader.round(0, 1, occurrence=1)['frame'].tolist(), list(range(61, 91)))
+        self.assertEqual(int(reader.frame(0, 1, 0, occurrence=-1)['frame']), 61)
+        with self.assertRaises(KeyError):
+            reader.round(0, 1, occurrence=2)
+        with self.assertRaises(KeyError):
+            reader.round(0, 3)
+
+    def test_appends_and_reads_legacy_csv(self):
+        first = self.record('first.traj', rounds=1, frames_per_round=30, seed=1)
+        to_csv(first, self.path('first.csv'))
+        for source in (first, self.path('first.csv')):
+            writer = ArchiveWriter(self.path('matches.sf2a'))
+            writer.add_match(source)
+            writer.close()
+
+        reader = ArchiveReader(self.path('matches.sf2a'))
+        self.assertEqual(reader.matches(), 2)
+        self.assertEqual(reader.match(0).tobytes(), reader.match(1).tobytes())
+
+if __name__ == '__main__':
+    unittest.main()
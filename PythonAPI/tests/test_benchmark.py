@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+from benchmark import BENCHMARKS, compare, load_baseline, run, save_baseline
+
+class TestBenchmark(unittest.TestCase):
+    def test_every_benchmark_runs(self):
+        results = run(scale=0.02)
+        self.assertEqual(set(results), set(BENCHMARKS))
+        for name, metrics in results.items():
+            for metric, value in metrics.items():
+                self.assertGreater(value, 0, f"{name}.{metric}")
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        baseline = {'bot_fight': {'acting_us': 10.0}, 'replay_buffer': {'push_per_second': 1000.0}}
+        results = {'bot_fight': {'acting_us': 11.0, 'training_us': 500.0},
+                   'replay_buffer': {'push_per_second': 700.0}}
+        rows = {(name, metric): row for name, metric, *row in compare(baseline, results, threshold=0.2)}
+        # Metrics missing from the baseline are not compared
+        self.assertEqual(set(rows), {('bot_fight', 'acting_us'), ('replay_buffer', 'push_per_second')})
+        self.assertAlmostEqual(rows['bot_fight', 'acting_us'][2], 0.1)
+        self.assertFalse(rows['bot_fight', 'acting_us'][3])
+        self.assertAlmostEqual(rows['replay_buffer', 'push_per_second'][2], 0.3)
+        self.assertTrue(rows['replay_buffer', 'push_per_second'][3])
+
+    def test_baseline_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmarks', 'baseline.json')
+            save_baseline(path, {'dqn_train': {'train_step_us': 500.0}})
+            self.assertEqual(load_baseline(path), {'dqn_train': {'train_step_us': 500.0}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,21 @@
 import unittest
-from bot import Bot
+from buttons import Buttons
 from game_state import GameState
-from player import Player
-from logger import log_debug
+from helpers import WorkingDirectoryTestCase
 
-class TestBot(unittest.TestCase):
+def player_dict(x, health):
+    return {'character': 0, 'health': health, 'x': x, 'y': 192, 'jumping': False, 'crouching': False,
+            'buttons': Buttons().object_to_dict(), 'in_move': False, 'move': 0}
+
+class TestBot(WorkingDirectoryTestCase):
     def setUp(self):
-        self.bot = Bot()
+        super().setUp()
+        self.bot = self.make_bot()
         self.game_state = GameState({
-            'p1': {'x_coord': 100, 'y_coord': 200, 'health': 100, 'state': 0},
-            'p2': {'x_coord': 300, 'y_coord': 200, 'health': 100, 'state': 0},
+            'p1': player_dict(100, 100),
+            'p2': player_dict(300, 100),
             'timer': 99,
-            'round': 1,
+            'result': 'NOT_OVER',
             'round_started': True,
             'round_over': False
         })
@@ -56,9 +60,12 @@ class TestBot(unittest.TestCase):
     def test_run_command(self):
         """Test command execution"""
         self.bot.run_command([">", "!>", "Y", "!Y"], self.game_state.player1)
-        self.assertEqual(self.bot.exe_code, 1)
-        self.assertTrue(self.bot.buttn.right)
-        self.assertTrue(self.bot.buttn.y)
+        self.assertTrue(self.bot.macros.active)
+        buttons = self.bot.hold(self.game_state)
+        self.assertTrue(buttons.right)
+        self.assertFalse(buttons.Y)
+        self.bot.hold(self.game_state)
+        self.assertTrue(self.bot.hold(self.game_state).Y)
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,67 @@
+import pickle
+import unittest
+import numpy as np
+from buttons import BUTTON_ATTRIBUTES, BUTTON_NAMES, Buttons
+from features import ACTION_BUTTONS, action_to_buttons, buttons_features
+from game_state import GameState
+from player import Player
+from test_protocol import make_state_dict
+
+class TestButtons(unittest.TestCase):
+    def test_attributes_are_mask_bits(self):
+        buttons = Buttons()
+        buttons.Y = True
+        buttons.left = True
+        self.assertEqual(buttons.to_mask(), (1 << BUTTON_ATTRIBUTES.index('Y')) | (1 << BUTTON_ATTRIBUTES.index('left')))
+        buttons.Y = False
+        self.assertFalse(buttons.Y)
+        self.assertTrue(buttons.left)
+
+    def test_dict_round_trip(self):
+        buttons_dict = {name: bit % 3 == 0 for bit, name in enumerate(BUTTON_NAMES)}
+        self.assertEqual(Buttons(buttons_dict).object_to_dict(), buttons_dict)
+        self.assertEqual(Buttons.from_mask(Buttons(buttons_dict).to_mask()).object_to_dict(), buttons_dict)
+
+    def test_notation_aliases_share_the_mask_bits(self):
+        buttons = Buttons()
+        setattr(buttons, '<', True)
+        setattr(buttons, 'y', True)
+        self.assertTrue(buttons.left and buttons.Y)
+        self.assertEqual(buttons.to_mask(), Buttons.from_mask(buttons.to_mask()).to_mask())
+        setattr(buttons, '<', False)
+        self.assertFalse(buttons.left)
+        self.assertTrue(getattr(buttons, 'y'))
+
+    def test_rejects_unknown_attributes(self):
+        with self.assertRaises(AttributeError):
+            Buttons().turbo = True
+
+    def test_features_follow_mask_bits(self):
+        mask = Buttons({name: name in ('Down', 'B') for name in BUTTON_NAMES}).to_mask()
+        features = buttons_features(mask)
+        self.assertEqual(features.tolist(), [float(name in ('Down', 'B')) for name in BUTTON_NAMES])
+        self.assertEqual(buttons_features(np.array([0, mask])).shape, (2, len(BUTTON_NAMES)))
+
+    def test_actions_press_their_buttons(self):
+        for action, pressed in enumerate(ACTION_BUTTONS):
+            buttons = action_to_buttons(action)
+            for attribute in BUTTON_ATTRIBUTES:
+                self.assertEqual(getattr(buttons, attribute), attribute in pressed)
+
+class TestGameState(unittest.TestCase):
+    def test_from_values_matches_dict_constructor(self):
+        state_dict = make_state_dict()
+        p1, p2 = state_dict['p1'], state_dict['p2']
+        game_state = GameState.from_values(
+            Player.from_values(p1['character'], p1['health'], p1['x'], p1['y'], p1['jumping'], p1['crouching'],
+                               p1['in_move'], p1['move'], Buttons(p1['buttons']).to_mask()),
+            Player(p2), state_dict['timer'], state_dict['result'],
+            state_dict['round_started'], state_dict['round_over'])
+        self.assertEqual(game_state.object_to_dict(), GameState(state_dict).object_to_dict())
+
+    def test_pickles(self):
+        game_state = GameState(make_state_dict())
+        self.assertEqual(pickle.loads(pickle.dumps(game_state)).object_to_dict(), game_state.object_to_dict())
+
+if __name__ == '__main__':
+    unittest.main()
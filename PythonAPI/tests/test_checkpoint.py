@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+import torch
+from checkpoint import CheckpointManager, history_dir
+from dqn import DQNAgent
+
+class TestCheckpointManager(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'models', 'dqn_model_p2.pth')
+        self.agent = DQNAgent(17, 12, 2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_keeps_last_versions_with_metadata(self):
+        manager = CheckpointManager(self.path, every_steps=10, every_seconds=0, keep=3)
+        for step in range(1, 6):
+            self.agent.epsilon = 1.0 / step
+            manager.save(self.agent, step * 10)
+            manager.flush()
+        manager.close()
+        versions = manager.versions()
+        self.assertEqual([entry['version'] for entry in versions], [3, 4, 5])
+        self.assertEqual([entry['step'] for entry in versions], [30, 40, 50])
+        self.assertEqual(sorted(os.listdir(history_dir(self.path))),
+                         ['manifest.json', 'v000003.pth', 'v000004.pth', 'v000005.pth'])
+        latest = torch.load(self.path)
+        self.assertEqual((latest['version'], latest['step'], latest['epsilon']), (5, 50, 0.2))
+        self.assertIn('timestamp', latest)
+
+    def test_continues_numbering_of_an_existing_history(self):
+        for _ in range(2):
+            manager = CheckpointManager(self.path, every_seconds=0)
+            manager.save(self.agent, 1)
+            manager.close()
+        self.assertEqual([entry['version'] for entry in manager.versions()], [1, 2])
+
+    def test_schedules_by_step_and_wall_time(self):
+        manager = CheckpointManager(self.path, every_steps=100, every_seconds=0)
+        self.assertFalse(manager.due(99))
+        self.assertTrue(manager.due(100))
+        manager.close()
+        manager = CheckpointManager(self.path, every_steps=0, every_seconds=0.01)
+        manager.last_time -= 1.0
+        self.assertTrue(manager.due(1))
+        manager.save(self.agent, 1)
+        manager.last_time -= 1.0
+        # Wall time alone saves nothing new
+        self.assertFalse(manager.due(1))
+        manager.close()
+
+    def test_manifest_paths_are_relative_to_the_history(self):
+        manager = CheckpointManager(self.path, every_seconds=0, keep=1)
+        for step in (1, 2):
+            manager.save(self.agent, step)
+            manager.flush()
+        manager.close()
+        with open(os.path.join(history_dir(self.path), 'manifest.json')) as manifest_file:
+            manifest = json.load(manifest_file)
+        self.assertEqual(manifest['model'], os.path.join('..', 'dqn_model_p2.pth'))
+        self.assertEqual([entry['path'] for entry in manifest['versions']], ['v000002.pth'])
+        self.assertEqual(sorted(os.listdir(history_dir(self.path))), ['manifest.json', 'v000002.pth'])
+
+    def test_snapshot_is_not_changed_by_later_training(self):
+        snapshot = self.agent.snapshot()
+        before = snapshot['policy_net_state_dict']['fc1.weight'].clone()
+        with torch.no_grad():
+            self.agent.policy_net.fc1.weight.add_(1.0)
+        self.assertTrue(torch.equal(snapshot['policy_net_state_dict']['fc1.weight'], before))
+
+if __name__ == '__main__':
+    unittest.main()
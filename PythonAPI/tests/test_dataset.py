@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from dataset import ShuffleWindow, iter_batches, iter_transitions, pretrain
+from dqn import DQNAgent
+from emulator_stub import SyntheticFrames
+from features import ACTION_SIZE, STATE_SIZE, action_to_buttons, buttons_to_action
+from trajectory import TrajectoryWriter
+
+class TestDataset(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'match.traj')
+        source = SyntheticFrames(seed=4)
+        writer = TrajectoryWriter(self.path, 'npz', chunk_frames=32)
+        self.game_states = []
+        self.actions = []
+        for frame in range(1, 101):
+            game_state = source.next_state()
+            action = frame % ACTION_SIZE
+            writer.append(frame / 60.0, 1, frame, game_state, action_to_buttons(action),
+                          game_state.player2.player_buttons)
+            self.game_states.append(game_state)
+            self.actions.append(action)
+        writer.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_transitions_match_agent_semantics(self):
+        agent = DQNAgent(STATE_SIZE, ACTION_SIZE, 1)
+        chunks = list(iter_transitions(self.path, player_number=1))
+        states, actions, rewards, next_states, dones = (np.concatenate(column) for column in zip(*chunks))
+        # Chunk boundaries lose no transitions
+        self.assertEqual(len(actions), 99)
+        for index in range(99):
+            self.assertTrue(np.array_equal(states[index], agent.get_state(self.game_states[index])[0].numpy()))
+            self.assertTrue(np.array_equal(next_states[index], agent.get_state(self.game_states[index + 1])[0].numpy()))
+            self.assertAlmostEqual(float(rewards[index]),
+                                   agent.get_reward(self.game_states[index], self.game_states[index + 1]), places=4)
+        self.assertEqual(actions.tolist(), self.actions[:99])
+        self.assertFalse(dones.any())
+
+    def test_stacked_observations_cross_chunk_boundaries(self):
+        agent = DQNAgent(3 * STATE_SIZE, ACTION_SIZE, 1, normalize=True)
+        chunks = list(iter_transitions(self.path, player_number=1, frames=3, normalize=True))
+        states, actions, _, next_states, _ = (np.concatenate(column) for column in zip(*chunks))
+        expected = agent.get_states(self.game_states)
+        self.assertEqual(len(actions), 99)
+        np.testing.assert_allclose(states, expected[:-1])
+        np.testing.assert_allclose(next_states, expected[1:])
+
+    def test_maps_button_combinations_to_actions(self):
+        up, right, y = action_to_buttons(0).to_mask(), action_to_buttons(3).to_mask(), action_to_buttons(4).to_mask()
+        self.assertEqual(buttons_to_action(up | y), 10)
+        # Ties go to the lower action index
+        self.assertEqual(buttons_to_action(right | y), 3)
+        self.assertEqual(buttons_to_action(0), -1)
+
+    def test_shuffle_window_keeps_every_transition_once(self):
+        window = ShuffleWindow(size=10, batch_size=4, state_size=1, seed=0)
+        values = np.arange(50, dtype=np.float32)
+        chunk = (values[:, None], values.astype(np.int64), values, values[:, None], np.zeros(50, np.float32))
+        seen = [batch[1] for batch in window.add(chunk)] + [batch[1] for batch in window.drain()]
+        self.assertEqual(sorted(np.concatenate(seen).tolist()), list(range(50)))
+        self.assertNotEqual(np.concatenate(seen).tolist(), list(range(50)))
+
+    def test_pretrains_agent(self):
+        agent = DQNAgent(STATE_SIZE, ACTION_SIZE, 1)
+        agent.batch_size = 16
+        stats = pretrain(agent, lambda: iter_batches([self.path], batch_size=16, shuffle_window=40, seed=0), epochs=2)
+        self.assertGreater(stats['steps'], 0)
+        self.assertEqual(len(agent.memory), 0)
+
+if __name__ == '__main__':
+    unittest.main()
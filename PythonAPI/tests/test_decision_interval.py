@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+from emulator_stub import SyntheticFrames
+from features import game_state_features, game_state_reward, stack_features
+from helpers import WorkingDirectoryTestCase
+
+class TestDecisionInterval(WorkingDirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        frames = SyntheticFrames(bot_player=2, seed=3)
+        self.states = [frames.next_state() for _ in range(12)]
+
+    def play(self, bot, states):
+        decisions = []
+        bot.agent.select_action = lambda state: decisions.append(len(decisions)) or 3
+        buttons = [bot.fight(state, "2") for state in states]
+        return decisions, buttons
+
+    def test_holds_action_and_sums_rewards_of_held_frames(self):
+        bot = self.make_bot(2, decision_interval=4)
+        decisions, buttons = self.play(bot, self.states)
+        self.assertEqual(len(decisions), 3)
+        self.assertTrue(all(held is buttons[0] for held in buttons[1:4]))
+        self.assertEqual(len(bot.agent.memory), 2)
+        expected = sum(game_state_reward(previous, state, 2) for previous, state in zip(self.states[:4], self.states[1:5]))
+        self.assertAlmostEqual(float(bot.agent.memory.rewards[0]), expected, places=4)
+        self.assertEqual(bot.scheduler.env_steps, 2)
+
+    def test_observations_stack_held_frames_like_recordings(self):
+        for backend in ('torch', 'numpy'):
+            with self.subTest(backend=backend):
+                bot = self.make_bot(2, decision_interval=4, frames=3, trainable=(backend == 'torch'), backend=backend)
+                observations = []
+                bot.agent.select_action = lambda state: observations.append(np.array(state.tolist(), dtype=np.float32).reshape(-1)) or 3
+                bot.agent.epsilon = 0.0
+                for state in self.states:
+                    bot.fight(state, "2")
+                features = np.array([game_state_features(state, 2) for state in self.states])
+                expected = stack_features(features, features[:, -1], 3)
+                np.testing.assert_array_equal(np.array(observations), expected[[0, 4, 8]])
+                if backend == 'torch':
+                    # The stored transitions pair the decision frames' stacks, not overwritten ones
+                    np.testing.assert_array_equal(bot.agent.memory.states[:2], expected[[0, 4]])
+                    np.testing.assert_array_equal(bot.agent.memory.next_states[:2], expected[[4, 8]])
+
+    def test_round_end_is_always_a_decision(self):
+        bot = self.make_bot(2, decision_interval=10)
+        self.states[2].is_round_over = True
+        decisions, _ = self.play(bot, self.states[:3])
+        self.assertEqual(len(decisions), 2)
+        self.assertEqual(float(bot.agent.memory.dones[0]), 1.0)
+
+    def test_adaptive_interval_decides_every_frame_up_close(self):
+        bot = self.make_bot(2, decision_interval=6, adaptive_interval=True)
+        for state in self.states:
+            state.player1.x_coord = state.player2.x_coord - 10
+        decisions, _ = self.play(bot, self.states)
+        self.assertEqual(len(decisions), len(self.states))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import socket
+import threading
+import unittest
+from buttons import Buttons
+from command import Command
+from data_recorder import DataRecorder
+from emulator_stub import GROUND_Y, MAX_HEALTH, ROUND_TIMER, EmulatorStub, ReplayFrames, SyntheticFrames
+from helpers import WorkingDirectoryTestCase
+from protocol import Connection
+
+class TestSyntheticFrames(unittest.TestCase):
+    def test_round_ends_and_the_next_one_starts_fresh(self):
+        frames = SyntheticFrames(bot_player=2, seed=7)
+        states = [frames.next_state()]
+        while not states[-1].is_round_over and len(states) < (ROUND_TIMER + 1) * 60:
+            states.append(frames.next_state())
+        last = states[-1]
+        self.assertTrue(last.is_round_over)
+        self.assertTrue(all(state.has_round_started for state in states))
+        self.assertFalse(any(state.is_round_over for state in states[:-1]))
+        self.assertIn(last.fight_result, ('P1', 'P2', 'DRAW'))
+        self.assertTrue(last.player1.health <= 0 or last.player2.health <= 0 or last.timer == 0)
+
+        first = frames.next_state()
+        self.assertFalse(first.is_round_over)
+        self.assertEqual(first.fight_result, 'NOT_OVER')
+        self.assertEqual(first.timer, ROUND_TIMER)
+        self.assertEqual(frames.frame, 1)
+        self.assertEqual(frames.players[2]['health'], MAX_HEALTH)
+
+    def test_applies_the_bot_players_buttons(self):
+        frames = SyntheticFrames(bot_player=2, seed=0)
+        command = Command()
+        command.player2_buttons.right = True
+        command.player_buttons.left = True
+        x = frames.players[2]['x']
+        frames.apply_command(command)
+        self.assertEqual(frames.players[2]['x'], x + 3)
+        command.player2_buttons = Buttons()
+        command.player2_buttons.up = True
+        frames.apply_command(command)
+        self.assertTrue(frames.players[2]['jumping'])
+        self.assertLess(frames.players[2]['y'], GROUND_Y)
+
+class TestReplayFrames(WorkingDirectoryTestCase):
+    def test_replays_a_recording(self):
+        source = SyntheticFrames(bot_player=2, seed=1)
+        recorded = [source.next_state() for _ in range(20)]
+        for format, path in (('csv', 'replay.csv'), ('npz', 'replay.traj')):
+            with self.subTest(format=format):
+                recorder = DataRecorder('replay.csv', format=format)
+                for state in recorded:
+                    recorder.record_frame(state, state.player1.player_buttons, state.player2.player_buttons)
+                recorder.close()
+
+                replay = ReplayFrames(os.path.join('data', path), loop=False)
+                for state in recorded:
+                    self.assertEqual(replay.next_state().object_to_dict(), state.object_to_dict())
+                with self.assertRaises(StopIteration):
+                    replay.next_state()
+
+                looping = ReplayFrames(os.path.join('data', path))
+                for _ in range(len(recorded)):
+                    looping.next_state()
+                self.assertEqual(looping.next_state().object_to_dict(), recorded[0].object_to_dict())
+
+class TestEmulatorStub(unittest.TestCase):
+    def test_round_trip_against_a_connection(self):
+        for codec in ('binary', 'json', 'legacy'):
+            with self.subTest(codec=codec), socket.socket() as server:
+                server.bind(('127.0.0.1', 0))
+                server.listen(1)
+                frames = SyntheticFrames(bot_player=2, seed=3)
+                stub = EmulatorStub(frames, host='127.0.0.1', port=server.getsockname()[1], codec=codec, fps=0)
+                x = frames.players[2]['x']
+                thread = threading.Thread(target=stub.run, args=(5,))
+                thread.start()
+                sock, _ = server.accept()
+                connection = Connection(sock)
+                try:
+                    connection.accept_handshake()
+                    command = Command()
+                    command.player2_buttons.right = True
+                    states = []
+                    for _ in range(5):
+                        states.append(connection.receive_game_state())
+                        connection.send_command(command)
+                finally:
+                    thread.join()
+                    connection.close()
+                self.assertEqual(len(stub.round_trips), 5)
+                self.assertEqual([state.timer for state in states], [ROUND_TIMER] * 5)
+                # Each command moved the bot's player before the next frame was generated
+                self.assertEqual(states[-1].player2.x_coord, x + 3 * 4)
+                self.assertEqual(frames.players[2]['x'], x + 3 * 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+PYTHON_API = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points and tools that never build a neural policy at import
+NON_ML_MODULES = ('controller', 'server', 'emulator_stub', 'vec_env', 'data_recorder', 'trajectory', 'archive',
+                  'dataset', 'protocol', 'bot', 'learner', 'model_registry', 'numpy_policy', 'relabel',
+                  'benchmark', 'profiling')
+
+# Cold import budget per module, generous next to the ~60ms they take without torch
+IMPORT_BUDGET_SECONDS = 0.5
+
+PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start, 'torch': 'torch' in sys.modules,
+                  'logs': os.path.exists('logs'), 'handlers': len(__import__('logging').getLogger().handlers)}}))
+"""
+
+def cold_import(module):
+    """Import `module` in a fresh interpreter inside an empty directory and report what it cost"""
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, PYTHONPATH=PYTHON_API, PYTHONDONTWRITEBYTECODE='1')
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module)], cwd=directory, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+class TestImportTime(unittest.TestCase):
+    def test_non_ml_imports_are_cheap_and_silent(self):
+        for module in NON_ML_MODULES:
+            with self.subTest(module=module):
+                report = cold_import(module)
+                self.assertFalse(report['torch'], f"importing {module} loads torch")
+                self.assertFalse(report['logs'], f"importing {module} creates logs/")
+                self.assertEqual(report['handlers'], 0, f"importing {module} configures logging")
+                self.assertLess(report['seconds'], IMPORT_BUDGET_SECONDS)
+
+if __name__ == '__main__':
+    unittest.main()
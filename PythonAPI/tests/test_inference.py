@@ -0,0 +1,32 @@
+import asyncio
+import unittest
+import torch
+from inference import BatchedInference
+
+class TestBatchedInference(unittest.TestCase):
+    def test_concurrent_requests_share_one_forward_pass(self):
+        inference = BatchedInference(17, 12, max_batch_size=8, max_wait=0.05)
+        states = [torch.rand(1, 17) for _ in range(5)]
+
+        async def scenario():
+            return await asyncio.gather(*(inference.act(state) for state in states))
+
+        actions = asyncio.run(scenario())
+        with torch.no_grad():
+            expected = inference.network(torch.cat(states)).argmax(1).tolist()
+        self.assertEqual(actions, expected)
+        self.assertEqual(inference.batches, 1)
+
+    def test_full_batch_flushes_without_waiting(self):
+        inference = BatchedInference(17, 12, max_batch_size=4, max_wait=10.0)
+
+        async def scenario():
+            return await asyncio.wait_for(
+                asyncio.gather(*(inference.act(torch.rand(1, 17)) for _ in range(8))), timeout=2.0)
+
+        self.assertEqual(len(asyncio.run(scenario())), 8)
+        self.assertEqual(inference.batches, 2)
+        self.assertEqual(inference.mean_batch_size(), 4.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+import torch
+from dqn import DQNAgent
+from learner import Learner
+
+class TestLearner(unittest.TestCase):
+    def setUp(self):
+        self.actor = DQNAgent(17, 12, 1)
+        self.learner = Learner.for_agent(self.actor, publish_every=5, save_every=0)
+
+    def test_starts_from_actor_weights(self):
+        _, weights, epsilon = self.learner.latest()
+        for name, tensor in self.actor.policy_net.state_dict().items():
+            self.assertTrue(torch.equal(weights[name], tensor))
+        self.assertEqual(epsilon, self.actor.epsilon)
+
+    def test_trains_in_background_and_publishes(self):
+        start_version = self.learner.latest()[0]
+        self.learner.start()
+        try:
+            for _ in range(200):
+                self.learner.submit(torch.rand(1, 17), 3, 1.0, torch.rand(1, 17), False)
+            deadline = time.time() + 10
+            while self.learner.steps < 20 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            self.learner.stop()
+        self.assertGreaterEqual(self.learner.steps, 20)
+        self.assertGreater(self.learner.latest()[0], start_version)
+
+    def test_full_queue_drops_transitions(self):
+        learner = Learner.for_agent(self.actor, queue_size=1, save_every=0)
+        self.assertTrue(learner.submit(torch.rand(1, 17), 0, 0.0, torch.rand(1, 17), False))
+        self.assertFalse(learner.submit(torch.rand(1, 17), 0, 0.0, torch.rand(1, 17), False))
+        self.assertEqual(learner.dropped, 1)
+
+    def test_stop_skips_the_checkpoint_of_a_thread_still_running(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dqn_model_p1.pth')
+            learner = Learner.for_agent(self.actor, path)
+            learner.start()
+            with mock.patch.object(Learner, 'is_alive', return_value=True):
+                learner.stop(timeout=0)
+            learner.join()
+            self.assertFalse(os.path.exists(path))
+            learner = Learner.for_agent(self.actor, path)
+            learner.start()
+            learner.stop()
+            self.assertTrue(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
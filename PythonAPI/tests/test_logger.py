@@ -0,0 +1,55 @@
+import logging
+import queue
+import sys
+import unittest
+from logger import FormatLaterQueueHandler, FrameLog
+
+class TestFrameLog(unittest.TestCase):
+    def test_switch_removes_frame_logging(self):
+        frame_log = FrameLog(enabled=False, sampling={}, max_per_second=0)
+        self.assertFalse(any(frame_log.should_log('buttons') for _ in range(100)))
+
+    def test_samples_one_in_n_per_category(self):
+        frame_log = FrameLog(enabled=True, sampling={'buttons': 10}, max_per_second=0)
+        logged = [frame_log.should_log('buttons') for _ in range(100)]
+        self.assertEqual(sum(logged), 10)
+        self.assertTrue(logged[0])
+        # Categories without a sampling rate log every event
+        self.assertTrue(all(frame_log.should_log('other') for _ in range(5)))
+
+    def test_sub_categories_are_sampled_separately(self):
+        frame_log = FrameLog(enabled=True, sampling={'action': 2}, max_per_second=0)
+        logged = [(frame_log.should_log('action.p1'), frame_log.should_log('action.p2')) for _ in range(4)]
+        self.assertEqual(logged, [(True, True), (False, False), (True, True), (False, False)])
+
+    def test_caps_events_per_second(self):
+        frame_log = FrameLog(enabled=True, sampling={}, max_per_second=3)
+        self.assertLessEqual(sum(frame_log.should_log('action') for _ in range(100)), 6)
+
+class TestFormatLaterQueueHandler(unittest.TestCase):
+    def test_queues_records_unformatted(self):
+        log_queue = queue.Queue()
+        handler = FormatLaterQueueHandler(log_queue)
+        handler.emit(logging.LogRecord('bot', logging.INFO, __file__, 1, "Frame %s of %s", (5, 'p2'), None))
+        record = log_queue.get_nowait()
+        self.assertEqual(record.msg, "Frame %s of %s")
+        self.assertEqual(record.args, (5, 'p2'))
+        self.assertEqual(record.getMessage(), "Frame 5 of p2")
+
+    def test_renders_tracebacks_before_queueing(self):
+        log_queue = queue.Queue()
+        handler = FormatLaterQueueHandler(log_queue)
+        try:
+            raise ValueError("bad frame")
+        except ValueError:
+            record = logging.LogRecord('bot', logging.ERROR, __file__, 1, "Failed: %s", ('x',), sys.exc_info())
+        handler.emit(record)
+        queued = log_queue.get_nowait()
+        self.assertIsNone(queued.exc_info)
+        self.assertIn("ValueError: bad frame", queued.exc_text)
+        self.assertEqual(queued.args, ('x',))
+        # The caller's record keeps its exception for any other handler
+        self.assertIsNotNone(record.exc_info)
+
+if __name__ == '__main__':
+    unittest.main()
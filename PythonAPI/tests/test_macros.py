@@ -0,0 +1,57 @@
+import unittest
+from buttons import Buttons
+from emulator_stub import SyntheticFrames
+from helpers import WorkingDirectoryTestCase
+from macros import MACROS, MacroExecutor, compile_macro, mirror_mask
+
+def mask(**pressed):
+    buttons = Buttons()
+    for name, value in pressed.items():
+        setattr(buttons, name, value)
+    return buttons.to_mask()
+
+class TestMacros(unittest.TestCase):
+    def test_compiles_presses_and_releases(self):
+        macro = compile_macro(['v', 'v+>', '!v', '>+Y', '!>+!Y'])
+        self.assertEqual(macro.masks, (mask(down=True), mask(down=True, right=True), mask(right=True),
+                                       mask(right=True, Y=True), 0))
+        self.assertEqual(macro.mirrored[1], mask(down=True, left=True))
+        self.assertEqual(mirror_mask(mask(left=True, B=True)), mask(right=True, B=True))
+
+    def test_special_moves_come_from_config(self):
+        self.assertEqual(set(MACROS), {'fireball', 'dragon_punch', 'spinning_kick'})
+        self.assertEqual(MACROS['fireball'].masks[-2], mask(right=True, Y=True))
+
+    def test_unknown_button(self):
+        with self.assertRaises(ValueError):
+            compile_macro(['v+Q'])
+
+    def test_executor_queues_and_cancels(self):
+        executor = MacroExecutor()
+        self.assertIsNone(executor.next_mask())
+        executor.start(compile_macro(['Y', '!Y']))
+        executor.start(compile_macro(['B']), queue=True)
+        self.assertEqual([executor.next_mask() for _ in range(4)], [mask(Y=True), 0, mask(B=True), None])
+        executor.start('dragon_punch', facing_right=False)
+        self.assertEqual(executor.next_mask(), mask(left=True))
+        executor.cancel()
+        self.assertFalse(executor.active)
+
+class TestBotSpecialMoves(WorkingDirectoryTestCase):
+    def test_chosen_special_move_reaches_the_wire(self):
+        bot = self.make_bot(2, special_moves=True)
+        frames = SyntheticFrames(bot_player=2, seed=0)
+        fireball = MACROS['fireball']
+        sent = [bot.fight(frames.next_state(), "2").to_mask() for _ in range(len(fireball.masks))]
+        # Player 2 starts on the right, far from player 1, so it throws a fireball facing left
+        self.assertEqual(tuple(sent), fireball.mirrored)
+        self.assertEqual(bot.special_move_cooldown, 30)
+
+    def test_run_command_plays_one_frame_per_step(self):
+        bot = self.make_bot(1)
+        bot.run_command([">", "!>", "Y", "!Y"], None)
+        state = SyntheticFrames(bot_player=1, seed=0).next_state()
+        self.assertEqual([bot.fight(state, "1").to_mask() for _ in range(4)], [mask(right=True), 0, mask(Y=True), 0])
+
+if __name__ == '__main__':
+    unittest.main()
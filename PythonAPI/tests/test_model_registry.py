@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+import torch
+from dqn import DQNAgent
+from helpers import WorkingDirectoryTestCase
+from learner import Learner
+from model_registry import ModelRegistry
+
+class TestModelRegistry(WorkingDirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved = DQNAgent(17, 12, 2)
+        self.saved.epsilon = 0.25
+        self.saved.save_model('models/dqn_model_p2.pth')
+
+    def test_loads_each_checkpoint_once(self):
+        models = ModelRegistry()
+        self.assertIs(models.checkpoint('models/dqn_model_p2.pth'), models.checkpoint('models/dqn_model_p2.pth'))
+        self.assertEqual(models.find_checkpoint(1), (None, None))
+
+    def test_acting_bots_share_read_only_weights(self):
+        first, second = self.make_bot(2, trainable=False), self.make_bot(2, trainable=False)
+        self.assertIs(first.agent.policy_net, second.agent.policy_net)
+        self.assertIsNone(first.agent.optimizer)
+        self.assertIsNone(first.agent.target_net)
+        self.assertEqual(first.agent.epsilon, 0.25)
+        for name, tensor in self.saved.policy_net.state_dict().items():
+            self.assertTrue(torch.equal(first.agent.policy_net.state_dict()[name], tensor))
+        with self.assertRaises(RuntimeError):
+            first.agent.train_batch(torch.zeros(1, 17).numpy(), [0], [0.0], torch.zeros(1, 17).numpy(), [0.0])
+
+    def test_training_bots_own_their_state(self):
+        first, second = self.make_bot(2), self.make_bot(2)
+        self.assertIsNot(first.agent.policy_net, second.agent.policy_net)
+        self.assertIsNotNone(first.agent.optimizer)
+        self.assertEqual(first.agent.epsilon, 0.25)
+
+    def test_shared_network_loads_each_published_version_once(self):
+        first, second = self.make_bot(2, trainable=False), self.make_bot(2, trainable=False)
+        learner = Learner.for_agent(first.agent, save_every=0)
+        network = first.agent.policy_net
+        with mock.patch.object(network, 'load_state_dict', wraps=network.load_state_dict) as load:
+            for version in (1, 2):
+                for bot in (first, second):
+                    bot.attach_learner(learner)
+                    bot.sync_weights()
+                    self.assertEqual(bot.weights_version, version)
+                self.assertEqual(load.call_count, version)
+                learner.publish()
+        self.assertNotIn('weights_version', vars(network))
+
+    def test_learner_for_acting_bot_starts_from_saved_model(self):
+        learner = Learner.for_agent(self.make_bot(2, trainable=False).agent, save_every=0)
+        self.assertTrue(learner.agent.trainable)
+        for name, tensor in self.saved.target_net.state_dict().items():
+            self.assertTrue(torch.equal(learner.agent.target_net.state_dict()[name], tensor))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import unittest
+from unittest import mock
+import numpy as np
+import torch
+from config import INFERENCE_CONFIG
+from dqn import DQN, DQNAgent
+from helpers import WorkingDirectoryTestCase
+from model_registry import registry
+from numpy_policy import NumpyAgent, NumpyPolicy, export_checkpoint, load_policy, policy_export_path
+
+class TestNumpyPolicy(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.network = DQN(17, 12)
+        self.policy = NumpyPolicy(self.network.state_dict())
+        self.states = np.random.default_rng(0).normal(0, 50, (32, 17)).astype(np.float32)
+
+    def torch_q_values(self, states):
+        with torch.no_grad():
+            return self.network(torch.from_numpy(states)).numpy()
+
+    def test_matches_torch_output(self):
+        expected = self.torch_q_values(self.states)
+        np.testing.assert_allclose(self.policy.batch_q_values(self.states), expected, rtol=1e-5, atol=1e-4)
+        for state, row in zip(self.states, expected):
+            np.testing.assert_allclose(self.policy.q_values(state), row, rtol=1e-5, atol=1e-4)
+            self.assertEqual(self.policy.act(state), int(row.argmax()))
+
+    def test_reuses_its_buffers(self):
+        first = self.policy.q_values(self.states[0])
+        self.assertIs(self.policy.q_values(self.states[1]), first)
+        self.assertIs(self.policy.batch_q_values(self.states), self.policy.batch_q_values(self.states))
+
+    def test_loads_new_weights_in_place(self):
+        weights = self.policy.weights[0]
+        other = DQN(17, 12)
+        self.policy.load_state_dict(other.state_dict())
+        self.assertIs(self.policy.weights[0], weights)
+        with torch.no_grad():
+            expected = other(torch.from_numpy(self.states)).numpy()
+        np.testing.assert_allclose(self.policy.batch_q_values(self.states), expected, rtol=1e-5, atol=1e-4)
+
+class TestNumpyBackend(WorkingDirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved = DQNAgent(17, 12, 2)
+        self.saved.epsilon = 0.25
+        self.saved.save_model('models/dqn_model_p2.pth')
+
+    def test_bot_acts_through_shared_numpy_policy(self):
+        first = self.make_bot(2, trainable=False, backend='numpy')
+        second = self.make_bot(2, trainable=False, backend='numpy')
+        self.assertIsInstance(first.agent, NumpyAgent)
+        self.assertIs(first.agent.policy_net, second.agent.policy_net)
+        self.assertEqual(first.agent.epsilon, 0.25)
+        first.agent.epsilon = 0.0
+        state = np.random.default_rng(1).normal(0, 50, 17).astype(np.float32)
+        with torch.no_grad():
+            expected = self.saved.policy_net(torch.from_numpy(state).unsqueeze(0)).argmax().item()
+        self.assertEqual(first.agent.select_action(state), expected)
+
+    def test_numpy_backend_cannot_train(self):
+        with self.assertRaises(ValueError):
+            self.make_bot(2, backend='numpy')
+
+    def test_config_backend_only_applies_to_acting_bots(self):
+        with mock.patch.dict(INFERENCE_CONFIG, {'BACKEND': 'numpy'}):
+            trainable = self.make_bot(2)
+            acting = self.make_bot(2, trainable=False)
+        self.assertIsInstance(trainable.agent, DQNAgent)
+        self.assertIsInstance(acting.agent, NumpyAgent)
+
+    def test_export_round_trip(self):
+        path = export_checkpoint('models/dqn_model_p2.pth')
+        self.assertEqual(path, policy_export_path('models/dqn_model_p2.pth'))
+        policy, epsilon = load_policy(path)
+        self.assertEqual(epsilon, 0.25)
+        for name, tensor in self.saved.policy_net.state_dict().items():
+            np.testing.assert_array_equal(policy.state_dict()[name], tensor.numpy())
+        # The registry prefers the export, which needs no torch to read
+        policy, epsilon = registry.numpy_policy(2, 17, 12)
+        self.assertIn(('numpy', os.path.abspath(path)), registry.policies)
+        self.assertEqual(epsilon, 0.25)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+from dqn import DQNAgent
+from emulator_stub import SyntheticFrames
+from features import FEATURE_SCALE, STATE_SIZE, ObservationEncoder, game_state_features
+from helpers import WorkingDirectoryTestCase
+
+def game_states(count, seed=0):
+    frames = SyntheticFrames(bot_player=1, seed=seed)
+    return [frames.next_state() for _ in range(count)]
+
+class TestObservationEncoder(unittest.TestCase):
+    def setUp(self):
+        self.states = game_states(8)
+        self.features = [game_state_features(state, 1) for state in self.states]
+
+    def test_single_frame_matches_features(self):
+        encoder = ObservationEncoder(frames=1)
+        for state, features in zip(self.states, self.features):
+            np.testing.assert_array_equal(encoder.encode(state, 1), features)
+
+    def test_stacks_last_frames_oldest_first(self):
+        encoder = ObservationEncoder(frames=3)
+        first = encoder.encode(self.states[0], 1)
+        # The first frame of a round is repeated until there is history
+        np.testing.assert_array_equal(first, np.tile(self.features[0], 3))
+        for index in range(1, len(self.states)):
+            previous = encoder.encode(self.states[index - 1], 1).copy()
+            view = encoder.encode(self.states[index], 1)
+            self.assertEqual(view.shape, (3 * STATE_SIZE,))
+            self.assertTrue(np.shares_memory(view, encoder.buffer))
+            np.testing.assert_array_equal(view[-STATE_SIZE:], self.features[index])
+            np.testing.assert_array_equal(view[STATE_SIZE:2 * STATE_SIZE], self.features[index - 1])
+
+    def test_previous_view_survives_the_next_encode(self):
+        encoder = ObservationEncoder(frames=2)
+        views = [encoder.encode(state, 1) for state in self.states[:2]]
+        for index in range(2, len(self.states)):
+            expected = views[-1].copy()
+            views.append(encoder.encode(self.states[index], 1))
+            np.testing.assert_array_equal(views[-2], expected)
+
+    def test_round_over_starts_a_fresh_history(self):
+        self.states[3].is_round_over = True
+        encoder = ObservationEncoder(frames=3)
+        for state in self.states[:5]:
+            view = encoder.encode(state, 1)
+        np.testing.assert_array_equal(view, np.tile(game_state_features(self.states[4], 1), 3))
+
+    def test_batch_matches_frame_by_frame(self):
+        self.states[4].is_round_over = True
+        encoder = ObservationEncoder(frames=4, normalize=True)
+        batch = encoder.encode_batch(self.states, 2)
+        sequential = ObservationEncoder(frames=4, normalize=True)
+        expected = np.array([sequential.encode(state, 2).copy() for state in self.states])
+        np.testing.assert_allclose(batch, expected)
+        np.testing.assert_allclose(batch[0, :STATE_SIZE], game_state_features(self.states[0], 2) * FEATURE_SCALE)
+        self.assertLessEqual(batch.max(), 1.0)
+
+class TestStackedAgents(WorkingDirectoryTestCase):
+    def test_get_state_reuses_its_tensors(self):
+        agent = DQNAgent(2 * STATE_SIZE, 12, 1)
+        states = game_states(4)
+        tensors = [agent.get_state(state) for state in states]
+        self.assertIs(tensors[0], tensors[3])
+        self.assertEqual(tuple(tensors[0].shape), (1, 2 * STATE_SIZE))
+        with self.assertRaises(ValueError):
+            DQNAgent(STATE_SIZE + 1, 12, 1)
+
+    def test_bot_learns_from_stacked_observations(self):
+        bot = self.make_bot(1, frames=4)
+        states = game_states(10)
+        for state in states:
+            bot.fight(state, "1")
+        self.assertEqual(bot.agent.memory.states.shape[1], 4 * STATE_SIZE)
+        stacked = bot.agent.get_states(states)
+        np.testing.assert_array_equal(bot.agent.memory.states[len(bot.agent.memory) - 1], stacked[-2])
+        np.testing.assert_array_equal(bot.agent.memory.next_states[len(bot.agent.memory) - 1], stacked[-1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import pstats
+import signal
+import socket
+import tempfile
+import time
+import unittest
+from profiling import ControlServer, RuntimeProfiler, install_signal_handlers
+
+def busy_frame():
+    return sum(index * index for index in range(2000))
+
+def run_until_finished(profiler, frame=busy_frame, limit=5.0):
+    deadline = time.monotonic() + limit
+    profiler.poll()
+    while profiler.active and time.monotonic() < deadline:
+        frame()
+        profiler.poll()
+
+class TestRuntimeProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.profiler = RuntimeProfiler(output_dir=self.tmpdir.name, sample_interval_ms=1.0)
+
+    def tearDown(self):
+        self.profiler.close()
+        self.tmpdir.cleanup()
+
+    def test_cprofile_writes_pstats_of_the_frame_thread(self):
+        self.profiler.request('cprofile', 0.05)
+        self.assertFalse(self.profiler.active)
+        run_until_finished(self.profiler)
+        stats_path, summary_path = self.profiler.last_outputs
+        self.assertTrue(stats_path.endswith('.pstats'))
+        functions = {name for _, _, name in pstats.Stats(stats_path).stats}
+        self.assertIn('busy_frame', functions)
+        with open(summary_path) as summary:
+            self.assertIn('busy_frame', summary.read())
+
+    def test_sample_writes_collapsed_stacks(self):
+        self.profiler.request('sample', 0.1)
+        run_until_finished(self.profiler)
+        with open(self.profiler.last_outputs[0]) as collapsed:
+            lines = collapsed.read().splitlines()
+        self.assertTrue(any('test_profiling.py:busy_frame' in line for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+    def test_memory_diff_shows_growth(self):
+        retained = []
+
+        def leaky_frame():
+            retained.append(bytearray(10000))
+
+        self.profiler.request('memory', 0.05)
+        run_until_finished(self.profiler, leaky_frame)
+        with open(self.profiler.last_outputs[0]) as diff:
+            self.assertIn('test_profiling.py', diff.read())
+
+    def test_stop_ends_a_profile_early(self):
+        self.profiler.request('cprofile', 60)
+        self.profiler.poll()
+        self.profiler.request_stop()
+        self.profiler.poll()
+        self.assertFalse(self.profiler.active)
+        self.assertTrue(all(os.path.exists(path) for path in self.profiler.last_outputs))
+        with self.assertRaises(ValueError):
+            self.profiler.request('perf')
+
+    def test_control_socket_commands(self):
+        server = ControlServer(self.profiler).start()
+        try:
+            with socket.create_connection(('127.0.0.1', server.port)) as client:
+                replies = client.makefile('rb')
+                for command in (b'profile 0.05 sample\n', b'status\n', b'dance\n'):
+                    client.sendall(command)
+                    reply = replies.readline().decode()
+                    self.assertTrue(reply.startswith('error' if command == b'dance\n' else 'ok'), reply)
+        finally:
+            server.close()
+        self.assertEqual(self.profiler.pending, ('sample', 0.05))
+
+    @unittest.skipUnless(hasattr(signal, 'SIGUSR1'), "needs POSIX signals")
+    def test_signal_requests_a_profile(self):
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            self.assertEqual(install_signal_handlers(self.profiler, {'SIGUSR1': 'memory', 'SIGNOPE': 'sample'}),
+                             ['SIGUSR1'])
+            os.kill(os.getpid(), signal.SIGUSR1)
+            self.assertEqual(self.profiler.pending, ('memory', self.profiler.seconds))
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+if __name__ == '__main__':
+    unittest.main()
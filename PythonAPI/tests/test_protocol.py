@@ -0,0 +1,126 @@
+import json
+import socket
+import threading
+import unittest
+from buttons import Buttons
+from command import Command
+from game_state import GameState
+from protocol import (Connection, CODEC_BINARY, CODEC_JSON, CODECS, GAME_STATE_STRUCT,
+                      LegacyJsonStream, ProtocolError, encode_frame)
+
+def make_state_dict():
+    buttons = Buttons().object_to_dict()
+    pressed = dict(buttons, Y=True, Left=True)
+    return {
+        'p1': {'character': 1, 'health': 176, 'x': 100, 'y': 192, 'jumping': False,
+               'crouching': True, 'buttons': pressed, 'in_move': False, 'move': 0},
+        'p2': {'character': 5, 'health': -1, 'x': 300, 'y': 192, 'jumping': True,
+               'crouching': False, 'buttons': buttons, 'in_move': True, 'move': 12},
+        'timer': 99,
+        'result': 'NOT_OVER',
+        'round_started': True,
+        'round_over': False
+    }
+
+class TestCodecs(unittest.TestCase):
+    def test_game_state_round_trip(self):
+        """Both codecs reproduce the game state exactly"""
+        state_dict = make_state_dict()
+        for codec in CODECS.values():
+            decoded = codec.decode_game_state(codec.encode_game_state(GameState(state_dict)))
+            self.assertEqual(decoded.object_to_dict(), state_dict)
+
+    def test_binary_game_state_is_fixed_size(self):
+        payload = CODECS[CODEC_BINARY].encode_game_state(GameState(make_state_dict()))
+        self.assertEqual(len(payload), GAME_STATE_STRUCT.size)
+
+    def test_command_round_trip(self):
+        command = Command()
+        command.player_buttons.right = True
+        command.player2_buttons.B = True
+        command.save_game_path = "save/slot1.State"
+        for codec in CODECS.values():
+            decoded = codec.decode_command(codec.encode_command(command))
+            self.assertEqual(decoded.object_to_dict(), command.object_to_dict())
+
+    def test_binary_rejects_unknown_result(self):
+        state = GameState(dict(make_state_dict(), result='TIME_UP'))
+        with self.assertRaises(ProtocolError):
+            CODECS[CODEC_BINARY].encode_game_state(state)
+
+    def test_binary_rejects_values_out_of_range(self):
+        state = GameState(make_state_dict())
+        state.player1.x_coord = 40000
+        with self.assertRaises(ProtocolError):
+            CODECS[CODEC_BINARY].encode_game_state(state)
+        command = Command()
+        command.save_game_path = "s" * 70000
+        with self.assertRaises(ProtocolError):
+            CODECS[CODEC_BINARY].encode_command(command)
+
+class TestLegacyJsonStream(unittest.TestCase):
+    def test_merged_and_torn_documents(self):
+        """Documents split or merged across reads come out one at a time"""
+        stream = LegacyJsonStream()
+        data = json.dumps({'a': 1}).encode() + json.dumps({'b': "é"}).encode()
+        stream.feed(data[:5])
+        self.assertIsNone(stream.next_object())
+        stream.feed(data[5:-3])
+        self.assertEqual(stream.next_object(), {'a': 1})
+        self.assertIsNone(stream.next_object())
+        stream.feed(data[-3:])
+        self.assertEqual(stream.next_object(), {'b': "é"})
+        self.assertIsNone(stream.next_object())
+
+class TestConnection(unittest.TestCase):
+    def setUp(self):
+        self.controller_sock, self.emulator_sock = socket.socketpair()
+        self.controller = Connection(self.controller_sock)
+        self.emulator = Connection(self.emulator_sock)
+
+    def tearDown(self):
+        self.controller.close()
+        self.emulator.close()
+
+    def handshake(self, requested, allowed=None):
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(codec=self.emulator.request_handshake(requested)))
+        thread.start()
+        accepted = self.controller.accept_handshake(allowed)
+        thread.join()
+        self.assertEqual(result['codec'], accepted)
+        return accepted
+
+    def test_binary_handshake_and_frames(self):
+        self.assertEqual(self.handshake(CODEC_BINARY), CODEC_BINARY)
+        state = GameState(make_state_dict())
+        self.emulator.send_game_state(state)
+        self.assertEqual(self.controller.receive_game_state().object_to_dict(), state.object_to_dict())
+        command = Command()
+        command.player2_buttons.down = True
+        self.controller.send_command(command)
+        self.assertTrue(self.emulator.receive_command().player2_buttons.down)
+
+    def test_handshake_falls_back_to_json(self):
+        self.assertEqual(self.handshake(CODEC_BINARY, allowed=[CODEC_JSON]), CODEC_JSON)
+
+    def test_frames_survive_byte_by_byte_delivery(self):
+        self.handshake(CODEC_BINARY)
+        payload = encode_frame(CODECS[CODEC_BINARY].encode_game_state(GameState(make_state_dict())))
+        for i in range(len(payload)):
+            self.emulator_sock.sendall(payload[i:i + 1])
+        self.assertEqual(self.controller.receive_game_state().timer, 99)
+
+    def test_legacy_peer_without_handshake(self):
+        """A bare JSON peer such as sf2_bot.lua is served unframed"""
+        self.emulator.use_legacy()
+        self.emulator.send_game_state(GameState(make_state_dict()))
+        self.emulator.send_game_state(GameState(dict(make_state_dict(), timer=98)))
+        self.assertIsNone(self.controller.accept_handshake())
+        self.assertEqual(self.controller.receive_game_state().timer, 99)
+        self.assertEqual(self.controller.receive_game_state().timer, 98)
+        self.controller.send_command(Command())
+        self.assertEqual(self.emulator.receive_command().type, "buttons")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from dataset import iter_transitions
+from dqn import DQNAgent, PrioritizedReplayBuffer, ReplayBuffer
+from emulator_stub import SyntheticFrames
+from features import ACTION_SIZE, STATE_SIZE, action_to_buttons
+from helpers import WorkingDirectoryTestCase
+from relabel import export_transitions, relabel_file
+from trajectory import TrajectoryWriter, iter_chunks
+
+def game_states(count, seed=5):
+    frames = SyntheticFrames(bot_player=1, seed=seed)
+    return [frames.next_state() for _ in range(count)]
+
+class TestBatchLabels(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'match.traj')
+        self.states = game_states(80)
+        writer = TrajectoryWriter(self.path, 'npz', chunk_frames=1000)
+        for frame, state in enumerate(self.states, 1):
+            writer.append(frame / 60.0, 1, frame, state, action_to_buttons(frame % ACTION_SIZE),
+                          state.player2.player_buttons)
+        writer.close()
+        self.columns = next(iter_chunks(self.path))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_column_states_and_rewards_match_the_agent(self):
+        agent = DQNAgent(3 * STATE_SIZE, ACTION_SIZE, 2, normalize=True)
+        np.testing.assert_allclose(agent.get_column_states(self.columns), agent.get_states(self.states))
+        rewards = agent.get_column_rewards(self.columns, health_weight=2.0, distance_weight=0.0)
+        for index in (0, 30, 78):
+            health_diff = (self.states[index + 1].player1.health - self.states[index].player1.health) - \
+                          (self.states[index + 1].player2.health - self.states[index].player2.health)
+            self.assertAlmostEqual(float(rewards[index]), 2.0 * health_diff)
+
+    def test_relabels_a_saved_buffer_in_place(self):
+        buffer_path = os.path.join(self.tmpdir.name, 'replay.npz')
+        self.assertEqual(export_transitions([self.path], buffer_path), 79)
+        self.assertEqual(relabel_file(buffer_path, health_weight=1.0, distance_weight=1.0), 79)
+        buffer = ReplayBuffer(100)
+        buffer.load(buffer_path)
+        chunks = list(iter_transitions(self.path, 1, health_weight=1.0, distance_weight=1.0))
+        np.testing.assert_allclose(buffer.rewards[:len(buffer)], np.concatenate([chunk[2] for chunk in chunks]),
+                                   atol=1e-4)
+        np.testing.assert_array_equal(buffer.states[:len(buffer)], np.concatenate([chunk[0] for chunk in chunks]))
+
+    def test_relabel_reads_the_saved_normalization(self):
+        buffer_path = os.path.join(self.tmpdir.name, 'replay.npz')
+        export_transitions([self.path], buffer_path, normalize=True)
+        relabel_file(buffer_path, health_weight=1.0, distance_weight=1.0)
+        with np.load(buffer_path) as saved:
+            self.assertTrue(saved['normalized'])
+            rewards = saved['rewards']
+        chunks = list(iter_transitions(self.path, 1, health_weight=1.0, distance_weight=1.0))
+        np.testing.assert_allclose(rewards, np.concatenate([chunk[2] for chunk in chunks]), atol=1e-4)
+
+    def test_relabel_resets_priorities(self):
+        buffer = PrioritizedReplayBuffer(8, state_size=STATE_SIZE)
+        states = np.zeros((6, STATE_SIZE), np.float32)
+        buffer.extend(states, np.zeros(6, np.int64), np.ones(6), states, np.zeros(6, np.float32))
+        buffer.max_priority = 4.0
+        buffer.tree.update_batch(np.arange(6), np.full(6, 0.01))
+        buffer.relabel()
+        np.testing.assert_allclose(buffer.tree.get(np.arange(6)), 4.0 ** buffer.alpha)
+        self.assertAlmostEqual(buffer.tree.total(), 6 * 4.0 ** buffer.alpha)
+
+    def test_save_and_extend_keep_push_order(self):
+        buffer = PrioritizedReplayBuffer(8, state_size=2)
+        values = np.arange(12, dtype=np.float32)
+        buffer.extend(values[:, None].repeat(2, 1), values.astype(np.int64), values, values[:, None].repeat(2, 1),
+                      np.zeros(12, np.float32))
+        self.assertEqual(len(buffer), 8)
+        self.assertAlmostEqual(buffer.tree.total(), 8 * buffer.max_priority ** buffer.alpha)
+        path = os.path.join(self.tmpdir.name, 'replay.npz')
+        buffer.save(path)
+        restored = ReplayBuffer(8)
+        restored.load(path)
+        self.assertEqual(restored.actions.tolist(), list(range(4, 12)))
+
+class TestReplayRelabel(WorkingDirectoryTestCase):
+    def test_relabel_reproduces_rewards_of_held_actions(self):
+        bot = self.make_bot(1, decision_interval=3, frames=2)
+        for state in game_states(60):
+            bot.fight(state, "1")
+        memory = bot.agent.memory
+        stored = memory.rewards[:len(memory)].copy()
+        memory.relabel()
+        np.testing.assert_allclose(memory.rewards[:len(memory)], stored, atol=1e-3)
+        memory.relabel(health_weight=0.0, distance_weight=0.0)
+        self.assertFalse(memory.rewards[:len(memory)].any())
+
+    def test_relabels_normalized_observations(self):
+        agent = DQNAgent(STATE_SIZE, ACTION_SIZE, 1, normalize=True)
+        states = game_states(30)
+        for state, next_state in zip(states, states[1:]):
+            agent.memory.push(agent.get_state(state), 0, 0.0, agent.get_state(next_state), False)
+        agent.memory.relabel(normalize=True)
+        expected = [agent.get_reward(state, next_state) for state, next_state in zip(states, states[1:])]
+        np.testing.assert_allclose(agent.memory.rewards[:29], expected, atol=1e-3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import numpy as np
+import torch
+from dqn import DQNAgent, PrioritizedReplayBuffer, ReplayBuffer, SumTree
+
+class TestReplayBuffer(unittest.TestCase):
+    def test_push_wraps_around_capacity(self):
+        buffer = ReplayBuffer(4, state_size=3)
+        for i in range(6):
+            buffer.push(np.full(3, i), i, float(i), np.full(3, i + 1), i == 5)
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(sorted(buffer.actions.tolist()), [2, 3, 4, 5])
+        self.assertEqual(buffer.dones.sum(), 1.0)
+
+    def test_sample_returns_consistent_batch_arrays(self):
+        buffer = ReplayBuffer(100)
+        for i in range(50):
+            buffer.push(torch.full((1, 17), float(i)), i % 12, float(i), torch.full((1, 17), i + 1.0), False)
+        states, actions, rewards, next_states, dones = buffer.sample(32)
+        self.assertEqual(states.shape, (32, 17))
+        self.assertEqual(next_states.shape, (32, 17))
+        self.assertEqual(actions.dtype, np.int64)
+        np.testing.assert_array_equal(states[:, 0], rewards)
+        np.testing.assert_array_equal(next_states[:, 0], rewards + 1)
+        np.testing.assert_array_equal(actions, rewards.astype(np.int64) % 12)
+
+    def test_sample_reuses_its_batch_arrays(self):
+        buffer = ReplayBuffer(100, state_size=17)
+        for i in range(50):
+            buffer.push(np.full(17, i), i % 12, float(i), np.full(17, i + 1), False)
+        first = buffer.sample(32)
+        kept = [array.copy() for array in first]
+        second = buffer.sample(32)
+        # Same-sized samples write into the same arrays, so earlier batches change under their holder
+        for before, after in zip(first, second):
+            self.assertIs(before, after)
+        np.testing.assert_array_equal(first[2], second[2])
+        self.assertFalse(all(np.array_equal(array, copy) for array, copy in zip(first, kept)))
+        # Another batch size gets arrays of its own
+        self.assertIsNot(buffer.sample(16)[0], second[0])
+
+    def test_agent_trains_from_buffer(self):
+        agent = DQNAgent(17, 12, 1)
+        for i in range(agent.batch_size):
+            agent.memory.push(torch.rand(1, 17), i % 12, 1.0, torch.rand(1, 17), False)
+        self.assertIsInstance(agent.train(), float)
+
+class TestPrioritizedReplay(unittest.TestCase):
+    def test_sum_tree_totals_and_find(self):
+        tree = SumTree(5)
+        tree.update_batch([0, 1, 2, 3, 4], [1.0, 2.0, 3.0, 4.0, 0.0])
+        self.assertEqual(tree.total(), 10.0)
+        self.assertEqual(tree.find([0.5, 1.5, 3.5, 9.9]).tolist(), [0, 1, 2, 3])
+        tree.update(4, 10.0)
+        self.assertEqual(tree.total(), 20.0)
+        self.assertEqual(tree.find([15.0]).tolist(), [4])
+
+    def test_sampling_follows_priorities(self):
+        np.random.seed(0)
+        buffer = PrioritizedReplayBuffer(8, state_size=2, alpha=1.0, beta=1.0, epsilon=0.0)
+        for i in range(8):
+            buffer.push(np.zeros(2), i, 0.0, np.zeros(2), False)
+        priorities = np.full(8, 0.01)
+        priorities[5] = 100.0
+        buffer.update_priorities(np.arange(8), priorities)
+        _, actions, _, _, _, weights, indices = buffer.sample(64)
+        self.assertGreater(np.mean(indices == 5), 0.9)
+        np.testing.assert_array_equal(actions, indices)
+        # The over-sampled transition gets the smallest importance weight
+        self.assertAlmostEqual(weights.max(), 1.0)
+        self.assertTrue(np.all(weights[indices == 5] <= weights.min() + 1e-6))
+
+    def test_prioritized_agent_updates_priorities(self):
+        agent = DQNAgent(17, 12, 1, prioritized=True)
+        for i in range(agent.batch_size):
+            agent.memory.push(torch.rand(1, 17), i % 12, float(i), torch.rand(1, 17), False)
+        before = agent.memory.tree.total()
+        self.assertIsInstance(agent.train(), float)
+        self.assertNotEqual(agent.memory.tree.total(), before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+import torch
+from dqn import DQNAgent
+from scheduler import TrainingScheduler
+
+def filled_agent(transitions=100):
+    agent = DQNAgent(17, 12, 1)
+    agent.batch_size = 8
+    states = np.random.default_rng(0).normal(0, 1, (transitions + 1, 17)).astype(np.float32)
+    for index in range(transitions):
+        agent.memory.push(states[index], index % 12, 1.0, states[index + 1], False)
+    return agent
+
+def run(scheduler, transitions):
+    for _ in range(transitions):
+        scheduler.observe()
+        scheduler.train()
+
+class TestTrainingScheduler(unittest.TestCase):
+    def test_train_every_and_gradient_steps(self):
+        scheduler = TrainingScheduler(filled_agent(), train_every=4, gradient_steps=2)
+        run(scheduler, 3)
+        self.assertEqual(scheduler.updates, 0)
+        run(scheduler, 5)
+        self.assertEqual(scheduler.updates, 4)
+        self.assertEqual(scheduler.env_steps, 8)
+
+    def test_replay_ratio(self):
+        scheduler = TrainingScheduler(filled_agent(), replay_ratio=0.25)
+        run(scheduler, 20)
+        self.assertEqual(scheduler.updates, 5)
+
+    def test_no_budget_piles_up_before_the_buffer_fills(self):
+        scheduler = TrainingScheduler(filled_agent(transitions=4))
+        run(scheduler, 50)
+        self.assertEqual((scheduler.updates, scheduler.budget), (0, 0.0))
+
+    def test_hard_target_update_by_gradient_step(self):
+        agent = filled_agent()
+        scheduler = TrainingScheduler(agent, target_update_every=3)
+        run(scheduler, 2)
+        self.assertFalse(torch.equal(agent.target_net.fc1.weight, agent.policy_net.fc1.weight))
+        run(scheduler, 1)
+        self.assertTrue(torch.equal(agent.target_net.fc1.weight, agent.policy_net.fc1.weight))
+
+    def test_soft_target_update(self):
+        agent = filled_agent()
+        scheduler = TrainingScheduler(agent, target_update='soft', tau=0.1)
+        before = agent.target_net.fc1.weight.detach().clone()
+        run(scheduler, 1)
+        expected = before + 0.1 * (agent.policy_net.fc1.weight.detach() - before)
+        self.assertTrue(torch.allclose(agent.target_net.fc1.weight, expected, atol=1e-6))
+
+    def test_epsilon_schedules(self):
+        agent = filled_agent()
+        scheduler = TrainingScheduler(agent, epsilon_schedule='linear', epsilon_steps=10)
+        run(scheduler, 5)
+        self.assertAlmostEqual(agent.epsilon, 1.0 - 0.5 * (1.0 - agent.epsilon_min))
+        run(scheduler, 10)
+        self.assertAlmostEqual(agent.epsilon, agent.epsilon_min)
+        agent = filled_agent()
+        scheduler = TrainingScheduler(agent, epsilon_schedule='exponential')
+        run(scheduler, 3)
+        self.assertAlmostEqual(agent.epsilon, agent.epsilon_decay ** 3)
+
+    def test_backs_off_while_frames_are_late(self):
+        scheduler = TrainingScheduler(filled_agent(), adaptive=True, frame_budget_ms=10, min_intensity=0.2)
+        for _ in range(200):
+            scheduler.frame_done(0.05)
+        self.assertEqual(scheduler.intensity, 0.2)
+        run(scheduler, 10)
+        self.assertEqual(scheduler.updates, 2)
+        for _ in range(500):
+            scheduler.frame_done(0.001)
+        self.assertEqual(scheduler.intensity, 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
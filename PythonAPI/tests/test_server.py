@@ -0,0 +1,77 @@
+import asyncio
+import pstats
+import socket
+import unittest
+from game_state import GameState
+from helpers import WorkingDirectoryTestCase
+from profiling import RuntimeProfiler
+from protocol import Connection, CODEC_BINARY
+from server import ControllerServer
+from test_protocol import make_state_dict
+
+class TestControllerServer(WorkingDirectoryTestCase):
+    def run_sessions(self, emulators=3, frames=5, greedy=False, **server_options):
+        stats = {}
+
+        async def scenario():
+            server = ControllerServer([0], player_number=2, record=False, **server_options)
+            if greedy:
+                # Fresh bots explore with epsilon 1.0; make the shared learner greedy instead
+                create_session = server.create_session
+
+                def greedy_session(session_id):
+                    session = create_session(session_id)
+                    server.learner.agent.epsilon = server.learner.epsilon = 0.0
+                    return session
+
+                server.create_session = greedy_session
+            await server.start()
+            port = server.servers[0].sockets[0].getsockname()[1]
+
+            def emulator():
+                connection = Connection(socket.create_connection(('127.0.0.1', port)))
+                connection.request_handshake(CODEC_BINARY)
+                commands = []
+                for _ in range(frames):
+                    connection.send_game_state(GameState(make_state_dict()))
+                    commands.append(connection.receive_command())
+                connection.close()
+                return commands
+
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*(loop.run_in_executor(None, emulator) for _ in range(emulators)))
+            if server.inference is not None:
+                stats['requests'] = server.inference.requests
+            await server.close()
+            return results
+
+        return asyncio.run(scenario()), stats
+
+    def test_concurrent_sessions(self):
+        """Several emulators are served by one event loop, each with its own session"""
+        results, _ = self.run_sessions()
+        self.assertEqual([len(commands) for commands in results], [5, 5, 5])
+        for commands in results:
+            # The bot plays player 2, so player 1's slot stays released
+            self.assertTrue(all(command.player_buttons.to_mask() == 0 for command in commands))
+
+    def test_batched_inference_sessions(self):
+        results, stats = self.run_sessions(greedy=True, batch_inference=True)
+        self.assertEqual([len(commands) for commands in results], [5, 5, 5])
+        self.assertEqual(stats['requests'], 15)
+        for commands in results:
+            self.assertTrue(all(command.player2_buttons.to_mask() != 0 for command in commands))
+
+    def test_profiles_the_event_loop(self):
+        profiler = RuntimeProfiler(output_dir='profiles')
+        # Long enough to still run when the server closes, which finishes it
+        profiler.request('cprofile', 60.0)
+        results, _ = self.run_sessions(emulators=2, profiler=profiler, profile_poll_ms=1.0)
+        self.assertEqual([len(commands) for commands in results], [5, 5])
+        self.assertFalse(profiler.active)
+        functions = {name for _, _, name in pstats.Stats(profiler.last_outputs[0]).stats}
+        self.assertIn('handle_connection', functions)
+        self.assertIn('step', functions)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from timing import NULL_TIMER, RollingSamples, StageTimer, make_timer, percentile
+
+class TestTiming(unittest.TestCase):
+    def test_rolling_window_keeps_latest_samples(self):
+        samples = RollingSamples(4)
+        for value in range(10):
+            samples.add(float(value))
+        self.assertEqual(samples.sorted(), [6.0, 7.0, 8.0, 9.0])
+
+    def test_percentiles(self):
+        values = [float(v) for v in range(1, 101)]
+        self.assertEqual(percentile(values, 0.50), 51.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_stage_timer_summary(self):
+        timer = StageTimer("test", window=16, report_every=0)
+        start = timer.start()
+        start = timer.lap('recv', start)
+        timer.lap('send', start)
+        timer.frame_done(start)
+        self.assertEqual(list(timer.summary()), ['recv', 'send', 'frame'])
+        self.assertEqual(timer.frames, 1)
+        self.assertIn('[test] 1 frames', timer.report())
+
+    def test_prefixed_stages_share_one_report(self):
+        timer = StageTimer("test", window=16, report_every=0)
+        for prefix in ('p2', 'p1'):
+            bot_timer = timer.prefixed(prefix)
+            bot_timer.lap('train', bot_timer.lap('get_state', bot_timer.start()))
+        timer.lap('recv', timer.start())
+        self.assertEqual(list(timer.summary()), ['recv', 'p1.get_state', 'p2.get_state', 'p1.train', 'p2.train'])
+        self.assertIs(NULL_TIMER.prefixed('p1'), NULL_TIMER)
+
+    def test_disabled_timer_is_shared_noop(self):
+        timer = make_timer("off", enabled=False)
+        self.assertIs(timer, NULL_TIMER)
+        self.assertEqual(timer.lap('recv', timer.start()), 0.0)
+        self.assertEqual(timer.summary(), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import csv
+import os
+import unittest
+from buttons import Buttons
+from data_recorder import DataRecorder
+from emulator_stub import SyntheticFrames
+from helpers import WorkingDirectoryTestCase
+from trajectory import CSV_COLUMNS, TrajectoryWriter, chunk_paths, iter_chunks, to_csv
+
+class TestTrajectory(WorkingDirectoryTestCase):
+    def frames(self, count):
+        source = SyntheticFrames(seed=3)
+        for index in range(count):
+            game_state = source.next_state()
+            yield game_state, game_state.player1.player_buttons, Buttons.from_mask(index % 4096)
+
+    def test_writes_bounded_chunks(self):
+        writer = TrajectoryWriter('match.traj', 'npz', chunk_frames=64)
+        for frame, (game_state, p1_buttons, p2_buttons) in enumerate(self.frames(200), 1):
+            writer.append(frame / 60.0, 1, frame, game_state, p1_buttons, p2_buttons)
+            self.assertLess(writer.size, 64)
+        writer.close()
+        self.assertEqual(len(chunk_paths('match.traj')), 4)
+        frames = [frame for columns in iter_chunks('match.traj') for frame in columns['frame'].tolist()]
+        self.assertEqual(frames, list(range(1, 201)))
+
+    def test_recorder_defaults_to_npz_chunks(self):
+        recorder = DataRecorder('default.csv')
+        for game_state, p1_buttons, p2_buttons in self.frames(10):
+            recorder.record_frame(game_state, p1_buttons, p2_buttons)
+        recorder.close()
+        self.assertFalse(os.path.exists(os.path.join('data', 'default.csv')))
+        chunks = list(iter_chunks(os.path.join('data', 'default.traj')))
+        self.assertEqual(chunks[0]['frame'].tolist(), list(range(1, 11)))
+
+    def test_csv_rows_are_flushed_per_chunk(self):
+        recorder = DataRecorder('chunked.csv', format='csv')
+        flushes = []
+        recorder.flush_csv = flushes.append
+        for game_state, p1_buttons, p2_buttons in self.frames(10):
+            recorder.record_frame(game_state, p1_buttons, p2_buttons)
+        self.assertEqual(flushes, [])
+        del recorder.flush_csv
+        recorder.close()
+        chunks = list(iter_chunks(os.path.join('data', 'chunked.csv')))
+        self.assertEqual(chunks[0]['frame'].tolist(), list(range(1, 11)))
+
+    def test_logs_states_under_log_names(self):
+        recorder = DataRecorder('logged.csv')
+        game_state = next(self.frames(1))[0]
+        with self.assertLogs(level='INFO') as logs:
+            recorder.log_game_state(game_state)
+            recorder.log_button_state(1, "Up", True)
+        self.assertIn("Game State Update", logs.output[0])
+        self.assertEqual(DataRecorder.print_game_state, DataRecorder.log_game_state)
+        self.assertEqual(DataRecorder.print_button_state, DataRecorder.log_button_state)
+        recorder.close()
+
+    def test_chunks_are_written_off_the_frame_thread(self):
+        writer = TrajectoryWriter('match.traj', 'npz', chunk_frames=16)
+        for frame, (game_state, p1_buttons, p2_buttons) in enumerate(self.frames(40), 1):
+            writer.append(frame / 60.0, 1, frame, game_state, p1_buttons, p2_buttons)
+        self.assertEqual(writer.frames_written, 32)
+        self.assertTrue(writer.thread.is_alive())
+        writer.close()
+        writer.close()
+        self.assertEqual(len(chunk_paths('match.traj')), 3)
+        self.assertFalse(any(name.endswith('.tmp') for name in os.listdir('match.traj')))
+
+    def test_converts_back_to_recorder_csv(self):
+        recorders = [DataRecorder('legacy.csv', format='csv'), DataRecorder('chunked.csv', format='npz')]
+        for game_state, p1_buttons, p2_buttons in self.frames(300):
+            for recorder in recorders:
+                recorder.record_frame(game_state, p1_buttons, p2_buttons)
+        for recorder in recorders:
+            recorder.close()
+        self.assertEqual(to_csv(os.path.join('data', 'chunked.traj'), 'converted.csv'), 300)
+
+        with open(os.path.join('data', 'legacy.csv'), newline='') as legacy, open('converted.csv', newline='') as converted:
+            legacy_rows = list(csv.reader(legacy))
+            converted_rows = list(csv.reader(converted))
+        self.assertEqual(converted_rows[0], CSV_COLUMNS)
+        self.assertEqual(len(converted_rows), len(legacy_rows))
+        # Everything but the wall-clock timestamp matches the legacy CSV
+        for legacy_row, converted_row in zip(legacy_rows[1:], converted_rows[1:]):
+            self.assertEqual(legacy_row[1:], converted_row[1:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import socket
+import threading
+import unittest
+import numpy as np
+from dqn import DQNAgent
+from emulator_stub import EmulatorStub, SyntheticFrames
+from features import ACTION_SIZE, STATE_SIZE
+from vec_env import EmulatorEnv, SubprocVecEnv, train_agent
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class TestEmulatorEnv(unittest.TestCase):
+    def test_stub_round_ends_and_rewards_are_finite(self):
+        env = EmulatorEnv(stub=True, seed=1)
+        observation = env.reset()
+        self.assertEqual(observation.shape, (STATE_SIZE,))
+        done, steps = False, 0
+        while not done and steps < 10000:
+            observation, reward, done, _ = env.step(steps % ACTION_SIZE)
+            self.assertTrue(np.isfinite(reward))
+            steps += 1
+        self.assertTrue(done)
+
+    def test_observations_stack_like_the_bots(self):
+        env = EmulatorEnv(stub=True, seed=3, frames=3, normalize=True)
+        agent = DQNAgent(3 * STATE_SIZE, ACTION_SIZE, 2, normalize=True)
+        observations = [env.reset()]
+        game_states = [env.game_state]
+        for step in range(5):
+            observations.append(env.step(step)[0])
+            game_states.append(env.game_state)
+        np.testing.assert_allclose(np.array(observations), agent.get_states(game_states))
+
+    def test_steps_a_connected_emulator(self):
+        port = free_port()
+        stub = EmulatorStub(SyntheticFrames(seed=2), port=port, fps=0)
+        thread = threading.Thread(target=stub.run, args=(6,))
+        thread.start()
+        env = EmulatorEnv(port=port, host='127.0.0.1')
+        try:
+            env.reset()
+            for _ in range(5):
+                observation, _, _, _ = env.step(3)
+        finally:
+            env.close()
+            thread.join()
+        self.assertEqual(observation.shape, (STATE_SIZE,))
+        self.assertEqual(len(stub.round_trips), 5)
+
+class TestSubprocVecEnv(unittest.TestCase):
+    def setUp(self):
+        self.vec_env = SubprocVecEnv([{'stub': True, 'seed': seed} for seed in range(2)])
+
+    def tearDown(self):
+        self.vec_env.close()
+
+    def test_batched_reset_and_step(self):
+        observations = self.vec_env.reset()
+        self.assertEqual(observations.shape, (2, STATE_SIZE))
+        observations, rewards, dones, infos = self.vec_env.step([3, 2])
+        self.assertEqual(observations.shape, (2, STATE_SIZE))
+        self.assertEqual(rewards.shape, (2,))
+        self.assertEqual(dones.dtype, bool)
+        self.assertEqual(len(infos), 2)
+
+    def test_trains_agent(self):
+        agent = DQNAgent(STATE_SIZE, ACTION_SIZE, 2)
+        stats = train_agent(agent, self.vec_env, steps=40, target_update_every=20)
+        self.assertEqual(stats['transitions'], 80)
+        self.assertEqual(len(agent.memory), 80)
+        self.assertGreater(stats['train_steps'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
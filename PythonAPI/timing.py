@@ -0,0 +1,146 @@
+import time
+from array import array
+from config import TIMING_CONFIG
+from logger import logger
+
+# Stages of one frame, in the order they happen
+FRAME_STAGES = (
+    'recv', 'decode', 'build', 'get_state', 'select_action', 'buttons', 'replay_push',
+    'train', 'record_frame', 'encode', 'send', 'frame'
+)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class RollingSamples:
+    """Fixed-size ring of the most recent samples of one stage"""
+
+    def __init__(self, window):
+        self.samples = array('d', bytes(8 * window))
+        self.window = window
+        self.index = 0
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % self.window
+        if self.count < self.window:
+            self.count += 1
+
+    def sorted(self):
+        return sorted(self.samples[:self.count])
+
+class StageTimer:
+    """Per-stage frame latency for one session with rolling p50/p95/p99"""
+
+    enabled = True
+
+    def __init__(self, name, window=TIMING_CONFIG['WINDOW'], report_every=TIMING_CONFIG['REPORT_EVERY'],
+                 frame_budget_ms=TIMING_CONFIG['FRAME_BUDGET_MS']):
+        self.name = name
+        self.window = window
+        self.report_every = report_every
+        self.frame_budget = frame_budget_ms / 1000.0
+        self.stages = {}
+        self.frames = 0
+        self.missed_frames = 0
+
+    def start(self):
+        """Return a timestamp to time the next stage from"""
+        return time.perf_counter()
+
+    def lap(self, stage, start):
+        """Record the time since `start` under `stage` and return the new timestamp"""
+        now = time.perf_counter()
+        samples = self.stages.get(stage)
+        if samples is None:
+            samples = self.stages[stage] = RollingSamples(self.window)
+        samples.add(now - start)
+        return now
+
+    def frame_done(self, frame_start):
+        """Close a frame started at `frame_start` and report every `report_every` frames"""
+        now = self.lap('frame', frame_start)
+        if now - frame_start > self.frame_budget:
+            self.missed_frames += 1
+        self.frames += 1
+        if self.report_every and self.frames % self.report_every == 0:
+            logger.info(self.report())
+        return now
+
+    def summary(self):
+        """Return {stage: (p50, p95, p99, max)} in milliseconds"""
+        result = {}
+        for stage in sorted(self.stages, key=self._stage_order):
+            ordered = self.stages[stage].sorted()
+            result[stage] = tuple(value * 1000 for value in (
+                percentile(ordered, 0.50), percentile(ordered, 0.95), percentile(ordered, 0.99), ordered[-1]))
+        return result
+
+    def report(self):
+        lines = [f"[{self.name}] {self.frames} frames, {self.missed_frames} over the "
+                 f"{self.frame_budget * 1000:.1f} ms budget (ms p50/p95/p99/max)"]
+        for stage, (p50, p95, p99, worst) in self.summary().items():
+            lines.append(f"  {stage:<18}{p50:8.3f}{p95:8.3f}{p99:8.3f}{worst:9.3f}")
+        return "\n".join(lines)
+
+    def prefixed(self, prefix):
+        """A view of this timer recording its stages as '<prefix>.<stage>'"""
+        return PrefixedTimer(self, prefix)
+
+    def _stage_order(self, stage):
+        # Prefixed stages sort with their stage, then by prefix
+        prefix, _, name = stage.rpartition('.')
+        return (FRAME_STAGES.index(name) if name in FRAME_STAGES else len(FRAME_STAGES)), prefix
+
+class PrefixedTimer:
+    """Records into another StageTimer under prefixed stage names, so several bots can share one report"""
+
+    enabled = True
+
+    def __init__(self, timer, prefix):
+        self.timer = timer
+        self.prefix = prefix
+        self.names = {}
+
+    def start(self):
+        return self.timer.start()
+
+    def lap(self, stage, start):
+        name = self.names.get(stage)
+        if name is None:
+            name = self.names[stage] = f"{self.prefix}.{stage}"
+        return self.timer.lap(name, start)
+
+class NullTimer:
+    """Stand-in used when timing is off, every call is a no-op"""
+
+    enabled = False
+
+    def start(self):
+        return 0.0
+
+    def lap(self, stage, start):
+        return 0.0
+
+    def frame_done(self, frame_start):
+        return 0.0
+
+    def summary(self):
+        return {}
+
+    def report(self):
+        return ""
+
+    def prefixed(self, prefix):
+        return self
+
+NULL_TIMER = NullTimer()
+
+def make_timer(name, enabled=TIMING_CONFIG['ENABLED']):
+    """Return a StageTimer when timing is enabled, otherwise the shared NullTimer"""
+    return StageTimer(name) if enabled else NULL_TIMER
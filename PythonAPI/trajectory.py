@@ -0,0 +1,286 @@
+import argparse
+import csv
+import glob
+import os
+import queue
+import threading
+import time
+import numpy as np
+from buttons import BUTTON_ATTRIBUTES
+from config import RECORDING_CONFIG
+from logger import logger, setup_logger
+from protocol import FIGHT_RESULTS
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+# Column list of the CSV written by DataRecorder
+CSV_COLUMNS = [
+    'timestamp', 'round', 'frame',
+    # Player 1 state
+    'p1_character', 'p1_health', 'p1_x', 'p1_y',
+    'p1_jumping', 'p1_crouching', 'p1_in_move', 'p1_move_id',
+    # Player 2 state
+    'p2_character', 'p2_health', 'p2_x', 'p2_y',
+    'p2_jumping', 'p2_crouching', 'p2_in_move', 'p2_move_id',
+    # Game state
+    'timer', 'has_round_started', 'is_round_over', 'fight_result',
+    # Player 1 buttons
+    'p1_up', 'p1_down', 'p1_left', 'p1_right',
+    'p1_Y', 'p1_B', 'p1_A', 'p1_X', 'p1_L', 'p1_R',
+    # Player 2 buttons
+    'p2_up', 'p2_down', 'p2_left', 'p2_right',
+    'p2_Y', 'p2_B', 'p2_A', 'p2_X', 'p2_L', 'p2_R'
+]
+
+# Buttons recorded in the CSV, as Buttons attribute names
+CSV_BUTTONS = ('up', 'down', 'left', 'right', 'Y', 'B', 'A', 'X', 'L', 'R')
+
+# Typed columns of a trajectory chunk. Buttons are kept as 12-bit masks and the
+# fight result as an index into the chunk's result names.
+FRAME_DTYPE = np.dtype([
+    ('timestamp', 'f8'), ('round', 'u4'), ('frame', 'u4'),
+    ('p1_character', 'u2'), ('p1_health', 'i2'), ('p1_x', 'i2'), ('p1_y', 'i2'),
+    ('p1_jumping', '?'), ('p1_crouching', '?'), ('p1_in_move', '?'), ('p1_move_id', 'u2'),
+    ('p2_character', 'u2'), ('p2_health', 'i2'), ('p2_x', 'i2'), ('p2_y', 'i2'),
+    ('p2_jumping', '?'), ('p2_crouching', '?'), ('p2_in_move', '?'), ('p2_move_id', 'u2'),
+    ('timer', 'u2'), ('has_round_started', '?'), ('is_round_over', '?'), ('fight_result', 'u1'),
+    ('p1_buttons', 'u2'), ('p2_buttons', 'u2')
+])
+
+TRAJECTORY_FORMATS = ('npz', 'parquet')
+
+def trajectory_path(filename, format):
+    """Where the trajectory for a DataRecorder file name is written"""
+    base = os.path.splitext(filename)[0]
+    return base + ('.traj' if format == 'npz' else '.parquet')
+
+def fsync_directory(path):
+    """fsync a directory, so the files just renamed into it survive a crash
+
+    A no-op where directories cannot be opened or synced (Windows).
+    """
+    try:
+        descriptor = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+class TrajectoryWriter:
+    """Buffers frames in typed columns and writes them to disk one chunk at a time
+
+    Chunks are compressed and written by a background thread, so the frame thread
+    only hands a full buffer over and carries on with a fresh one. At most
+    `max_pending` chunks wait for the thread before `append` blocks.
+    """
+
+    def __init__(self, path, format='npz', chunk_frames=RECORDING_CONFIG['CHUNK_FRAMES'],
+                 fsync_seconds=RECORDING_CONFIG['FSYNC_SECONDS'], max_pending=2):
+        if format not in TRAJECTORY_FORMATS:
+            raise ValueError(f"Unknown trajectory format {format!r}, expected one of {TRAJECTORY_FORMATS}")
+        if format == 'parquet' and parquet is None:
+            raise ImportError("Writing Parquet trajectories needs pyarrow, use the 'npz' format instead")
+        self.path = path
+        self.format = format
+        self.chunk_frames = chunk_frames
+        self.fsync_seconds = fsync_seconds
+        self.buffer = np.zeros(chunk_frames, dtype=FRAME_DTYPE)
+        self.size = 0
+        self.result_names = list(FIGHT_RESULTS)
+        self.frames_written = 0
+        self.last_fsync = time.monotonic()
+        self.parquet_writer = None
+        if format == 'npz':
+            os.makedirs(path, exist_ok=True)
+            # Keep appending after the chunks of an earlier session
+            self.chunk_index = len(chunk_paths(path))
+        else:
+            # A Parquet file cannot be reopened for appending, start a numbered sibling instead
+            base, extension = os.path.splitext(path)
+            number = 1
+            while os.path.exists(self.path):
+                self.path = f"{base}-{number}{extension}"
+                number += 1
+        self.chunks = queue.Queue(max_pending)
+        self.thread = threading.Thread(target=self._run, name=f"trajectory-{os.path.basename(self.path)}",
+                                       daemon=True)
+        self.thread.start()
+
+    def append(self, timestamp, round_number, frame, game_state, player1_buttons, player2_buttons):
+        """Buffer one frame, writing a chunk once `chunk_frames` frames are buffered"""
+        p1 = game_state.player1
+        p2 = game_state.player2
+        self.buffer[self.size] = (
+            timestamp, round_number, frame,
+            p1.player_id, p1.health, p1.x_coord, p1.y_coord,
+            p1.is_jumping, p1.is_crouching, p1.is_player_in_move, p1.move_id,
+            p2.player_id, p2.health, p2.x_coord, p2.y_coord,
+            p2.is_jumping, p2.is_crouching, p2.is_player_in_move, p2.move_id,
+            game_state.timer, game_state.has_round_started, game_state.is_round_over,
+            self._result_code(getattr(game_state, 'fight_result', 'None')),
+            player1_buttons.to_mask(), player2_buttons.to_mask()
+        )
+        self.size += 1
+        if self.size == self.chunk_frames:
+            self.flush()
+
+    def flush(self, fsync=False):
+        """Hand the buffered frames to the writer thread as one chunk"""
+        if self.size:
+            fsync = fsync or time.monotonic() - self.last_fsync >= self.fsync_seconds
+            # The thread owns the full buffer from here on, keep filling a new one
+            self.chunks.put((self.buffer[:self.size], list(self.result_names), fsync))
+            self.buffer = np.zeros(self.chunk_frames, dtype=FRAME_DTYPE)
+            self.frames_written += self.size
+            self.size = 0
+            if fsync:
+                self.last_fsync = time.monotonic()
+
+    def close(self):
+        """Write the last chunk, wait for every chunk to reach the disk and stop the thread"""
+        if self.thread is None:
+            return
+        self.flush(fsync=True)
+        self.chunks.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+
+    def _result_code(self, result):
+        try:
+            return self.result_names.index(result)
+        except ValueError:
+            self.result_names.append(result)
+            return len(self.result_names) - 1
+
+    def _run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            frames, result_names, fsync = chunk
+            try:
+                if self.format == 'npz':
+                    self._write_npz(frames, result_names, fsync)
+                else:
+                    self._write_parquet(frames, result_names, fsync)
+            except Exception as e:
+                logger.error(f"Failed to write {len(frames)} frames to {self.path}: {e}")
+
+    def _write_npz(self, frames, result_names, fsync):
+        chunk_path = os.path.join(self.path, f"chunk-{self.chunk_index:06d}.npz")
+        temp_path = chunk_path + '.tmp'
+        # Write under a temporary name so readers never see a partial chunk
+        with open(temp_path, 'wb') as chunk_file:
+            np.savez_compressed(chunk_file, result_names=np.array(result_names),
+                                **{name: frames[name] for name in FRAME_DTYPE.names})
+            if fsync:
+                chunk_file.flush()
+                os.fsync(chunk_file.fileno())
+        os.replace(temp_path, chunk_path)
+        if fsync:
+            # The rename itself is only durable once the directory entry is
+            fsync_directory(self.path)
+        self.chunk_index += 1
+
+    def _write_parquet(self, frames, result_names, fsync):
+        columns = {name: frames[name] for name in FRAME_DTYPE.names}
+        columns['fight_result'] = np.array(result_names)[frames['fight_result']]
+        table = pyarrow.table(columns)
+        if self.parquet_writer is None:
+            self.parquet_writer = parquet.ParquetWriter(self.path, table.schema, compression='zstd')
+        # Each chunk becomes one row group
+        self.parquet_writer.write_table(table)
+        if fsync:
+            self.parquet_writer.file_handle.flush()
+            os.fsync(self.parquet_writer.file_handle.fileno())
+
+def chunk_paths(path):
+    return sorted(glob.glob(os.path.join(path, 'chunk-*.npz')))
+
+def iter_chunks(path):
+    """Yield each chunk of a trajectory (or legacy CSV) as {column: array}, with fight_result as strings"""
+    if os.path.isdir(path):
+        for chunk_path in chunk_paths(path):
+            with np.load(chunk_path) as chunk:
+                columns = {name: chunk[name] for name in FRAME_DTYPE.names}
+                columns['fight_result'] = chunk['result_names'][columns['fight_result']]
+            yield columns
+    elif path.endswith('.csv'):
+        yield from iter_csv_chunks(path)
+    else:
+        if parquet is None:
+            raise ImportError(f"Reading {path} needs pyarrow")
+        parquet_file = parquet.ParquetFile(path)
+        for group in range(parquet_file.num_row_groups):
+            table = parquet_file.read_row_group(group)
+            yield {name: table.column(name).to_numpy() for name in FRAME_DTYPE.names}
+
+def iter_csv_chunks(csv_path, chunk_frames=RECORDING_CONFIG['CHUNK_FRAMES']):
+    """Yield a legacy DataRecorder CSV in the same {column: array} chunks as iter_chunks"""
+    state_columns = [name for name in FRAME_DTYPE.names if name not in ('fight_result', 'p1_buttons', 'p2_buttons')]
+    bits = [1 << BUTTON_ATTRIBUTES.index(name) for name in CSV_BUTTONS]
+    buffer = np.zeros(chunk_frames, dtype=FRAME_DTYPE)
+    results = []
+    with open(csv_path, newline='') as csv_file:
+        for row in csv.DictReader(csv_file):
+            index = len(results)
+            frame = buffer[index]
+            for name in state_columns:
+                value = row[name]
+                frame[name] = value == 'True' if value in ('True', 'False') else float(value)
+            for prefix in ('p1', 'p2'):
+                frame[f'{prefix}_buttons'] = sum(bit for bit, name in zip(bits, CSV_BUTTONS)
+                                                 if row[f'{prefix}_{name}'] == 'True')
+            results.append(row['fight_result'])
+            if len(results) == chunk_frames:
+                yield _csv_chunk(buffer, results)
+                results = []
+    if results:
+        yield _csv_chunk(buffer[:len(results)], results)
+
+def _csv_chunk(frames, results):
+    columns = {name: frames[name].copy() for name in FRAME_DTYPE.names}
+    columns['fight_result'] = np.array(results)
+    return columns
+
+def expand_buttons(masks):
+    """(n,) button masks to (n, len(CSV_BUTTONS)) booleans in CSV column order"""
+    bits = np.array([BUTTON_ATTRIBUTES.index(name) for name in CSV_BUTTONS])
+    return (masks[:, None] >> bits) & 1 == 1
+
+def to_csv(path, csv_path):
+    """Convert a trajectory back into the DataRecorder CSV schema, returns the frame count"""
+    frames = 0
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_COLUMNS)
+        for columns in iter_chunks(path):
+            state = [columns[name].tolist() for name in CSV_COLUMNS[:CSV_COLUMNS.index('p1_up')]]
+            buttons = np.hstack([expand_buttons(columns['p1_buttons']), expand_buttons(columns['p2_buttons'])])
+            writer.writerows(list(row) + buttons_row for row, buttons_row in zip(zip(*state), buttons.tolist()))
+            frames += len(columns['frame'])
+    return frames
+
+def main():
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Convert a recorded trajectory back to CSV")
+    parser.add_argument('trajectory', help="a .traj chunk directory or .parquet file")
+    parser.add_argument('csv', help="CSV file to write")
+    args = parser.parse_args()
+    frames = to_csv(args.trajectory, args.csv)
+    logger.info(f"Wrote {frames} frames from {args.trajectory} to {args.csv}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+import argparse
+import multiprocessing
+import socket
+import time
+import numpy as np
+from command import Command
+from config import NETWORK_CONFIG, OBSERVATION_CONFIG
+from emulator_stub import SyntheticFrames
+from features import ObservationEncoder, action_to_buttons, game_state_reward, observation_size
+from logger import logger, setup_logger
+from protocol import Connection
+
+# Workers only need the game and protocol modules, torch stays in the training process
+
+class EmulatorEnv:
+    """One match as a reset/step environment, over an emulator connection or synthetic frames"""
+
+    def __init__(self, port=None, player_number=2, host=NETWORK_CONFIG['HOST'], allowed_codecs=None,
+                 stub=False, seed=None, frames=OBSERVATION_CONFIG['FRAMES'],
+                 normalize=OBSERVATION_CONFIG['NORMALIZE']):
+        self.port = port
+        self.player_number = player_number
+        self.host = host
+        self.allowed_codecs = allowed_codecs
+        self.source = SyntheticFrames(player_number, seed) if stub else None
+        # Observations stack and scale like the bots' (see Bot/DQNAgent)
+        self.encoder = ObservationEncoder(frames, normalize)
+        self.connection = None
+        self.game_state = None
+
+    def connect(self):
+        """Wait for the emulator to connect on `port` and agree on a codec"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((self.host, self.port))
+            server.listen(1)
+            logger.info(f"Environment waiting for an emulator on port {self.port}")
+            sock, _ = server.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connection = Connection(sock)
+        self.connection.accept_handshake(self.allowed_codecs)
+
+    def reset(self):
+        """Start a fresh round and return its first observation"""
+        self.encoder.reset()
+        if self.source is not None:
+            self.source.reset()
+            self.game_state = self.source.next_state()
+        else:
+            if self.connection is None:
+                self.connect()
+                self.game_state = self.connection.receive_game_state()
+            # The emulator restarts rounds on its own, idle until the next one is live
+            while not self.game_state.has_round_started or self.game_state.is_round_over:
+                self.game_state = self._send(Command())
+        return self.observe(self.game_state)
+
+    def step(self, action):
+        """Press the buttons of `action` for one frame and return (obs, reward, done, info)"""
+        command = Command()
+        if self.player_number == 1:
+            command.player_buttons = action_to_buttons(action)
+        else:
+            command.player2_buttons = action_to_buttons(action)
+        next_game_state = self._send(command)
+        reward = game_state_reward(self.game_state, next_game_state, self.player_number)
+        self.game_state = next_game_state
+        return self.observe(next_game_state), reward, next_game_state.is_round_over, {'timer': next_game_state.timer}
+
+    def observe(self, game_state):
+        # The encoder's view is overwritten two frames on, callers keep observations longer
+        return self.encoder.encode(game_state, self.player_number).copy()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _send(self, command):
+        if self.source is not None:
+            self.source.apply_command(command)
+            return self.source.next_state()
+        self.connection.send_command(command)
+        return self.connection.receive_game_state()
+
+def _worker(remote, parent_remote, env_kwargs):
+    parent_remote.close()
+    env = EmulatorEnv(**env_kwargs)
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == 'step':
+                observation, reward, done, info = env.step(data)
+                if done:
+                    # Auto-reset so every worker always has a live round to step
+                    info['terminal_observation'] = observation
+                    observation = env.reset()
+                remote.send((observation, reward, done, info))
+            elif command == 'reset':
+                remote.send(env.reset())
+            elif command == 'close':
+                break
+            else:
+                raise ValueError(f"Unknown environment command {command!r}")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        env.close()
+        remote.close()
+
+class SubprocVecEnv:
+    """Steps N EmulatorEnvs in parallel worker processes and stacks their results"""
+
+    def __init__(self, env_kwargs_list, start_method='spawn'):
+        context = multiprocessing.get_context(start_method)
+        self.num_envs = len(env_kwargs_list)
+        self.remotes, self.processes = [], []
+        for index, env_kwargs in enumerate(env_kwargs_list):
+            remote, worker_remote = context.Pipe()
+            process = context.Process(target=_worker, args=(worker_remote, remote, env_kwargs),
+                                      name=f"env-{index}", daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        frames = env_kwargs_list[0].get('frames', OBSERVATION_CONFIG['FRAMES'])
+        self.observations = np.zeros((self.num_envs, observation_size(frames)), dtype=np.float32)
+        self.rewards = np.zeros(self.num_envs, dtype=np.float32)
+        self.dones = np.zeros(self.num_envs, dtype=bool)
+        self.closed = False
+
+    def reset(self):
+        """Reset every environment and return a (num_envs, observation size) observation array"""
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        for index, remote in enumerate(self.remotes):
+            self.observations[index] = remote.recv()
+        return self.observations.copy()
+
+    def step_async(self, actions):
+        for remote, action in zip(self.remotes, actions):
+            remote.send(('step', int(action)))
+
+    def step_wait(self):
+        """Return stacked (observations, rewards, dones, infos) of the pending step"""
+        infos = []
+        for index, remote in enumerate(self.remotes):
+            observation, reward, done, info = remote.recv()
+            self.observations[index] = observation
+            self.rewards[index] = reward
+            self.dones[index] = done
+            infos.append(info)
+        return self.observations.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            try:
+                remote.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for remote in self.remotes:
+            remote.close()
+        self.closed = True
+
+def train_agent(agent, vec_env, steps, train_every=1, target_update_every=1000):
+    """Collect `steps` batched steps from `vec_env` into a DQNAgent's replay buffer and train it"""
+    observations = vec_env.reset()
+    transitions = 0
+    losses = []
+    for step in range(1, steps + 1):
+        actions = agent.select_actions(observations)
+        next_observations, rewards, dones, infos = vec_env.step(actions)
+        for index in range(vec_env.num_envs):
+            # After an auto-reset the transition ends in the terminal frame, not the new round
+            next_state = infos[index]['terminal_observation'] if dones[index] else next_observations[index]
+            agent.memory.push(observations[index], actions[index], rewards[index], next_state, dones[index])
+        transitions += vec_env.num_envs
+        observations = next_observations
+        if step % train_every == 0:
+            loss = agent.train()
+            if loss is not None:
+                losses.append(loss)
+        if step % target_update_every == 0:
+            agent.update_target_network()
+    return {
+        'transitions': transitions,
+        'train_steps': len(losses),
+        'mean_loss': float(np.mean(losses)) if losses else None,
+        'epsilon': agent.epsilon
+    }
+
+def main():
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Train a DQN agent on several emulators in parallel")
+    parser.add_argument('--envs', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--steps', type=int, default=10000, help="batched steps, each one frame of every env")
+    parser.add_argument('--stub', action='store_true', help="use synthetic frames instead of emulators")
+    parser.add_argument('--host', default=NETWORK_CONFIG['HOST'])
+    parser.add_argument('--base-port', type=int, default=NETWORK_CONFIG['PORT_P1'],
+                        help="env i listens on base port + i")
+    parser.add_argument('--player', type=int, choices=[1, 2], default=2)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--train-every', type=int, default=1)
+    parser.add_argument('--target-update-every', type=int, default=1000)
+    parser.add_argument('--model', help="checkpoint to start from and save to")
+    args = parser.parse_args()
+
+    from dqn import DQNAgent
+    from features import ACTION_SIZE
+
+    model_path = args.model or f'models/dqn_model_p{args.player}.pth'
+    agent = DQNAgent(observation_size(), ACTION_SIZE, args.player)
+    try:
+        agent.load_model(model_path)
+    except Exception as e:
+        logger.info(f"Starting a new model, could not load {model_path}: {e}")
+
+    env_kwargs_list = [{
+        'port': args.base_port + index,
+        'player_number': args.player,
+        'host': args.host,
+        'stub': args.stub,
+        'seed': None if args.seed is None else args.seed + index
+    } for index in range(args.envs)]
+    vec_env = SubprocVecEnv(env_kwargs_list)
+    start = time.perf_counter()
+    try:
+        stats = train_agent(agent, vec_env, args.steps, args.train_every, args.target_update_every)
+    finally:
+        vec_env.close()
+    elapsed = time.perf_counter() - start
+    agent.save_model(model_path)
+    print(f"envs={args.envs} transitions={stats['transitions']} "
+          f"transitions/s={stats['transitions'] / elapsed:.1f} train_steps={stats['train_steps']} "
+          f"mean_loss={stats['mean_loss']} epsilon={stats['epsilon']:.3f}")
+
+if __name__ == '__main__':
+    main()
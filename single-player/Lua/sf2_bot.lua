@@ -30,6 +30,8 @@ local MEMORY = {
 }
 
 -- Initialize socket
+-- This script sends bare JSON without the SF2P handshake, so the controller serves it
+-- with the legacy unframed JSON stream rather than the framed json/binary codecs
 local client = socket.tcp()
 local connected = false
 